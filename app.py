@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
-from io import StringIO
 from visualisation import (
     plot_demand_and_pv_generation,
     plot_elec_price_and_CO2_emissions,
@@ -10,24 +10,69 @@ from visualisation import (
     show_latex_table,
     plot_energy_flow_diagram,
     plot_energy_balance,
+    plot_sizing_heatmap,
+    plot_battery_cost_curve,
+    plot_fleet_households,
+    plot_scenario_distribution,
+    plot_fan_chart,
 )
 from data_processing import (
     load_default_pv_cf,
     load_default_electricity_demand,
     load_default_electricity_price,
     load_default_co2_emissions,
+    load_full_year_scenario,
+    load_generation_mix_co2_emissions,
+    repeat_time_series,
+    resample_time_series,
+    load_file_bytes,
     load_operating_strategy,
     load_custom_pv_cf,
     load_custom_load_profile,
+    align_time_series,
     load_custom_elec_price,
     load_custom_co2_emissions,
 )
-from utils import safe_execute, parse_json_strategy, check_energy_balance, calculate_electricity_price
+from utils import parse_json_strategy, check_energy_balance
+from simulation import simulation_cache, calculate_electricity_price, result_csv, result_table
+from sweep import SWEEP_KPIS, sweep
+from optimization import optimize_battery_capacity
+from fleet import simulate_fleet
+from monte_carlo import BootstrapSource, run_monte_carlo
+from time_index import map_to_year
+from strategy import analyze_rules
+from kernels import MAX_OPTIMAL_TIME_STEPS, find_kernel, optimal_kernel
 
 # write simulation results to results folder True/False
 # can be used to check integrity of simulation for the default parameter set (currently 6 kW, 12 kWh, additional costs applied)
 write_results_to_file = False
 
+# Selectable time steps and their length [h]
+TIME_STEPS = {"1 hour": 1, "15 minutes": 0.25, "1 minute": 1 / 60}
+
+# Selectable ways to fill gaps in uploaded time series and to move their time stamps, see align_time_series()
+FILL_METHODS = {"Linear interpolation": "interpolate", "Previous value": "previous"}
+TIME_STAMP_SHIFTS = {"Day of the year": "year", "Date and time": None, "Start of the simulated period": "start"}
+
+# Model calculations taking longer than this [s] continue in the background, the page shows their progress
+SIMULATION_WAIT_SECONDS = 0.5
+# Interval of the progress updates of a model calculation in the background [s]
+PROGRESS_REFRESH_SECONDS = 1
+
+
+def align_upload(uploaded_data, column, date_time):
+    """Join uploaded data with the simulated time steps, show errors and filled gaps, return None on errors"""
+    values, n_filled, error_msg = align_time_series(
+        uploaded_data, column, date_time, FILL_METHODS[fill_method_radio], TIME_STAMP_SHIFTS[time_stamp_shift_radio]
+    )
+    if error_msg:
+        st.error(error_msg)
+        return None
+    if n_filled:
+        st.info(f"{n_filled} of {len(date_time)} time steps have no uploaded value and were filled.")
+    return pd.Series(values, name=column)
+
+
 st.set_page_config(
     page_title="Lab A",
     layout="wide",
@@ -53,8 +98,7 @@ with image_container_col1:
         """
     )
 
-    with open("Teaching_lab___Storage_operation.pdf", "rb") as pdf_script:
-        PDFScriptbyte = pdf_script.read()
+    PDFScriptbyte = load_file_bytes("Teaching_lab___Storage_operation.pdf")
 
     st.download_button(
         label="Download Script",
@@ -73,14 +117,13 @@ with image_container_col1:
     with st.expander("Download custom input examples"):
         for file_name, file_path in example_csv_files.items():
             try:
-                with open(file_path, "rb") as file:
-                    file_data = file.read()
-                    st.download_button(
-                        label=f"Download {file_name}",
-                        data=file_data,
-                        file_name=file_name,
-                        mime="text/csv",
-                    )
+                file_data = load_file_bytes(file_path)
+                st.download_button(
+                    label=f"Download {file_name}",
+                    data=file_data,
+                    file_name=file_name,
+                    mime="text/csv",
+                )
             except FileNotFoundError:
                 st.warning(f"File not found: {file_path}")
 
@@ -93,6 +136,24 @@ with image_container_col1:
         ],
     )
 
+    fill_method_radio = st.radio(
+        "Fill gaps in uploaded time series with:",
+        list(FILL_METHODS),
+        captions=[
+            "Uploaded values are joined with the simulated time steps by their time stamps.",
+            "E.g. for prices that change in steps.",
+        ],
+    )
+    time_stamp_shift_radio = st.radio(
+        "Match the time stamps of uploaded time series by:",
+        list(TIME_STAMP_SHIFTS),
+        captions=[
+            "Uploads of other years are moved to the simulated year.",
+            "Uploads must cover the simulated period.",
+            "E.g. for a Shelly Plug log of other days.",
+        ],
+    )
+
 with image_container_col2:
     st.image(
         "images/second_draft_household.png",
@@ -107,6 +168,44 @@ c1col1, c1col2 = container1.columns(2)
 
 with c1col1:
     st.markdown("# 1. Time series data for generation and demand")
+    horizon_radio = st.radio(
+        "Select the simulation horizon:",
+        ["One week", "Full year"],
+        captions=[
+            "168 hours, all default time series available.",
+            "8760 hours, PV and load profile 1 for the full year. The default electricity price and CO₂ emissions are repeated weekly.",
+        ],
+        horizontal=True,
+    )
+
+    if horizon_radio == "Full year":
+        default_pv_cf, default_electricity_demand = load_full_year_scenario()
+        default_electricity_price = repeat_time_series(default_electricity_price, default_pv_cf["date_time"])
+        default_co2_emissions = repeat_time_series(default_co2_emissions, default_pv_cf["date_time"])
+        str_horizon = "a full year's"
+    else:
+        str_horizon = "a one-week's"
+
+    time_step_radio = st.radio(
+        "Select the time step:",
+        list(TIME_STEPS),
+        captions=[
+            "Hourly values as in the default data.",
+            "Hourly default data is repeated for every quarter hour.",
+            "E.g. for Shelly Plug data. Hourly default data is repeated for every minute.",
+        ],
+        horizontal=True,
+    )
+    # Length of a time step [h], powers are constant within a time step
+    time_step = TIME_STEPS[time_step_radio]
+    default_pv_cf = resample_time_series(default_pv_cf, time_step)
+    default_electricity_demand = resample_time_series(default_electricity_demand, time_step)
+    default_electricity_price = resample_time_series(default_electricity_price, time_step)
+    default_co2_emissions = resample_time_series(default_co2_emissions, time_step)
+
+    # Number of values of all time series
+    n_steps = len(default_pv_cf)
+
     pv_cf_radio = st.radio(
         "Select time series for PV capacity factor:",
         ["Use default", "Use own"],
@@ -115,12 +214,11 @@ with c1col1:
             "Upload your own data.",
         ],
     )
-    if pv_cf_radio == "Use default":
-        pv_cf_series = default_pv_cf["pv_cf"]
-        date_time = default_pv_cf["date_time"]
-    elif pv_cf_radio == "Use own":
+    date_time = default_pv_cf["date_time"]
+    pv_cf_series = default_pv_cf["pv_cf"]
+    if pv_cf_radio == "Use own":
         uploaded_file1 = st.file_uploader(
-            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'pv_cf'] and 168 rows of data (1 row per hour). This resembles a one-week's data series.",
+            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'pv_cf'] and rows of data covering {str_horizon} data series. The values are joined with the time steps of {time_step_radio} by their time stamps.",
             type=["csv"],
             key="pv_cf_uploader",
         )
@@ -129,17 +227,10 @@ with c1col1:
             uploaded_pv_cf, error_msg = load_custom_pv_cf(uploaded_file1, separator_radio)
             if error_msg:
                 st.error(error_msg)
-                uploaded_pv_cf = None
-
-            if uploaded_pv_cf is None:
-                pv_cf_series = default_pv_cf["pv_cf"]
-                date_time = default_pv_cf["date_time"]
             else:
-                pv_cf_series = uploaded_pv_cf["pv_cf"]
-                date_time = default_pv_cf["date_time"]
-        else:
-            pv_cf_series = default_pv_cf["pv_cf"]
-            date_time = default_pv_cf["date_time"]
+                uploaded_pv_cf = align_upload(uploaded_pv_cf, "pv_cf", date_time)
+                if uploaded_pv_cf is not None:
+                    pv_cf_series = uploaded_pv_cf
 
     pv_cf = pv_cf_series
 
@@ -170,14 +261,16 @@ with c1col1:
 
     pv_generation = pv_generation.rename("P_pv")
 
+    # Only profile 1 is available for the full year
+    load_profile_options = ["Profile 1", "Profile 2", "Profile 3"][: len(default_electricity_demand.columns) - 1]
     default_load_profile_radio = st.radio(
         "Select your preferred default load profile [2]:",
-        ["Profile 1", "Profile 2", "Profile 3"],
+        load_profile_options,
         captions=[
             "One full-time and one part-time working person with three children.",
             "One full-time and one part-time working person.",
             "One pensioner.",
-        ],
+        ][: len(load_profile_options)],
     )
 
     if default_load_profile_radio == "Profile 1":
@@ -191,6 +284,9 @@ with c1col1:
         str_profile = "P3"
 
     use_own_load_profiles_check = st.checkbox("Use own load profiles (e.g. Shelly Plug time series)")
+    # Set once an uploaded profile was read and aligned, otherwise (no upload or an error) the default profile is used
+    uploaded_demand_selectbox = None
+    str_own_load = None
 
     if use_own_load_profiles_check:
         st.write(
@@ -201,40 +297,44 @@ with c1col1:
         )
 
         uploaded_file2 = st.file_uploader(
-            f"Upload a CSV-file: The input file must contain 1 row with the column names [date_time{separator_radio} load] and 168 rows of data (1 row per hour). This resembles a one-week's data series.",
+            f"Upload a CSV-file: The input file must contain 1 row with the column names [date_time{separator_radio} load] and rows of data covering {str_horizon} data series at any resolution, e.g. a Shelly Plug log of seconds. The values are averaged per time step of {time_step_radio} and joined with the simulated time steps by their time stamps.",
             type=["csv"],
             key="own_load_profiles_uploader",
         )
 
         if uploaded_file2 is not None:
-            uploaded_load_profile, error_msg = load_custom_load_profile(uploaded_file2, separator_radio)
+            units_own_load_profile_radio = st.radio(
+                "Select the units of the uploaded profile:",
+                ["**[W] (Recommended for Shelly Plug data)**", "**[kW]**"],
+            )
+            unit = "W" if units_own_load_profile_radio == "**[W] (Recommended for Shelly Plug data)**" else "kW"
+            # Large logs are only read again if the file or the settings change, not on every rerun
+            upload_key = (uploaded_file2.file_id, separator_radio, time_step, unit)
+            if st.session_state.get("uploaded_load_profile_key") != upload_key:
+                st.session_state.uploaded_load_profile = load_custom_load_profile(
+                    uploaded_file2, separator_radio, time_step, unit
+                )
+                st.session_state.uploaded_load_profile_key = upload_key
+            uploaded_load_profile, error_msg = st.session_state.uploaded_load_profile
             if error_msg:
                 st.error(error_msg)
-                uploaded_load_profile = None
+            else:
+                uploaded_load_profile = align_upload(uploaded_load_profile, "load", date_time)
 
             if uploaded_load_profile is not None:
-                uploaded_demand = uploaded_load_profile["load"]
+                # [kW]
+                uploaded_demand = uploaded_load_profile
                 uploaded_demand_selectbox = st.selectbox(
                     "How would you like to use the uploaded profile?",
                     ("Standalone", "Combine with default load profile"),
                 )
-                units_own_load_profile_radio = st.radio(
-                    "Select the units of the uploaded profile:",
-                    ["**[W] (Recommended for Shelly Plug data)**", "**[kW]**"],
-                )
                 if uploaded_demand_selectbox == "Standalone":
                     str_own_load = "S"
-                    if units_own_load_profile_radio == "**[W] (Recommended for Shelly Plug data)**":
-                        electricity_demand = uploaded_demand / 1000
-                    else:
-                        electricity_demand = uploaded_demand
+                    electricity_demand = uploaded_demand
 
                 elif uploaded_demand_selectbox == "Combine with default load profile":
                     str_own_load = "C"
-                    if units_own_load_profile_radio == "**[W] (Recommended for Shelly Plug data)**":
-                        electricity_demand = electricity_demand + uploaded_demand / 1000
-                    else:
-                        electricity_demand = electricity_demand + uploaded_demand
+                    electricity_demand = electricity_demand + uploaded_demand
 
     electricity_demand = electricity_demand.rename("P_load")
 
@@ -296,11 +396,10 @@ with c2col1:
             "Upload your own data.",
         ],
     )
-    if elec_price_radio == "Use default":
-        electricity_wholesale_price = default_electricity_price["electricity_price"]
-    elif elec_price_radio == "Use own":
+    electricity_wholesale_price = default_electricity_price["electricity_price"]
+    if elec_price_radio == "Use own":
         uploaded_file3 = st.file_uploader(
-            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'electricity_price'] and 168 rows of data (1 row per hour). This resembles a one-week's data series.",
+            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'electricity_price'] and rows of data covering {str_horizon} data series. The values are joined with the time steps of {time_step_radio} by their time stamps.",
             type=["csv"],
             key="elec_price_uploader",
         )
@@ -309,14 +408,10 @@ with c2col1:
             uploaded_elec_price, error_msg = load_custom_elec_price(uploaded_file3, separator_radio)
             if error_msg:
                 st.error(error_msg)
-                uploaded_elec_price = None
-
-            if uploaded_elec_price is None:
-                electricity_wholesale_price = default_electricity_price["electricity_price"]
             else:
-                electricity_wholesale_price = uploaded_elec_price["electricity_price"]
-        else:
-            electricity_wholesale_price = default_electricity_price["electricity_price"]
+                uploaded_elec_price = align_upload(uploaded_elec_price, "electricity_price", date_time)
+                if uploaded_elec_price is not None:
+                    electricity_wholesale_price = uploaded_elec_price
 
     electricity_price_customer = calculate_electricity_price(
         electricity_wholesale_price, apply_additional_costs, taxes_and_fees, grid_fees
@@ -325,17 +420,28 @@ with c2col1:
     st.markdown("___")
     CO2_emissions_radio = st.radio(
         "Select time series for CO₂ emissions:",
-        ["Use default", "Use own"],
+        ["Use default", "Use own", "Average of the generation mix", "Marginal of the generation mix"],
         captions=[
             "Use preloaded data [3].",
             "Upload your own data.",
+            "Emissions of all power plants per kWh generated in Germany in 2021 [4].",
+            "Emissions of the power plants that follow the demand, i.e. of additional demand, in Germany in 2021 [4].",
         ],
     )
-    if CO2_emissions_radio == "Use default":
-        CO2_emissions_specific = default_co2_emissions["CO2_emissions"]
-    elif CO2_emissions_radio == "Use own":
+    CO2_emissions_specific = default_co2_emissions["CO2_emissions"]
+    if CO2_emissions_radio in ["Average of the generation mix", "Marginal of the generation mix"]:
+        column = "CO2_emissions_average" if CO2_emissions_radio.startswith("Average") else "CO2_emissions_marginal"
+        # Mapped from 2021 to the simulated year with the same weekdays and joined with the time steps like an upload
+        generation_mix = load_generation_mix_co2_emissions().set_index("date_time")[[column]]
+        generation_mix = map_to_year(generation_mix, date_time.iloc[0].year).reset_index()
+        values, _, error_msg = align_time_series(generation_mix, column, date_time)
+        if error_msg:
+            st.error(error_msg)
+        else:
+            CO2_emissions_specific = pd.Series(values, name="CO2_emissions")
+    if CO2_emissions_radio == "Use own":
         uploaded_file4 = st.file_uploader(
-            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'CO2_emissions'] and 168 rows of data (1 row per hour). This resembles a one-week's data series.",
+            f"Upload a CSV-file: The input file must contain 1 row with the column names ['date_time'{separator_radio} 'CO2_emissions'] and rows of data covering {str_horizon} data series. The values are joined with the time steps of {time_step_radio} by their time stamps.",
             type=["csv"],
             key="CO2_emissions_uploader",
         )
@@ -344,14 +450,10 @@ with c2col1:
             uploaded_co2_emissions, error_msg = load_custom_co2_emissions(uploaded_file4, separator_radio)
             if error_msg:
                 st.error(error_msg)
-                uploaded_co2_emissions = None
-
-            if uploaded_co2_emissions is None:
-                CO2_emissions_specific = default_co2_emissions["CO2_emissions"]
             else:
-                CO2_emissions_specific = uploaded_co2_emissions["CO2_emissions"]
-        else:
-            CO2_emissions_specific = default_co2_emissions["CO2_emissions"]
+                uploaded_co2_emissions = align_upload(uploaded_co2_emissions, "CO2_emissions", date_time)
+                if uploaded_co2_emissions is not None:
+                    CO2_emissions_specific = uploaded_co2_emissions
 
 with c2col2:
     st.markdown("\n")
@@ -413,7 +515,7 @@ else:
 # st.write(f"Storage capacity is: {storage_capacity}")
 
 
-def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_emissions_specific):
+def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_emissions_specific, simulation_job=None):
 
     download_placeholder_1 = st.empty()
     download_placeholder_2 = st.empty()
@@ -437,8 +539,6 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
     # Declaration of required series (for Reference, No battery and Custom)
     P_pv = pv_generation
     P_load = electricity_demand
-    P_feed_in = pd.Series(0.0, index=date_time.index, name="P_feed-in")
-    P_purchase = pd.Series(0.0, index=date_time.index, name="P_purchase")
 
     # Header
     if operating_strategy_selected == "Reference":
@@ -451,6 +551,16 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
         st.caption("Table 4b: Conditions and consequences of the no-battery operating strategy.")
         st.latex(latex_table_no_battery)
 
+    if operating_strategy_selected == "Optimal (perfect foresight)":
+        st.header("Optimal operation with perfect foresight", divider="orange")
+        st.caption(
+            "The energy flows with the lowest cost of electricity for the whole period, computed as a linear program with all time series known in advance. "
+            "The battery is only charged from PV and only discharged to cover the demand. "
+            "The benchmark assumes exact storage accounting: the battery only discharges energy that was charged before. "
+            "The simulation of the other strategies limits the storage level to between 0 and the capacity instead, so a strategy that discharges more than is stored (e.g. the reference strategy with a small battery) can show lower costs than this benchmark. "
+            "With exact storage accounting, no operating strategy can do better with the same inputs."
+        )
+
     if operating_strategy_selected == "Custom":
         st.header("Custom operating strategy", divider="orange")
 
@@ -458,82 +568,61 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
         placeholder_outputsTable = st.empty()
 
     # Perform calculations for the simulation
+    os_from_text_area, is_valid, _ = parse_json_strategy(st.session_state.text_area_operating_strategy)
+    if not is_valid:
+        st.error("The content is not valid JSON. Please correct any formatting errors.")
+        return
 
-    # Whitelist allowed words
-    whitelist_allowed_words = {
-        "P_pv",
-        "P_load",
-        "P_purchase",
-        "P_feed_in",
-        "t",
-        "SoC",
-        "W_batt_max",
-        "min",
-        "W_batt",
-        "max",
-        "P_charge",
-        "P_discharge",
-        "feed_in_tariff",
-        "electricity_price_customer",
-        "CO2_emissions_specific",
-    }
-
-    P_charge = pd.Series(0.0, index=date_time.index, name="P_charge")
-    P_discharge = pd.Series(0.0, index=date_time.index, name="P_discharge")
-    W_batt = pd.Series(0.0, index=date_time.index, name="W_batt")
-    SoC = pd.Series(0.0, index=date_time.index, name="SoC")
-    W_batt_max = storage_capacity
-
-    try:
-        try:
-            # Use StringIO to create a temporary file-like object
-            oper_stra = StringIO(st.session_state.text_area_operating_strategy)
-            # Load JSON from the StringIO object
-            os_from_text_area = json.load(oper_stra)
-
-        except json.JSONDecodeError:
-            st.error("The content is not valid JSON. Please correct any formatting errors.")
-
-        # Apply operating strategy to all variables
-        for t in range(date_time.size):
-            for action in os_from_text_area:
-                if safe_execute(
-                    action["condition"], allowed_words=whitelist_allowed_words, mode="eval", extra_variables=locals()
-                ):
-                    safe_execute(
-                        action["action"], allowed_words=whitelist_allowed_words, mode="exec", extra_variables=locals()
-                    )
-
-            if P_charge[t] > 0 and SoC[t] == 1 and t == 0 or P_charge[t] > 0 and SoC[t - 1] == 1 and t > 0:
-                status_placeholder_batteryChargeCheck.error(
-                    "batteryChargeCheck Error: Charging of full battery is not possible, results are invalid!"
-                )
-
-            if P_discharge[t] > 0 and SoC[t] == 0 and t == 0 or P_discharge[t] > 0 and SoC[t - 1] == 0 and t > 0:
-                status_placeholder_batteryDischargeCheck.error(
-                    "batteryDischargeCheck Error: Discharging of empty battery is not possible, results are invalid!"
-                )
+    if simulation_job is not None and simulation_job.status == "done":
+        # Energy flows of the finished model calculation, only the costs and emissions are computed again
+        result = simulation_job.result(electricity_price_customer, CO2_emissions_specific)
+    else:
+        # Unchanged configurations are answered from the result cache
+        result = simulation_cache.simulate(
+            P_pv,
+            P_load,
+            electricity_price_customer,
+            CO2_emissions_specific,
+            feed_in_tariff,
+            storage_capacity,
+            os_from_text_area,
+            time_step,
+        )
 
-            if P_feed_in[t] > P_pv[t]:
-                status_placeholder_noArbitrageCheck1.error(
-                    "noArbitrageCheck Error: Discharging the battery to sell to the grid is not allowed."
-                )
+    st.session_state.simulation_error = not result.strategy_valid
+    if result.error is not None:
+        status_placeholder_error_msg.error(
+            f"Error in json strategy. Exception (-1) indicates that an [t-1] for t=0 was requested, but this is not defined. Exception: {result.error}"
+        )
 
-            if P_charge[t] > P_pv[t]:
-                status_placeholder_noArbitrageCheck2.error(
-                    "noArbitrageCheck Error: Charging the battery from the grid is not allowed."
-                )
+    if result.checks["batteryChargeCheck"]:
+        status_placeholder_batteryChargeCheck.error(
+            "batteryChargeCheck Error: Charging of full battery is not possible, results are invalid!"
+        )
 
-            W_batt[t] = min(max((0 if t == 0 else W_batt[t - 1]) + P_charge[t] - P_discharge[t], 0), W_batt_max)
-            SoC[t] = W_batt[t] / W_batt_max
+    if result.checks["batteryDischargeCheck"]:
+        status_placeholder_batteryDischargeCheck.error(
+            "batteryDischargeCheck Error: Discharging of empty battery is not possible, results are invalid!"
+        )
 
-        st.session_state.simulation_error = False
+    if result.checks["noArbitrageCheck1"]:
+        status_placeholder_noArbitrageCheck1.error(
+            "noArbitrageCheck Error: Discharging the battery to sell to the grid is not allowed."
+        )
 
-    except Exception as e:
-        status_placeholder_error_msg.error(
-            f"Error in json strategy. Exception (-1) indicates that an [t-1] for t=0 was requested, but this is not defined. Exception: {e}"
+    if result.checks["noArbitrageCheck2"]:
+        status_placeholder_noArbitrageCheck2.error(
+            "noArbitrageCheck Error: Charging the battery from the grid is not allowed."
         )
 
+    # Convert the simulation results to series (once, for plotting)
+    df_state = result.state.to_dataframe(date_time.index)
+    P_charge = df_state["P_charge"]
+    P_discharge = df_state["P_discharge"]
+    P_feed_in = df_state["P_feed_in"]
+    P_purchase = df_state["P_purchase"]
+    SoC = df_state["SoC"]
+
     # Use the plot_energy_flow_diagram function from visualisation.py
     fig02 = plot_energy_flow_diagram(
         date_time,
@@ -550,19 +639,18 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
     st.plotly_chart(fig02)
 
     # Energy balance
-
-    net_energy_balance = P_load - P_pv + P_charge - P_discharge + P_feed_in - P_purchase
+    net_energy_balance = result.net_energy_balance
 
     # Use the plot_energy_balance function from visualisation.py
     fig03 = plot_energy_balance(date_time, net_energy_balance)
 
     # Computation of the costs
     E_purchase, E_feed_in = compute_and_plot_costs(
-        P_purchase, P_feed_in, electricity_price_customer, feed_in_tariff, date_time
+        P_purchase, P_feed_in, electricity_price_customer, feed_in_tariff, date_time, time_step
     )
 
     # Computation of the emissions
-    CO2_generated = compute_and_plot_emissions(CO2_emissions_specific, E_purchase, date_time)
+    compute_and_plot_emissions(CO2_emissions_specific, E_purchase, date_time)
 
     # Create a dictionary with the output values description
     table_outputs = {
@@ -582,70 +670,30 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
             "(PV Energy Used On-Site / Total PV Energy Generated)*100",
             "(PV Energy Used On-Site / Total Energy Consumption)*100",
         ],
-        "Value": [
-            f"{(E_purchase * electricity_price_customer).sum():.2f}",
-            f"{(E_feed_in * electricity_price_customer).sum():.2f}",
-            f"{((E_purchase + E_feed_in) * electricity_price_customer).sum():.2f}",
-            f"{CO2_generated.sum():.2f}",
-            f"{(((P_pv.sum() - P_feed_in.sum())/P_pv.sum())*100):.2f}",
-            f"{(((P_pv.sum() - P_feed_in.sum())/P_load.sum())*100):.2f}",
-        ],
         "Units": ["€", "€", "€", "gCO₂", "%", "%"],
     }
+    table_outputs["Value"] = [f"{result.kpis[parameter]:.2f}" for parameter in table_outputs["Parameter"]]
 
-    df_outputs = pd.DataFrame(table_outputs)
-    with placeholder_outputsTable:
+    df_outputs = pd.DataFrame(table_outputs, columns=["Parameter", "Description", "Value", "Units"])
+    cache_info = simulation_cache.info()
+    with placeholder_outputsTable.container():
         st.table(df_outputs)
+        # Diagnostics of the result cache shared by all sessions of the app
+        st.caption(
+            f"Result cache: {cache_info.hits} hits, {cache_info.misses} misses (hit rate {cache_info.hit_rate:.0%}), "
+            f"{cache_info.currsize} of {cache_info.maxsize} results, "
+            f"{cache_info.currbytes / 2**20:.1f} of {cache_info.maxbytes / 2**20:.0f} MB."
+        )
 
-    # Concatenate all data for download
-    all_result_data = pd.concat(
-        [
-            date_time,
-            electricity_demand,
-            pv_generation,
-            electricity_price_customer,
-            CO2_emissions_specific,
-            P_charge,
-            P_discharge,
-            P_feed_in,
-            P_purchase,
-            W_batt,
-            SoC,
-            E_purchase,
-            E_feed_in,
-            CO2_generated,
-        ],
-        axis=1,
-    )
+    # All data for download
+    all_result_data = result_table(date_time, result)
 
-    new_header_names = [
-        "date_time",
-        "P_load_kW",
-        "P_pv_kW",
-        "electricity_price_customer_EUR_kWh",
-        "CO2_emissions_g_kWh",
-        "P_charge_kW",
-        "P_discharge_kW",
-        "P_feed_in_kW",
-        "P_purchase_kW",
-        "W_batt_kWh",
-        "SoC_%",
-        "E_purchase_kWh",
-        "E_feed_in_kWh",
-        "CO2_generated_g",
-    ]
-
-    all_result_data.columns = new_header_names
-
-    csv_value = all_result_data.to_csv(float_format="%.2f", index=False)
+    csv_value = result_csv(all_result_data)
     os_from_text_area_json_dump = json.dumps(os_from_text_area, indent=4)
 
     if write_results_to_file:
-        all_result_data.to_csv(
-            f"results/{operating_strategy_selected.strip().replace(' ', '_')}_results.csv",
-            float_format="%.2f",
-            index=False,
-        )
+        with open(f"results/{operating_strategy_selected.strip().replace(' ', '_')}_results.csv", "w") as file:
+            file.write(csv_value)
 
     if st.session_state.simulation_error:
         status_placeholder_simulationState.error("Simulation failed, error message below.")
@@ -668,7 +716,7 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
             file_name="applied_os.json",
             mime="application/json",
         )
-        if use_own_load_profiles_check:
+        if str_own_load is not None:
             download_placeholder_2.download_button(
                 label="Download result time series",
                 data=csv_value,
@@ -684,6 +732,51 @@ def simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_em
             )
 
 
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def show_simulation_progress(simulation_job):
+    """Show the progress and the energy flows simulated so far of a model calculation running in the background"""
+    if simulation_job.status != "running":
+        # Rerun the whole page to show the results
+        st.rerun()
+
+    st.progress(
+        simulation_job.progress,
+        text=f"Model calculation running: {simulation_job.t} of {simulation_job.n_steps} time steps simulated.",
+    )
+    if st.button("Cancel model calculation"):
+        cancel_simulation_job()
+        st.rerun()
+
+    # Energy flows of the time steps simulated so far
+    t = simulation_job.t
+    if simulation_job.state is not None and t > 0:
+        df_state = simulation_job.state.to_dataframe(date_time.index).iloc[:t]
+        fig_partial = plot_energy_flow_diagram(
+            date_time.iloc[:t],
+            electricity_demand.iloc[:t],
+            pv_generation.iloc[:t],
+            df_state["P_feed_in"],
+            df_state["P_purchase"],
+            df_state["SoC"],
+            df_state["P_charge"],
+            df_state["P_discharge"],
+            electricity_price_customer[:t],
+            CO2_emissions_specific[:t],
+        )
+        st.plotly_chart(fig_partial, key="energyFlow_partial")
+
+
+def cancel_simulation_job(message="Model calculation cancelled."):
+    """Stop the model calculation of the session running in the background, if any"""
+    simulation_job = st.session_state.get("simulation_job")
+    st.session_state.simulation_job = None
+    if simulation_job is not None and simulation_job.status == "running":
+        simulation_job.cancel()
+        st.toast(message)
+        # No results are shown until the next model calculation
+        st.session_state.dispatch_key = None
+
+
 st.markdown("# 4. Operating strategy")
 
 # Create a dictionary with the data description
@@ -701,6 +794,7 @@ table_parameters = {
         "Battery",
         "Battery",
         "Battery",
+        "Time",
     ],
     "Parameter": [
         "P_pv[t]",
@@ -715,6 +809,7 @@ table_parameters = {
         "W_Batt[t]",
         "W_Batt_max",
         "SoC[t]",
+        "time_step",
     ],
     "Description": [
         "PV power in t (PV generation)",
@@ -729,6 +824,7 @@ table_parameters = {
         "Storage level in t",
         "Usable storage capacity",
         "State of charge",
+        "Length of a time step, e.g. energy = power * time_step",
     ],
     "Units": [
         "kW",  # PV Generation
@@ -743,6 +839,7 @@ table_parameters = {
         "kWh",  # Storage level
         "kWh",  # Usable storage capacity
         "%",  # State of charge
+        "h",  # Time step
     ],
 }
 
@@ -782,11 +879,12 @@ st.markdown(
 def reset_clicked_parse_json():
     st.session_state.clicked_parse_json_button = False
     st.session_state.prepared_for_simulation = False
+    cancel_simulation_job("Model calculation cancelled, the operating strategy was changed.")
 
 
 operating_strategy_selected = st.selectbox(
     label="**Select operating strategy:**",
-    options=["Reference", "No battery", "Custom"],
+    options=["Reference", "No battery", "Optimal (perfect foresight)", "Custom"],
     index=0,
     key="operating_strategy_selected",
     on_change=reset_clicked_parse_json,
@@ -796,6 +894,8 @@ if st.session_state.operating_strategy_selected == "Reference":
     text_os = load_operating_strategy("Reference")
 elif st.session_state.operating_strategy_selected == "No battery":
     text_os = load_operating_strategy("No battery")
+elif st.session_state.operating_strategy_selected == "Optimal (perfect foresight)":
+    text_os = load_operating_strategy("Optimal (perfect foresight)")
 elif st.session_state.operating_strategy_selected == "Custom":
     text_os = load_operating_strategy("Custom")
 
@@ -825,6 +925,14 @@ if st.session_state.clicked_parse_json_button:
         with st.expander("View the parsed JSON content"):
             st.write("Parsed JSON:", parsed_strategy)
 
+        # Rules that are never applied or apply together in a time step (e.g. both setting P_charge[t])
+        rule_analysis = analyze_rules(parsed_strategy)
+        if rule_analysis is not None:
+            for i in rule_analysis.unreachable:
+                st.warning(f"Rule {i + 1} is never applied, its condition cannot be true.", icon="⚠️")
+            for i, j, example in rule_analysis.overlapping:
+                st.info(f"Rules {i + 1} and {j + 1} can both apply in the same time step, e.g. if `{example}`.")
+
         st.session_state.prepared_for_simulation = True
     else:
         st.session_state.prepared_for_simulation = False
@@ -842,7 +950,7 @@ if st.session_state.clicked_parse_json_button:
             st.text_area("Problematic JSON Line", f"{error_line}\n{' ' * (error.colno - 1)}^", height=100)
 
 if st.session_state.prepared_for_simulation:
-    if use_own_load_profiles_check and (uploaded_file2 is not None) and (uploaded_demand_selectbox == "Standalone"):
+    if uploaded_demand_selectbox == "Standalone":
         st.warning(
             "**Warning:** You uploaded a load profile that is currently used without combining it with the selected load profile (it is used as a 'Standalone' profile). Consider combining it with the selected default profile via the dropdown menu in section 1.",
             icon="⚠️",
@@ -854,9 +962,368 @@ if st.session_state.prepared_for_simulation:
             icon="⚠️",
         )
 
-    if st.button("Start model calculation!"):
-        # Current Workaround to make variable available:Arguments for simulate_and_show_results are given to make globals available as locals to hand them over as the argument extra_variables for the save eval function
-        simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_emissions_specific)
+    # Inputs the energy flows depend on, prices, the feed-in tariff and emissions only if the strategy refers to them
+    parsed_strategy, is_valid, _ = parse_json_strategy(st.session_state.text_area_operating_strategy)
+    dispatch_key = None
+    if is_valid:
+        dispatch_key = simulation_cache.key(
+            pv_generation,
+            electricity_demand,
+            electricity_price_customer,
+            CO2_emissions_specific,
+            feed_in_tariff,
+            storage_capacity,
+            parsed_strategy,
+            time_step,
+        )
+
+    # The linear program of the optimal dispatch cannot be cancelled, long horizons would keep it busy for minutes
+    optimal_too_long = (
+        is_valid and find_kernel(parsed_strategy) is optimal_kernel and len(pv_generation) > MAX_OPTIMAL_TIME_STEPS
+    )
+    if optimal_too_long:
+        st.error(
+            f"**Error:** The optimal operation can be computed for at most {MAX_OPTIMAL_TIME_STEPS} time steps (a full year at a time step of 15 minutes). Please select a longer time step or a shorter simulation horizon.",
+            icon="🚨",
+        )
+
+    simulation_job = st.session_state.get("simulation_job")
+    if simulation_job is not None and simulation_job.status == "running" and simulation_job.key != dispatch_key:
+        # Inputs changed during the model calculation, its result would be stale
+        cancel_simulation_job("Model calculation cancelled, the inputs were changed.")
+        simulation_job = None
+
+    if st.button("Start model calculation!", disabled=optimal_too_long):
+        st.session_state.dispatch_key = dispatch_key
+        if is_valid:
+            simulation_job = st.session_state.simulation_job = simulation_cache.start(
+                pv_generation,
+                electricity_demand,
+                electricity_price_customer,
+                CO2_emissions_specific,
+                feed_in_tariff,
+                storage_capacity,
+                parsed_strategy,
+                time_step,
+            )
+        else:
+            # Shows the JSON error
+            simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_emissions_specific)
+
+    if simulation_job is not None and not simulation_job.wait(SIMULATION_WAIT_SECONDS):
+        show_simulation_progress(simulation_job)
+    elif dispatch_key is not None and st.session_state.get("dispatch_key") == dispatch_key:
+        # Shown after the model calculation and if the energy flows are unchanged since then (e.g. only the tariff
+        # was changed): the dispatch is taken from the finished job, only the costs and emissions are computed again
+        simulate_and_show_results(feed_in_tariff, electricity_price_customer, CO2_emissions_specific, simulation_job)
+
+    st.markdown("___")
+    st.markdown("# 6. Sizing sweep")
+    st.markdown(
+        """
+        Simulate the selected operating strategy for a whole grid of **PV and battery capacities** with all other inputs as above.
+        The cross marks the capacities selected in sections 1 and 3.
+        """
+    )
+    sweep_col1, sweep_col2 = st.columns(2)
+    with sweep_col1:
+        sweep_pv_range = st.slider("Range of PV capacities [kW]:", min_value=0.0, max_value=30.0, value=(1.0, 15.0))
+        sweep_n_pv = st.number_input("Number of PV capacities:", min_value=2, max_value=100, value=30)
+    with sweep_col2:
+        sweep_battery_range = st.slider(
+            "Range of battery capacities [kWh]:", min_value=0.0, max_value=30.0, value=(0.0, 20.0)
+        )
+        sweep_n_battery = st.number_input("Number of battery capacities:", min_value=2, max_value=100, value=30)
+
+    if st.button("Start sizing sweep!"):
+        if not is_valid:
+            st.error("The content is not valid JSON. Please correct any formatting errors.")
+        else:
+            with st.spinner(f"Simulating {sweep_n_pv * sweep_n_battery} combinations..."):
+                sweep_result = sweep(
+                    np.linspace(*sweep_pv_range, sweep_n_pv),
+                    np.linspace(*sweep_battery_range, sweep_n_battery),
+                    pv_cf,
+                    electricity_demand,
+                    electricity_price_customer,
+                    CO2_emissions_specific,
+                    feed_in_tariff,
+                    parsed_strategy,
+                    time_step=time_step,
+                )
+            if sweep_result.errors:
+                (pv_capacity, battery_capacity), error = next(iter(sweep_result.errors.items()))
+                st.error(
+                    f"{len(sweep_result.errors)} simulations failed and are left blank, e.g. for {pv_capacity:.1f} kW and {battery_capacity:.1f} kWh: {error}"
+                )
+
+            sweep_titles = {
+                "C_net": "Figure 6a: Total cost of electricity (feed-in at the feed-in tariff)",
+                "CO2_emissions": "Figure 6b: CO₂ emissions due to purchased electricity",
+                "Self-consumption": "Figure 6c: Self-consumption",
+                "Self-sufficiency": "Figure 6d: Self-sufficiency",
+            }
+            sweep_columns = st.columns(2)
+            for i, (name, unit) in enumerate(SWEEP_KPIS.items()):
+                with sweep_columns[i % 2]:
+                    st.plotly_chart(
+                        plot_sizing_heatmap(
+                            sweep_result.pv_capacities,
+                            sweep_result.battery_capacities,
+                            sweep_result.kpis[name],
+                            sweep_titles[name],
+                            unit,
+                            selected=(str_pv_cap, storage_capacity),
+                        )
+                    )
+
+    st.markdown("### Optimal battery capacity")
+    st.markdown(
+        """
+        Search the battery capacity with the **lowest total cost**, i.e. the cost of electricity (feed-in at the feed-in tariff)
+        plus the annualized battery cost for the simulated period.
+        """
+    )
+    optimization_col1, optimization_col2 = st.columns(2)
+    with optimization_col1:
+        battery_cost = st.number_input("Annualized battery cost [€/(kWh*a)]:", min_value=0.0, value=50.0)
+    with optimization_col2:
+        max_battery_capacity = st.number_input("Largest battery capacity [kWh]:", min_value=1.0, value=30.0)
+
+    if st.button("Optimize battery capacity!"):
+        if not is_valid:
+            st.error("The content is not valid JSON. Please correct any formatting errors.")
+        else:
+            with st.spinner("Searching the optimal battery capacity..."):
+                optimization_result = optimize_battery_capacity(
+                    pv_generation,
+                    electricity_demand,
+                    electricity_price_customer,
+                    CO2_emissions_specific,
+                    feed_in_tariff,
+                    parsed_strategy,
+                    battery_cost,
+                    max_battery_capacity,
+                    time_step=time_step,
+                )
+            if not np.isfinite(optimization_result.cost):
+                st.error(
+                    f"No battery capacity led to a valid simulation, e.g. {next(iter(optimization_result.errors.values()))}"
+                )
+            else:
+                st.markdown(
+                    f"### The optimal battery capacity is {optimization_result.battery_capacity:.2f} kWh with a total cost of {optimization_result.cost:.2f} €"
+                )
+                if optimization_result.errors:
+                    st.info(
+                        f"{len(optimization_result.errors)} of {optimization_result.n_evaluations} sampled capacities were skipped, the simulation failed or did not meet the demand."
+                    )
+                st.plotly_chart(
+                    plot_battery_cost_curve(
+                        optimization_result.samples, optimization_result.battery_capacity, optimization_result.cost
+                    )
+                )
+
+    st.markdown("___")
+    st.markdown("# 7. Fleet of households")
+    st.markdown(
+        """
+        Simulate **many households** with the selected operating strategy at once. Every household gets one of the default
+        load profiles and random PV and battery capacities from the ranges below, all other inputs are as above.
+        """
+    )
+    fleet_col1, fleet_col2 = st.columns(2)
+    with fleet_col1:
+        fleet_n_households = st.number_input("Number of households:", min_value=1, max_value=2000, value=100)
+        fleet_seed = st.number_input("Random seed:", min_value=0, value=0)
+    with fleet_col2:
+        fleet_pv_range = st.slider(
+            "Range of PV capacities of the households [kW]:", min_value=0.0, max_value=30.0, value=(2.0, 12.0)
+        )
+        fleet_battery_range = st.slider(
+            "Range of battery capacities of the households [kWh]:", min_value=0.0, max_value=30.0, value=(0.0, 15.0)
+        )
+
+    if st.button("Start fleet simulation!"):
+        if not is_valid:
+            st.error("The content is not valid JSON. Please correct any formatting errors.")
+        else:
+            rng = np.random.default_rng(fleet_seed)
+            fleet_pv_capacities = rng.uniform(*fleet_pv_range, fleet_n_households)
+            fleet_battery_capacities = rng.uniform(*fleet_battery_range, fleet_n_households)
+            load_profiles = default_electricity_demand.drop(columns="date_time").to_numpy(dtype=float).T
+            fleet_load = load_profiles[rng.integers(len(load_profiles), size=fleet_n_households)]
+            with st.spinner(f"Simulating {fleet_n_households} households..."):
+                fleet_result = simulate_fleet(
+                    fleet_pv_capacities[:, None] * pv_cf.to_numpy(dtype=float),
+                    fleet_load,
+                    electricity_price_customer,
+                    CO2_emissions_specific,
+                    feed_in_tariff,
+                    fleet_battery_capacities,
+                    parsed_strategy,
+                    time_step,
+                )
+            if fleet_result.errors:
+                household, error = next(iter(fleet_result.errors.items()))
+                st.error(
+                    f"The simulation failed for {len(fleet_result.errors)} households, e.g. for household {household + 1}: {error}"
+                )
+            n_failed_checks = int(np.any(list(fleet_result.checks.values()), axis=0).sum())
+            if n_failed_checks:
+                st.warning(
+                    f"{n_failed_checks} households failed at least one check of the battery operation or the energy balance."
+                )
+
+            st.markdown("### Results of the whole fleet")
+            st.table(
+                pd.DataFrame(
+                    {
+                        "Parameter": list(fleet_result.aggregate_kpis),
+                        "Value": [f"{value:.2f}" for value in fleet_result.aggregate_kpis.values()],
+                    }
+                )
+            )
+            fleet_kpis = pd.DataFrame(
+                {
+                    "PV capacity [kW]": fleet_pv_capacities,
+                    "Battery capacity [kWh]": fleet_battery_capacities,
+                    **fleet_result.kpis,
+                },
+                index=pd.RangeIndex(1, fleet_n_households + 1, name="Household"),
+            )
+            fleet_columns = st.columns(2)
+            with fleet_columns[0]:
+                st.plotly_chart(
+                    plot_fleet_households(
+                        fleet_pv_capacities,
+                        fleet_battery_capacities,
+                        fleet_result.kpis["Self-sufficiency"],
+                        "Figure 7a: Self-sufficiency of the households",
+                        "%",
+                    )
+                )
+            with fleet_columns[1]:
+                st.plotly_chart(
+                    plot_fleet_households(
+                        fleet_pv_capacities,
+                        fleet_battery_capacities,
+                        fleet_result.kpis["C_purchase_total"],
+                        "Figure 7b: Cost of purchased electricity of the households",
+                        "€",
+                    )
+                )
+            st.markdown("### Results per household")
+            st.dataframe(fleet_kpis.round(2))
+
+    st.markdown("___")
+    st.markdown("# 8. Uncertainty analysis")
+    st.markdown(
+        """
+        Simulate the selected operating strategy for many **random scenarios** of PV generation, demand and electricity price
+        (Monte Carlo simulation). Every hour is perturbed with normally distributed noise, optionally after drawing every day
+        of PV generation and demand from the same season of the full year.
+        """
+    )
+    monte_carlo_col1, monte_carlo_col2 = st.columns(2)
+    with monte_carlo_col1:
+        monte_carlo_n_scenarios = st.number_input("Number of scenarios:", min_value=10, max_value=10000, value=1000)
+        monte_carlo_bootstrap = st.checkbox(
+            "Draw the days of PV generation and demand from the full year (load profile 1)",
+            help="Every day is replaced by a random day at most 15 days away from the same calendar day.",
+        )
+        monte_carlo_seed = st.number_input("Random seed of the scenarios:", min_value=0, value=0)
+    with monte_carlo_col2:
+        monte_carlo_pv_noise = st.slider("Noise of the PV generation [%]:", min_value=0, max_value=50, value=10)
+        monte_carlo_load_noise = st.slider("Noise of the demand [%]:", min_value=0, max_value=50, value=10)
+        monte_carlo_price_noise = st.slider("Noise of the electricity price [%]:", min_value=0, max_value=50, value=10)
+
+    if st.button("Start uncertainty analysis!"):
+        if not is_valid:
+            st.error("The content is not valid JSON. Please correct any formatting errors.")
+        else:
+            bootstrap = None
+            if monte_carlo_bootstrap:
+                start = pd.Timestamp(date_time.iloc[0])
+                full_year_pv_cf, full_year_electricity_demand = load_full_year_scenario()
+                bootstrap = BootstrapSource(
+                    resample_time_series(full_year_pv_cf, time_step)["pv_cf"].to_numpy(dtype=float),
+                    resample_time_series(full_year_electricity_demand, time_step)["profile_1"].to_numpy(dtype=float),
+                    start_hour=(start.dayofyear - 1) * 24 + start.hour,
+                    window_days=15,
+                )
+            with st.spinner(f"Simulating {monte_carlo_n_scenarios} scenarios..."):
+                monte_carlo_result = run_monte_carlo(
+                    pv_cf,
+                    electricity_demand,
+                    electricity_price_customer,
+                    CO2_emissions_specific,
+                    feed_in_tariff,
+                    str_pv_cap,
+                    storage_capacity,
+                    parsed_strategy,
+                    n_scenarios=monte_carlo_n_scenarios,
+                    pv_noise=monte_carlo_pv_noise / 100,
+                    load_noise=monte_carlo_load_noise / 100,
+                    price_noise=monte_carlo_price_noise / 100,
+                    bootstrap=bootstrap,
+                    seed=monte_carlo_seed,
+                    time_step=time_step,
+                )
+            if monte_carlo_result.errors:
+                scenario, error = next(iter(monte_carlo_result.errors.items()))
+                st.error(
+                    f"The simulation failed for {len(monte_carlo_result.errors)} scenarios, they are left out. E.g. scenario {scenario + 1}: {error}"
+                )
+
+            st.table(
+                pd.DataFrame(
+                    {
+                        "Percentile": [f"P{percentile}" for percentile in monte_carlo_result.cost_percentiles],
+                        "Total cost [€]": [f"{value:.2f}" for value in monte_carlo_result.cost_percentiles.values()],
+                        "CO₂ emissions [gCO₂]": [
+                            f"{value:.2f}" for value in monte_carlo_result.CO2_percentiles.values()
+                        ],
+                    }
+                )
+            )
+            monte_carlo_columns = st.columns(2)
+            with monte_carlo_columns[0]:
+                st.plotly_chart(
+                    plot_scenario_distribution(
+                        monte_carlo_result.cost,
+                        monte_carlo_result.cost_percentiles,
+                        "Figure 8a: Total cost of electricity (feed-in at the feed-in tariff)",
+                        "€",
+                    )
+                )
+            with monte_carlo_columns[1]:
+                st.plotly_chart(
+                    plot_scenario_distribution(
+                        monte_carlo_result.CO2_emissions,
+                        monte_carlo_result.CO2_percentiles,
+                        "Figure 8b: CO₂ emissions due to purchased electricity",
+                        "gCO₂",
+                    )
+                )
+            st.plotly_chart(
+                plot_fan_chart(
+                    date_time,
+                    monte_carlo_result.flow_percentiles,
+                    ["P_purchase", "P_feed_in"],
+                    "Figure 8c: Purchased and fed-in power of the scenarios",
+                    "kW",
+                )
+            )
+            st.plotly_chart(
+                plot_fan_chart(
+                    date_time,
+                    monte_carlo_result.flow_percentiles,
+                    ["W_batt"],
+                    "Figure 8d: Storage level of the scenarios",
+                    "kWh",
+                )
+            )
 
 
 st.write("")
@@ -868,6 +1335,7 @@ with st.expander("Data Sources for Default Data"):
     st.write(
         "[3] [Visit Agora Data Tool](https://www.agora-energiewende.org/data-tools/agorameter/chart/today/power_price_emission/01.01.2024/31.12.2024/hourly)"
     )
+    st.write("[4] [Visit SMARD](https://www.smard.de/), emission factors per technology see emissions.py")
 
 with st.expander("Show session_state (only for debug)"):
     st.session_state
@@ -0,0 +1,295 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import numpy as np
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+from data_processing import (
+    align_time_series,
+    load_custom_load_profile,
+    load_default_co2_emissions,
+    load_default_electricity_demand,
+    load_default_electricity_price,
+    load_default_pv_cf,
+    load_full_year_scenario,
+    load_generation_mix_co2_emissions,
+    load_json,
+    read_uploaded_time_series,
+    repeat_time_series,
+    resample_time_series,
+)
+from simulation import calculate_electricity_price, result_csv, result_table, simulate
+from sweep import POOL_ERRORS, run_in_pool, sweep_kpis
+from time_index import map_to_year
+
+# Columns of the summary file, one row per run, followed by the performance indicators
+RUN_COLUMNS = ["run", "strategy", "input", "pv_capacity_kW", "battery_capacity_kWh"]
+KPI_COLUMNS = [
+    "C_purchase_total",
+    "C_feed_in_total",
+    "C_total",
+    "C_net",
+    "CO2_emissions",
+    "Self-consumption",
+    "Self-sufficiency",
+]
+SUMMARY_COLUMNS = RUN_COLUMNS + KPI_COLUMNS + ["engine", "error", "time_series_file"]
+
+# Input time series of a run, arrays of the time steps
+InputSet = namedtuple(
+    "InputSet", ["date_time", "pv_cf", "P_load", "electricity_price_customer", "CO2_emissions_specific", "time_step"]
+)
+
+# Input sets loaded by this process, see input_set()
+_input_sets = {}
+
+
+def read_upload(file_path, column, date_time, spec):
+    """Read a CSV file with 'date_time' and column and join it with the time steps like an upload in the app"""
+    with open(file_path, "rb") as file:
+        if column == "load":
+            data, error_msg = load_custom_load_profile(file, ",", spec.get("time_step", 1), spec.get("load_unit", "W"))
+        else:
+            data, error_msg = read_uploaded_time_series(file, ",", column)
+    if error_msg is None:
+        values, _, error_msg = align_time_series(
+            data, column, date_time, spec.get("fill", "interpolate"), spec.get("shift", "year")
+        )
+    if error_msg is not None:
+        raise ValueError(f"{file_path}: {error_msg}")
+    return values
+
+
+def load_input_set(spec):
+    """
+    Build the input time series of a run like the app does, from the default data and the given files.
+
+    Parameters:
+    spec (dict): Input set of the manifest, all entries are optional:
+    horizon ("week" or "year"), time_step [h], load_profile (column of the default demand, e.g. "profile_2"),
+    pv_cf, load, price, co2 (CSV files with 'date_time' and 'pv_cf', 'load', 'electricity_price' or
+    'CO2_emissions', co2 also "average" or "marginal" for the generation mix), load_unit ("W" or "kW"),
+    combine_load (add the uploaded load to the default profile), fill and shift (see align_time_series),
+    apply_additional_costs, taxes_and_fees [ct/kWh], grid_fees [ct/kWh].
+
+    Returns:
+    InputSet: Time stamps and input time series.
+    """
+    time_step = spec.get("time_step", 1)
+    pv_cf = load_default_pv_cf()
+    demand = load_default_electricity_demand()
+    price = load_default_electricity_price()
+    co2 = load_default_co2_emissions()
+    if spec.get("horizon", "week") == "year":
+        pv_cf, demand = load_full_year_scenario()
+        price = repeat_time_series(price, pv_cf["date_time"])
+        co2 = repeat_time_series(co2, pv_cf["date_time"])
+    pv_cf, demand, price, co2 = (resample_time_series(data, time_step) for data in (pv_cf, demand, price, co2))
+    date_time = pv_cf["date_time"]
+
+    P_load = demand[spec.get("load_profile", "profile_1")].to_numpy(dtype=float)
+    if "load" in spec:
+        uploaded_load = read_upload(spec["load"], "load", date_time, spec)
+        P_load = P_load + uploaded_load if spec.get("combine_load", False) else uploaded_load
+    pv_cf = read_upload(spec["pv_cf"], "pv_cf", date_time, spec) if "pv_cf" in spec else pv_cf["pv_cf"].to_numpy()
+    price = (
+        read_upload(spec["price"], "electricity_price", date_time, spec)
+        if "price" in spec
+        else price["electricity_price"].to_numpy()
+    )
+    co2 = co2["CO2_emissions"].to_numpy()
+    if spec.get("co2") in ("average", "marginal"):
+        column = f"CO2_emissions_{spec['co2']}"
+        generation_mix = load_generation_mix_co2_emissions().set_index("date_time")[[column]]
+        generation_mix = map_to_year(generation_mix, date_time.iloc[0].year).reset_index()
+        co2, _, error_msg = align_time_series(generation_mix, column, date_time)
+        if error_msg is not None:
+            raise ValueError(error_msg)
+    elif "co2" in spec:
+        co2 = read_upload(spec["co2"], "CO2_emissions", date_time, spec)
+
+    electricity_price_customer = calculate_electricity_price(
+        np.asarray(price, dtype=float),
+        spec.get("apply_additional_costs", False),
+        spec.get("taxes_and_fees", 5),
+        spec.get("grid_fees", 12),
+    )
+    return InputSet(date_time, pv_cf, P_load, electricity_price_customer, co2, time_step)
+
+
+def input_set(spec):
+    """Load an input set once per process, every worker of the pool builds the inputs of its runs itself"""
+    key = json.dumps(spec, sort_keys=True)
+    if key not in _input_sets:
+        _input_sets[key] = load_input_set(spec)
+    return _input_sets[key]
+
+
+def summary_row(run, strategy_name, input_name, pv_capacity, battery_capacity, error=None):
+    """Row of the summary file with the description of a run and the error, if it failed, see SUMMARY_COLUMNS"""
+    row = dict.fromkeys(SUMMARY_COLUMNS, "")
+    row.update(
+        run=run,
+        strategy=strategy_name,
+        input=input_name,
+        pv_capacity_kW=pv_capacity,
+        battery_capacity_kWh=battery_capacity,
+    )
+    if error is not None:
+        row["error"] = f"{type(error).__name__}: {error}"
+    return row
+
+
+def run_simulation(run, strategy_name, strategy, input_name, spec, pv_capacity, battery_capacity, feed_in_tariff, path):
+    """
+    Simulate one run of a batch (one task of the process pool).
+
+    The time series are written by the worker itself, so only the row of the summary is sent back. A run that fails
+    returns its error in the row, the other runs of the batch continue.
+
+    Returns:
+    dict: Row of the summary file, see SUMMARY_COLUMNS.
+    """
+    row = summary_row(run, strategy_name, input_name, pv_capacity, battery_capacity)
+    try:
+        inputs = input_set(spec)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = simulate(
+                pv_capacity * np.asarray(inputs.pv_cf, dtype=float),
+                inputs.P_load,
+                inputs.electricity_price_customer,
+                inputs.CO2_emissions_specific,
+                feed_in_tariff,
+                battery_capacity,
+                strategy,
+                inputs.time_step,
+            )
+        row.update(result.kpis, C_net=sweep_kpis(result, feed_in_tariff)["C_net"], engine=result.engine)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(result_csv(result_table(inputs.date_time, result)))
+            row["time_series_file"] = os.path.basename(path)
+    except Exception as error:
+        # E.g. a missing file or a capacity of the wrong type in the manifest
+        return summary_row(run, strategy_name, input_name, pv_capacity, battery_capacity, error)
+
+    if result.error is not None:
+        row["error"] = f"{type(result.error).__name__}: {result.error}"
+    return row
+
+
+def batch_tasks(manifest, output):
+    """
+    All runs of a manifest: every strategy with every input set, PV and battery capacity.
+
+    Parameters:
+    manifest (dict): See main().
+    output (str): Folder of the results.
+
+    Returns:
+    list: Arguments of run_simulation() per run.
+    """
+    strategies = manifest["strategies"]
+    if isinstance(strategies, list):
+        strategies = {os.path.splitext(os.path.basename(path))[0]: path for path in strategies}
+    inputs = manifest.get("inputs", {"default": {}})
+    tasks = []
+    for strategy_name, strategy_path in strategies.items():
+        strategy = load_json(strategy_path)
+        for input_name, spec in inputs.items():
+            for pv_capacity in manifest.get("pv_capacities", [6]):
+                for battery_capacity in manifest.get("battery_capacities", [12]):
+                    path = None
+                    if manifest.get("time_series", False):
+                        file_name = f"{strategy_name}_{input_name}_{pv_capacity}kW_{battery_capacity}kWh_results.csv"
+                        path = os.path.join(output, file_name)
+                    tasks.append(
+                        (
+                            len(tasks),
+                            strategy_name,
+                            strategy,
+                            input_name,
+                            spec,
+                            pv_capacity,
+                            battery_capacity,
+                            manifest.get("feed_in_tariff", 0.08),
+                            path,
+                        )
+                    )
+    return tasks
+
+
+def run_batch(tasks, processes=None):
+    """
+    Simulate the runs of a batch, spread over a process pool if more than one process is available.
+
+    Parameters:
+    tasks (list): Arguments of run_simulation(), see batch_tasks().
+    processes (int): Number of processes, None for the number of CPUs, 1 to simulate in this process.
+
+    Returns:
+    generator: Rows of the summary in the order the runs finish, failed runs with their error.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+    remaining = {task[0]: task for task in tasks}
+    if processes > 1:
+        try:
+            for i, future in run_in_pool(run_simulation, tasks, processes):
+                run, strategy_name, _, input_name, _, pv_capacity, battery_capacity, _, _ = tasks[i]
+                try:
+                    row = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as error:
+                    # E.g. a task that cannot be sent to the worker, the other runs continue
+                    row = summary_row(run, strategy_name, input_name, pv_capacity, battery_capacity, error)
+                del remaining[run]
+                yield row
+        except POOL_ERRORS:
+            # E.g. if processes cannot be started in this environment, simulate the remaining runs in this process
+            pass
+    for task in sorted(remaining.values()):
+        yield run_simulation(*task)
+
+
+def main(arguments=None):
+    """
+    Command line interface, run from the repository root: python batch.py manifest.json
+
+    The manifest is a JSON file with the keys strategies (list of strategy files or dict of name and file),
+    inputs (dict of name and input set, see load_input_set), pv_capacities [kW], battery_capacities [kWh],
+    feed_in_tariff [€/kWh] and time_series (write the time series of every run). See batch_example.json.
+    """
+    parser = argparse.ArgumentParser(description="Simulate operating strategies for many inputs without the app.")
+    parser.add_argument("manifest", help="JSON file with the strategies, inputs and capacities")
+    parser.add_argument("--output", default="results/batch", help="folder of the results (default: results/batch)")
+    parser.add_argument("--processes", type=int, default=None, help="number of processes (default: number of CPUs)")
+    arguments = parser.parse_args(arguments)
+
+    manifest = load_json(arguments.manifest)
+    os.makedirs(arguments.output, exist_ok=True)
+    tasks = batch_tasks(manifest, arguments.output)
+
+    n_failed = 0
+    with open(os.path.join(arguments.output, "summary.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, SUMMARY_COLUMNS)
+        writer.writeheader()
+        for i, row in enumerate(run_batch(tasks, arguments.processes), 1):
+            writer.writerow(row)
+            # Rows are on disk as soon as their run is finished
+            file.flush()
+            n_failed += bool(row["error"])
+            status = row["error"] or f"C_net {row['C_net']:.2f} €"
+            print(
+                f"[{i}/{len(tasks)}] {row['strategy']}, {row['input']}, {row['pv_capacity_kW']} kW, "
+                f"{row['battery_capacity_kWh']} kWh: {status}"
+            )
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
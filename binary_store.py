@@ -0,0 +1,180 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Binary copies of the input files, one folder per file and reader, created on first use
+STORE_DIRECTORY = "input_data/binary"
+MANIFEST_FILE = "columns.json"
+
+# Folder of the modules of the app, see code_digest()
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_store(data, directory, source=None):
+    """
+    Write a DataFrame to a folder with one .npy file per column.
+
+    The columns are stored as plain arrays, e.g. datetime64[ns] for the time stamps, so they can be memory-mapped
+    instead of parsed. The manifest with the column names is written last, a folder without it is incomplete.
+
+    Parameters:
+    data (DataFrame): Data with numeric or datetime columns.
+    directory (str): Folder of the store, created if necessary.
+    source (dict): Description of the source (file signature and reader), stored in the manifest.
+    """
+    arrays = {column: np.ascontiguousarray(data[column].to_numpy()) for column in data.columns}
+    for column, values in arrays.items():
+        if values.dtype.kind not in "biufM":
+            raise ValueError(f"Column {column} with dtype {values.dtype} cannot be stored as binary array")
+
+    os.makedirs(directory, exist_ok=True)
+    # Write to temporary files and replace, so concurrent readers never see partially written arrays
+    for i, (column, values) in enumerate(arrays.items()):
+        temporary_path = os.path.join(directory, f"{i}.npy.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            np.save(file, values, allow_pickle=False)
+        os.replace(temporary_path, os.path.join(directory, f"{i}.npy"))
+
+    manifest = {"columns": list(arrays), "source": source}
+    temporary_path = os.path.join(directory, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(temporary_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(temporary_path, os.path.join(directory, MANIFEST_FILE))
+
+
+def read_manifest(directory):
+    """Read the manifest of a store, None if the store does not exist or is incomplete"""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_store(directory, mmap_mode="r"):
+    """
+    Read a store written by write_store().
+
+    Parameters:
+    directory (str): Folder of the store.
+    mmap_mode (str): Memory-map mode passed to numpy.load, None to read the arrays into memory.
+
+    Returns:
+    DataFrame: The stored columns in their original order.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No binary store found in {directory}")
+    return pd.DataFrame(
+        {
+            column: np.load(os.path.join(directory, f"{i}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for i, column in enumerate(manifest["columns"])
+        }
+    )
+
+
+def repository_modules(module, modules=None):
+    """Source files of a module and of all modules of the app it uses, directly or through other modules"""
+    modules = set() if modules is None else modules
+    file_path = getattr(module, "__file__", None)
+    if file_path is None:
+        return modules
+    file_path = os.path.abspath(file_path)
+    if file_path in modules or os.path.dirname(file_path) != REPOSITORY:
+        return modules
+    modules.add(file_path)
+    for value in vars(module).values():
+        if inspect.ismodule(value):
+            repository_modules(value, modules)
+        elif inspect.isfunction(value) or inspect.isclass(value):
+            repository_modules(inspect.getmodule(value), modules)
+    return modules
+
+
+def code_digest(function):
+    """
+    SHA-1 of the source code a function depends on: its module and the modules of the app it uses.
+
+    Unlike a hash of the function's own code, this also changes if a helper it calls changes, e.g.
+    time_index.normalize_hourly() for the full-year readers of data_processing.
+    """
+    digest = hashlib.sha1()
+    for file_path in sorted(repository_modules(inspect.getmodule(function))):
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def source_description(file_path, read):
+    """Describe a source file and its reader, a store is only used while the description is unchanged"""
+    stat = os.stat(file_path)
+    return {
+        "file": os.path.normpath(file_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "reader": read.__qualname__,
+        "reader_code": code_digest(read),
+    }
+
+
+def store_directory(file_path, read):
+    """Folder of the binary copy of a file read with the given reader"""
+    return os.path.join(STORE_DIRECTORY, f"{os.path.basename(file_path)}.{read.__name__}")
+
+
+def binary_copy(read):
+    """
+    Decorator for readers of input time series, e.g. read_pv_cf(file_path) in data_processing.
+
+    The first call parses the text file as usual and stores the result with write_store(). Later calls, also in new
+    processes, memory-map the stored arrays, until the file or the code of the reader changes (see code_digest()). If the store cannot be written,
+    e.g. on a read-only file system, the parsed data is returned as before.
+    """
+
+    @functools.wraps(read)
+    def read_binary_copy(file_path):
+        source = source_description(file_path, read)
+        directory = store_directory(file_path, read)
+        manifest = read_manifest(directory)
+        if manifest is not None and manifest["source"] == source:
+            try:
+                return read_store(directory)
+            except (OSError, ValueError):
+                pass
+
+        data = read(file_path)
+        try:
+            write_store(data, directory, source)
+        except (OSError, ValueError):
+            pass
+        return data
+
+    return read_binary_copy
+
+
+def build_stores():
+    """Create the binary copies of all default and full-year input files, e.g. before deploying the app"""
+    # Imported here, data_processing uses binary_copy() for its readers
+    import data_processing
+
+    for load in [
+        data_processing.load_default_pv_cf,
+        data_processing.load_default_electricity_demand,
+        data_processing.load_default_electricity_price,
+        data_processing.load_default_co2_emissions,
+        data_processing.load_full_year_pv_cf,
+        data_processing.load_full_year_electricity_demand,
+        data_processing.load_generation_mix_co2_emissions,
+    ]:
+        data = load()
+        print(f"{load.__name__}: {len(data)} rows, columns {data.columns.to_list()}")
+
+
+if __name__ == "__main__":
+    # Run from the repository root: python binary_store.py
+    build_stores()
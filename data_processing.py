@@ -1,41 +1,202 @@
+import csv
+import os
 import pandas as pd
+import numpy as np
 import json
+from binary_store import binary_copy
+from time_index import assemble_scenario, normalize_hourly
 
+# Parsed input files shared by all sessions of the app process, see read_cached()
+# The time series readers are decorated with binary_copy, so new processes do not parse the text files either
+_file_cache = {}
 
-def load_default_pv_cf():
-    """Load default PV capacity factor data"""
+# Bytes read from the start of an upload to guess its separator, see sniff_separator()
+SNIFF_BYTES = 64 * 1024
+
+
+def read_cached(file_path, read):
+    """
+    Read a file once per process and return the stored result until the file changes on disk.
+
+    Streamlit reruns the whole script on every interaction, so without the cache every rerun of every session
+    would read and parse the same files again. A file counts as changed if its modification time or size differs.
+
+    Parameters:
+    file_path (str): Path of the file.
+    read (function): Module level function reading the file, called as read(file_path).
+
+    Returns:
+    object: Result of read(file_path), shared between all callers and not to be modified.
+    """
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = (file_path, read)
+    cached = _file_cache.get(key)
+    if cached is None or cached[0] != signature:
+        cached = _file_cache[key] = (signature, read(file_path))
+    return cached[1]
+
+
+def read_bytes(file_path):
+    """Read the content of a file"""
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def load_file_bytes(file_path):
+    """Load the content of a file, e.g. for a download button"""
+    return read_cached(file_path, read_bytes)
+
+
+@binary_copy
+def read_pv_cf(file_path):
+    """Read PV capacity factor data"""
+    return pd.read_csv(file_path, dtype={"pv_cf": float}, parse_dates=["date_time"])
+
+
+@binary_copy
+def read_electricity_demand(file_path):
+    """Read electricity demand profiles"""
     return pd.read_csv(
-        "input_data/hourly_pv_cf.csv",
-        dtype={"pv_cf": float},
+        file_path,
+        dtype={"profile_1": float, "profile_2": float, "profile_3": float},
         parse_dates=["date_time"],
     )
 
 
-def load_default_electricity_demand():
-    """Load default electricity demand profiles"""
+@binary_copy
+def read_electricity_price(file_path):
+    """Read electricity price data"""
+    return pd.read_csv(file_path, dtype={"electricity_price": float}, parse_dates=["date_time"])
+
+
+@binary_copy
+def read_co2_emissions(file_path):
+    """Read CO2 emissions data"""
+    return pd.read_csv(file_path, dtype={"CO2_emissions": float}, parse_dates=["date_time"])
+
+
+@binary_copy
+def read_generation_mix_co2_emissions(file_path):
+    """Read the CO2 emission factors derived from the generation mix, see preprocessing.py"""
     return pd.read_csv(
-        "input_data/hourly_electricity_demands_kWh (family, 2-working-persons, 1 pensioneer).csv",
-        dtype={"profile_1": float, "profile_2": float, "profile_3": float},
+        file_path,
+        dtype={"CO2_emissions_average": float, "CO2_emissions_marginal": float},
         parse_dates=["date_time"],
     )
 
 
+# Hours of the full-year data (8760 h), the year of the raw data
+FULL_YEAR_START = "2015-01-01 00:00:00"
+FULL_YEAR_END = "2015-12-31 23:00:00"
+
+
+@binary_copy
+def read_full_year_pv_cf(file_path):
+    """Read PV capacity factor data of 2015 from the raw data, on the hourly index of time_index.normalize_hourly()"""
+    pv_cf = pd.read_csv(file_path, usecols=[0, 1], index_col=0, parse_dates=True)
+    pv_cf = normalize_hourly(pv_cf, start=FULL_YEAR_START, end=FULL_YEAR_END)
+    return pd.DataFrame({"date_time": pv_cf.index, "pv_cf": pv_cf["pv cf"].to_numpy(dtype=float)})
+
+
+@binary_copy
+def read_full_year_electricity_demand(file_path):
+    """Read the electricity demand of profile 1 from the raw data, see read_full_year_pv_cf()"""
+    electricity_demand = pd.read_csv(file_path, index_col=0, parse_dates=True)
+    electricity_demand = normalize_hourly(electricity_demand, start=FULL_YEAR_START, end=FULL_YEAR_END)
+    return pd.DataFrame(
+        {
+            "date_time": electricity_demand.index,
+            "profile_1": electricity_demand["electricity_demand[kW]"].to_numpy(dtype=float),
+        }
+    )
+
+
+# The load_* functions below return copies of the cached data, so the shared data cannot be changed by a session
+def load_default_pv_cf():
+    """Load default PV capacity factor data"""
+    return read_cached("input_data/hourly_pv_cf.csv", read_pv_cf).copy()
+
+
+def load_default_electricity_demand():
+    """Load default electricity demand profiles"""
+    return read_cached(
+        "input_data/hourly_electricity_demands_kWh (family, 2-working-persons, 1 pensioneer).csv",
+        read_electricity_demand,
+    ).copy()
+
+
 def load_default_electricity_price():
     """Load default electricity price data"""
-    return pd.read_csv(
-        "input_data/hourly_electricity_price.csv",
-        dtype={"electricity_price": float},
-        parse_dates=["date_time"],
-    )
+    return read_cached("input_data/hourly_electricity_price.csv", read_electricity_price).copy()
 
 
 def load_default_co2_emissions():
     """Load default CO2 emissions data"""
-    return pd.read_csv(
-        "input_data/hourly_co2-emissions.csv",
-        dtype={"CO2_emissions": float},
-        parse_dates=["date_time"],
+    return read_cached("input_data/hourly_co2-emissions.csv", read_co2_emissions).copy()
+
+
+def load_generation_mix_co2_emissions():
+    """Load average and marginal CO2 emission factors of the German generation mix of 2021 (8760 h)"""
+    return read_cached("input_data/hourly_co2-emissions_generation_mix.csv", read_generation_mix_co2_emissions).copy()
+
+
+def load_full_year_pv_cf():
+    """Load PV capacity factor data for a full year (8760 h, same source as the default week)"""
+    return read_cached("input_data/raw_data/flows_and_storage_RAW.csv", read_full_year_pv_cf).copy()
+
+
+def load_full_year_electricity_demand():
+    """Load electricity demand for a full year (8760 h), only available for profile 1"""
+    return read_cached(
+        "input_data/raw_data/ffe_id-11-0_hourly_elec_demand_RAW.csv", read_full_year_electricity_demand
+    ).copy()
+
+
+def load_full_year_scenario():
+    """
+    Load the PV capacity factor and the electricity demand of profile 1 for all hours of the full year (8760 h).
+
+    The sources are joined on their hourly index by time_index.assemble_scenario().
+
+    Returns:
+    tuple: DataFrames with 'date_time' and 'pv_cf' and with 'date_time' and 'profile_1'.
+    """
+    scenario = assemble_scenario(
+        {
+            "pv_cf": load_full_year_pv_cf().set_index("date_time")["pv_cf"],
+            "profile_1": load_full_year_electricity_demand().set_index("date_time")["profile_1"],
+        },
+        pd.Timestamp(FULL_YEAR_START).year,
     )
+    return scenario[["date_time", "pv_cf"]], scenario[["date_time", "profile_1"]]
+
+
+def resample_time_series(data, time_step):
+    """
+    Resample hourly data to a shorter time step, every value is repeated for all time steps of its hour.
+
+    Parameters:
+    data (DataFrame): Hourly data with a 'date_time' column, e.g. the default week.
+    time_step (float): Length of a time step [h], e.g. 0.25 for 15 minutes.
+
+    Returns:
+    DataFrame: Data with one row per time step.
+    """
+    steps_per_hour = round(1 / time_step)
+    if steps_per_hour == 1:
+        return data
+    resampled = data.iloc[np.repeat(np.arange(len(data)), steps_per_hour)].reset_index(drop=True)
+    minutes = np.tile(np.arange(steps_per_hour) * round(60 * time_step), len(data))
+    resampled["date_time"] = resampled["date_time"].to_numpy() + pd.to_timedelta(minutes, unit="min")
+    return resampled
+
+
+def repeat_time_series(data, date_time):
+    """Repeat time series data (e.g. the default week) until it covers all time stamps in date_time"""
+    repeated = data.iloc[np.arange(len(date_time)) % len(data)].reset_index(drop=True)
+    repeated["date_time"] = date_time.to_numpy()
+    return repeated
 
 
 def load_json(file_path):
@@ -55,78 +216,196 @@ def load_operating_strategy(strategy_name):
         os = load_json("operating_strategies/no_battery.json")
         return json.dumps(os, indent=4)
 
+    elif strategy_name == "Optimal (perfect foresight)":
+        os = load_json("operating_strategies/optimal.json")
+        return json.dumps(os, indent=4)
+
     elif strategy_name == "Custom":
         os = load_json("operating_strategies/reference.json")
         # Added newline to ensure reload happens if custom_os and reference_os are identical
         return json.dumps(os, indent=4) + "\n"
 
 
-def load_custom_pv_cf(uploaded_file, separator):
-    """Process uploaded PV capacity factor data"""
+def sniff_separator(file, default=","):
+    """
+    Guess the separator of a CSV file from its first lines.
+
+    Parameters:
+    file (file-like): Binary or text file, read from the start and rewound afterwards.
+    default (str): Separator if the file gives no clear answer, e.g. a single column.
+
+    Returns:
+    str: ",", ";" or a tab.
+    """
+    file.seek(0)
+    sample = file.read(SNIFF_BYTES)
+    file.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8", errors="ignore")
     try:
-        uploaded_pv_cf = pd.read_csv(uploaded_file, sep=separator, engine="python")
-        if len(uploaded_pv_cf) != 168:
-            return (
-                None,
-                f"Failed to apply times series: Please provide exactly 168 value rows. Found {len(uploaded_pv_cf)} rows with values.",
-            )
-        elif not all(col in ["date_time", "pv_cf"] for col in uploaded_pv_cf.columns):
-            return (
-                None,
-                f"Failed to apply times series: Please rename the columns to match ['date_time'{separator}  'pv_cf']! Found {uploaded_pv_cf.columns.to_list()}.",
+        return csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except csv.Error:
+        return default
+
+
+def parse_time_stamps(values):
+    """Parse time stamps of an upload: Unix time in seconds (Shelly API), ISO dates or other dates, days first"""
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_datetime(values, unit="s")
+    try:
+        return pd.to_datetime(values, format="ISO8601")
+    except ValueError:
+        return pd.to_datetime(values, dayfirst=True)
+
+
+def load_custom_load_profile(uploaded_file, separator, time_step=1, unit="kW", chunksize=100_000):
+    """
+    Process uploaded load profile data, e.g. a Shelly Plug export at any time resolution.
+
+    The file is read in chunks with the C parser and every chunk is reduced to the sum and the number of its values
+    per simulation time step, so the memory does not grow with the length of the file: a log of seconds over a
+    year is turned into the mean power per time step like a file that has one row per time step already. The
+    separator is sniffed from the file (the selected one is used if that fails). Time steps without values are
+    left out, see align_time_series() for joining the profile with the simulation.
+
+    Parameters:
+    uploaded_file (file-like): CSV file with the columns 'date_time' and 'load' (power).
+    separator (str): Separator selected in the app, used if it cannot be sniffed.
+    time_step (float): Length of a time step [h].
+    unit (str): Unit of the load, "W" or "kW".
+    chunksize (int): Number of rows parsed at once.
+
+    Returns:
+    tuple: DataFrame with 'date_time' (start of the time step) and 'load' [kW], or None, and an error message or None.
+    """
+    try:
+        separator = sniff_separator(uploaded_file, separator)
+        time_step_ns = pd.Timedelta(hours=time_step).value
+        sums = []
+        for chunk in pd.read_csv(uploaded_file, sep=separator, engine="c", chunksize=chunksize):
+            if not all(col in chunk.columns for col in ["date_time", "load"]):
+                return (
+                    None,
+                    f"Please rename the columns to match ['date_time'{separator}  'load']! Found {chunk.columns.to_list()}.",
+                )
+            chunk = pd.DataFrame(
+                {
+                    "step": parse_time_stamps(chunk["date_time"]).to_numpy(dtype="datetime64[ns]").view(np.int64),
+                    "load": pd.to_numeric(chunk["load"], errors="coerce"),
+                }
             )
-        else:
-            return uploaded_pv_cf, None
+            chunk = chunk[(chunk["step"] != np.iinfo(np.int64).min) & chunk["load"].notna()]
+            chunk["step"] //= time_step_ns
+            sums.append(chunk.groupby("step")["load"].agg(["sum", "count"]))
     except Exception as e:
         return None, f"Error processing file: {str(e)}"
 
+    if not sums:
+        return None, "The uploaded file contains no values."
+    # Time steps can be split between chunks
+    sums = pd.concat(sums).groupby(level=0).sum()
+    load = (sums["sum"] / sums["count"]).to_numpy()
+    if unit == "W":
+        load = load / 1000
+    return pd.DataFrame({"date_time": pd.to_datetime(sums.index.to_numpy() * time_step_ns), "load": load}), None
 
-def load_custom_load_profile(uploaded_file, separator):
-    """Process uploaded load profile data"""
+
+def read_uploaded_time_series(uploaded_file, separator, column):
+    """
+    Read an uploaded time series with its time stamps, see align_time_series() for joining it with the simulation.
+
+    Parameters:
+    uploaded_file (file-like): CSV file with the columns 'date_time' and column.
+    separator (str): Separator selected in the app, used if it cannot be sniffed from the file.
+    column (str): Name of the value column, e.g. 'pv_cf'.
+
+    Returns:
+    tuple: DataFrame with 'date_time' and column, or None, and an error message or None.
+    """
     try:
-        uploaded_load_profile = pd.read_csv(uploaded_file, sep=separator, engine="python")
-        if len(uploaded_load_profile) != 168:
-            return None, f"Please provide exactly 168 value rows. Found {len(uploaded_load_profile)} rows with values."
-        elif not all(col in ["date_time", "load"] for col in uploaded_load_profile.columns):
+        separator = sniff_separator(uploaded_file, separator)
+        uploaded = pd.read_csv(uploaded_file, sep=separator, engine="c")
+        if not all(col in uploaded.columns for col in ["date_time", column]):
             return (
                 None,
-                f"Please rename the columns to match ['date_time'{separator}  'load']! Found {uploaded_load_profile.columns.to_list()}.",
+                f"Please rename the columns to match ['date_time'{separator}  '{column}']! Found {uploaded.columns.to_list()}.",
             )
-        else:
-            return uploaded_load_profile, None
+        return (
+            pd.DataFrame(
+                {
+                    "date_time": parse_time_stamps(uploaded["date_time"]),
+                    column: pd.to_numeric(uploaded[column], errors="coerce"),
+                }
+            ),
+            None,
+        )
     except Exception as e:
         return None, f"Error processing file: {str(e)}"
 
 
+def load_custom_pv_cf(uploaded_file, separator):
+    """Process uploaded PV capacity factor data"""
+    return read_uploaded_time_series(uploaded_file, separator, "pv_cf")
+
+
 def load_custom_elec_price(uploaded_file, separator):
     """Process uploaded electricity price data"""
-    try:
-        uploaded_elec_price = pd.read_csv(uploaded_file, sep=separator, engine="python")
-        if len(uploaded_elec_price) != 168:
-            return None, f"Please provide exactly 168 value rows. Found {len(uploaded_elec_price)} rows with values."
-        elif not all(col in ["date_time", "electricity_price"] for col in uploaded_elec_price.columns):
-            return (
-                None,
-                f"Please rename the columns to match ['date_time'{separator}  'electricity_price']! Found {uploaded_elec_price.columns.to_list()}.",
-            )
-        else:
-            return uploaded_elec_price, None
-    except Exception as e:
-        return None, f"Error processing file: {str(e)}"
+    return read_uploaded_time_series(uploaded_file, separator, "electricity_price")
 
 
 def load_custom_co2_emissions(uploaded_file, separator):
     """Process uploaded CO2 emissions data"""
-    try:
-        uploaded_co2_emissions = pd.read_csv(uploaded_file, sep=separator, engine="python")
-        if len(uploaded_co2_emissions) != 168:
-            return None, f"Please provide exactly 168 value rows. Found {len(uploaded_co2_emissions)} rows with values."
-        elif not all(col in ["date_time", "CO2_emissions"] for col in uploaded_co2_emissions.columns):
-            return (
-                None,
-                f"Please rename the columns to match ['date_time'{separator}  'CO2_emissions']! Found {uploaded_co2_emissions.columns.to_list()}.",
-            )
-        else:
-            return uploaded_co2_emissions, None
-    except Exception as e:
-        return None, f"Error processing file: {str(e)}"
+    return read_uploaded_time_series(uploaded_file, separator, "CO2_emissions")
+
+
+def align_time_series(data, column, date_time, fill="interpolate", shift=None):
+    """
+    Join an uploaded time series with the time steps of the simulation by their time stamps.
+
+    Every value is assigned to the time step it falls into (the mean is taken if there are several), so uploads
+    with another start, gaps or another resolution are aligned instead of being used row by row. Time steps
+    without a value are filled, at the start and the end of the period with the nearest value.
+
+    Parameters:
+    data (DataFrame): Uploaded data with 'date_time' and column, see read_uploaded_time_series().
+    column (str): Name of the value column.
+    date_time (Series): Start of the simulated time steps, regular and sorted.
+    fill (str): "interpolate" for a linear interpolation in time, "previous" to keep the previous value, e.g. for
+    prices that change in steps.
+    shift (str): None to use the time stamps as they are, "year" to move them by whole years to the simulated year,
+    "start" to move them so the upload starts with the simulated period, e.g. for a Shelly Plug log of other days.
+
+    Returns:
+    tuple: Values per time step (array) or None, number of filled time steps and an error message or None.
+    """
+    data = data[data["date_time"].notna() & data[column].notna()]
+    if len(data) == 0:
+        return None, 0, "The uploaded file contains no values."
+    times = pd.DatetimeIndex(data["date_time"])
+    if shift == "year":
+        times = times + pd.DateOffset(years=date_time.iloc[0].year - times.min().year)
+    elif shift == "start":
+        times = times + (date_time.iloc[0] - times.min())
+
+    starts = date_time.to_numpy(dtype="datetime64[ns]")
+    # The last time step is as long as the one before
+    end = starts[-1] + (starts[-1] - starts[-2] if len(starts) > 1 else np.timedelta64(1, "h"))
+    steps = np.searchsorted(starts, times.to_numpy(dtype="datetime64[ns]"), side="right") - 1
+    inside = (steps >= 0) & (times.to_numpy(dtype="datetime64[ns]") < end)
+    if not inside.any():
+        return (
+            None,
+            0,
+            f"The uploaded time series ({times.min()} to {times.max()}) does not overlap the simulated period "
+            f"({date_time.iloc[0]} to {date_time.iloc[-1]}).",
+        )
+    counts = np.bincount(steps[inside], minlength=len(starts))
+    sums = np.bincount(steps[inside], weights=data[column].to_numpy(dtype=float)[inside], minlength=len(starts))
+    with np.errstate(invalid="ignore"):
+        values = pd.Series(sums / counts, index=pd.DatetimeIndex(starts))
+
+    if fill == "previous":
+        values = values.ffill().bfill()
+    else:
+        values = values.interpolate(method="time", limit_direction="both")
+    return values.to_numpy(), int(np.count_nonzero(counts == 0)), None
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+# Direct CO2 emissions of the electricity generation per technology [gCO2/kWh], typical values for German power
+# plants. Biomass is counted as CO2 neutral, pumped storage only shifts electricity generated by the others.
+TECHNOLOGY_FACTORS = {
+    "Biomass": 0,
+    "Hydropower": 0,
+    "Wind offshore": 0,
+    "Wind onshore": 0,
+    "Photovoltaics": 0,
+    "Other renewable": 0,
+    "Nuclear": 0,
+    "Lignite": 1100,
+    "Hard coal": 850,
+    "Fossil gas": 400,
+    "Hydro pumped storage": 0,
+    "Other conventional": 700,
+}
+
+# Length of the moving window of the regression for the marginal emission factors [h]
+MARGINAL_WINDOW_HOURS = 24
+
+
+def read_generation_mix(file_path):
+    """Read the hourly electricity generation per technology [MWh], columns named as in TECHNOLOGY_FACTORS"""
+    generation = pd.read_csv(file_path, index_col=0, parse_dates=True)
+    generation.columns = [column.removesuffix(" [MWh]") for column in generation.columns]
+    return generation
+
+
+def factor_vector(technologies, factors=TECHNOLOGY_FACTORS):
+    """
+    Emission factors in the order of the technologies, e.g. the columns of the generation mix.
+
+    Raises:
+    KeyError: If there is no factor for a technology.
+    """
+    missing = [technology for technology in technologies if technology not in factors]
+    if missing:
+        raise KeyError(f"No emission factor for the technologies {missing}")
+    return np.array([factors[technology] for technology in technologies], dtype=float)
+
+
+def average_emission_factors(generation, factors=TECHNOLOGY_FACTORS):
+    """
+    Average CO2 emission factor of the generated electricity per hour.
+
+    Parameters:
+    generation (DataFrame): Generation per technology [MWh], one row per hour.
+    factors (dict): Emission factor per technology [gCO2/kWh].
+
+    Returns:
+    array: Emissions divided by the total generation [gCO2/kWh], NaN for hours without generation.
+    """
+    mix = generation.to_numpy(dtype=float)
+    emissions = mix @ factor_vector(generation.columns, factors)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mix.sum(axis=1) > 0, emissions / mix.sum(axis=1), np.nan)
+
+
+def marginal_emission_factors(generation, factors=TECHNOLOGY_FACTORS, window_hours=MARGINAL_WINDOW_HOURS):
+    """
+    Marginal CO2 emission factor per hour, the additional emissions of additional demand.
+
+    The changes of the emissions from one hour to the next are regressed on the changes of the generation of the
+    emitting power plants in a moving window, so the slope is the emission factor of the plants that follow the
+    demand at that time, e.g. gas when it is the last plant in the merit order and coal otherwise.
+
+    Parameters:
+    generation (DataFrame): Generation per technology [MWh], one row per hour.
+    factors (dict): Emission factor per technology [gCO2/kWh].
+    window_hours (int): Length of the moving window centered on each hour [h].
+
+    Returns:
+    array: Marginal emission factors [gCO2/kWh], between 0 and the largest factor of the technologies.
+    """
+    factor = factor_vector(generation.columns, factors)
+    mix = generation.to_numpy(dtype=float)
+    emission_change = pd.Series(np.diff(mix @ factor, prepend=np.nan))
+    generation_change = pd.Series(np.diff(mix[:, factor > 0].sum(axis=1), prepend=np.nan))
+
+    window = dict(window=window_hours, center=True, min_periods=window_hours // 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = emission_change.rolling(**window).cov(generation_change) / generation_change.rolling(**window).var()
+    # Windows without changes of the emitting plants
+    slope = slope.interpolate(limit_direction="both").fillna(factor.max())
+    return slope.clip(0, factor.max()).to_numpy()
+
+
+def derive_emission_factors(
+    generation, start=None, end=None, factors=TECHNOLOGY_FACTORS, window_hours=MARGINAL_WINDOW_HOURS
+):
+    """
+    Average and marginal CO2 emission factors of a period from the hourly generation mix.
+
+    The factors are computed for the whole generation mix, so the moving windows of the marginal factors at the
+    ends of the period also see the hours before and after it.
+
+    Parameters:
+    generation (DataFrame): Generation per technology [MWh] on an hourly DatetimeIndex, see read_generation_mix()
+    and time_index.normalize_hourly().
+    start, end (str): First and last time stamp of the period (both included), None for the first or last hour.
+    factors (dict): Emission factor per technology [gCO2/kWh].
+    window_hours (int): Length of the moving window of the marginal emission factors [h].
+
+    Returns:
+    DataFrame: 'date_time', 'CO2_emissions_average' and 'CO2_emissions_marginal' [gCO2/kWh].
+    """
+    emission_factors = pd.DataFrame(
+        {
+            "date_time": generation.index,
+            "CO2_emissions_average": average_emission_factors(generation, factors),
+            "CO2_emissions_marginal": marginal_emission_factors(generation, factors, window_hours),
+        },
+        index=generation.index,
+    )
+    return emission_factors.loc[start:end].reset_index(drop=True)
@@ -0,0 +1,212 @@
+import numpy as np
+from collections import namedtuple
+from simulation import TimeSeries, compute_kpis, simulate
+from strategy import HOUSEHOLD_HELPERS, NotVectorizable, compile_households_strategy
+
+# Result of simulate_fleet(), arrays of (households, time steps) unless noted otherwise.
+# state: dict of the state variables (P_charge, ..., SoC), kpis: dict of the performance indicators per household,
+# aggregate_kpis: dict of the performance indicators of the whole fleet, checks: dict of the failed checks per
+# household, engine: "fleet" or "per household", errors: dict of household index and error of failed households
+FleetResult = namedtuple(
+    "FleetResult",
+    [
+        "P_pv",
+        "P_load",
+        "state",
+        "E_purchase",
+        "E_feed_in",
+        "CO2_generated",
+        "net_energy_balance",
+        "kpis",
+        "aggregate_kpis",
+        "checks",
+        "engine",
+        "errors",
+    ],
+)
+
+STATE_VARIABLES = ["P_charge", "P_discharge", "P_feed_in", "P_purchase", "W_batt", "SoC"]
+
+
+def dispatch_fleet(
+    P_pv, P_load, electricity_price_customer, CO2_emissions_specific, feed_in_tariff, W_batt_max, rules, time_step=1
+):
+    """
+    Simulate the energy flows of all households at once, one time step after the other.
+
+    Every variable holds one value per household for a time step, so each rule is evaluated once per time step for
+    the whole fleet and only applied to the households its condition holds for.
+
+    Parameters:
+    P_pv, P_load (array): PV generation and electricity demand [kW] of (households, time steps).
+    electricity_price_customer, CO2_emissions_specific (array): Price [€/kWh] and specific CO2 emissions [gCO2/kWh]
+    of (households, time steps).
+    feed_in_tariff (float): PV feed-in tariff [€/kWh].
+    W_batt_max (array): Usable storage capacity per household [kWh].
+    rules (list): Rules as returned by strategy.compile_households_strategy().
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    dict: State variables of (time steps, households).
+    """
+    n_households, n_steps = P_pv.shape
+    state = {name: TimeSeries(np.zeros((n_steps, n_households))) for name in STATE_VARIABLES}
+    variables = {
+        **HOUSEHOLD_HELPERS,
+        "P_pv": TimeSeries(P_pv.T),
+        "P_load": TimeSeries(P_load.T),
+        "W_batt_max": W_batt_max,
+        "feed_in_tariff": feed_in_tariff,
+        "time_step": time_step,
+        "electricity_price_customer": TimeSeries(electricity_price_customer.T),
+        "CO2_emissions_specific": TimeSeries(CO2_emissions_specific.T),
+        **state,
+    }
+    P_charge = state["P_charge"].values
+    P_discharge = state["P_discharge"].values
+    W_batt = state["W_batt"].values
+    SoC = state["SoC"].values
+
+    for t in range(n_steps):
+        variables["t"] = t
+        for condition, assignments in rules:
+            mask = np.asarray(eval(condition, variables), dtype=bool)
+            if not mask.any():
+                continue
+            for name, index, value in assignments:
+                np.copyto(variables[name][eval(index, variables)], eval(value, variables), where=mask)
+
+        W_batt_previous = 0 if t == 0 else W_batt[t - 1]
+        W_batt[t] = np.minimum(
+            np.maximum(W_batt_previous + P_charge[t] * time_step - P_discharge[t] * time_step, 0), W_batt_max
+        )
+        SoC[t] = W_batt[t] / W_batt_max
+    return {name: series.values.T for name, series in state.items()}
+
+
+def simulate_fleet(
+    P_pv,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    W_batt_max,
+    strategy,
+    time_step=1,
+):
+    """
+    Simulate many households with their own demand, PV and battery size and the same operating strategy.
+
+    The rules are evaluated for all households at once (see dispatch_fleet), so a fleet takes about as long as a few
+    single simulations. Strategies that cannot be evaluated this way (e.g. the optimal dispatch or actions other than
+    X[t] = ...) and fleets where a strategy fails are simulated household by household with simulation.simulate().
+
+    Parameters:
+    P_pv (array): PV generation [kW] of (households, time steps), or of the time steps for all households.
+    P_load (array): Electricity demand [kW] of (households, time steps), or of the time steps for all households.
+    electricity_price_customer (array): Electricity price [€/kWh] of (households, time steps) or of the time steps.
+    CO2_emissions_specific (array): Specific CO2 emissions [gCO2/kWh] of (households, time steps) or of the time steps.
+    feed_in_tariff (float): PV feed-in tariff [€/kWh].
+    W_batt_max (array): Usable storage capacity per household [kWh], or one capacity for all households.
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    FleetResult: Result arrays, performance indicators per household and of the fleet, and check flags.
+    """
+    P_pv, P_load = np.atleast_2d(P_pv, P_load)
+    n_households = max(len(P_pv), len(P_load))
+    n_steps = P_pv.shape[1]
+
+    def per_household(values):
+        return np.array(np.broadcast_to(values, (n_households, n_steps)), dtype=float)
+
+    P_pv = per_household(P_pv)
+    P_load = per_household(P_load)
+    electricity_price_customer = per_household(electricity_price_customer)
+    CO2_emissions_specific = per_household(CO2_emissions_specific)
+    W_batt_max = np.array(np.broadcast_to(W_batt_max, n_households), dtype=float)
+    errors = {}
+
+    state = None
+    try:
+        rules = compile_households_strategy(strategy)
+    except (NotVectorizable, ValueError, TypeError, KeyError, SyntaxError):
+        rules = None
+    if rules is not None:
+        try:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                state = dispatch_fleet(
+                    P_pv,
+                    P_load,
+                    electricity_price_customer,
+                    CO2_emissions_specific,
+                    feed_in_tariff,
+                    W_batt_max,
+                    rules,
+                    time_step,
+                )
+            engine = "fleet"
+        except Exception:
+            # Simulated household by household below, which reports the error of each household
+            state = None
+
+    if state is None:
+        engine = "per household"
+        state = {name: np.zeros((n_households, n_steps)) for name in STATE_VARIABLES}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in range(n_households):
+                result = simulate(
+                    P_pv[i],
+                    P_load[i],
+                    electricity_price_customer[i],
+                    CO2_emissions_specific[i],
+                    feed_in_tariff,
+                    W_batt_max[i],
+                    strategy,
+                    time_step,
+                )
+                for name in STATE_VARIABLES:
+                    state[name][i] = getattr(result.state, name).values
+                if result.error is not None:
+                    errors[i] = f"{type(result.error).__name__}: {result.error}"
+
+    net_energy_balance = (
+        P_load - P_pv + state["P_charge"] - state["P_discharge"] + state["P_feed_in"] - state["P_purchase"]
+    )
+    # SoC at the end of the previous time step (the initial SoC for t=0)
+    SoC_previous = np.concatenate((np.zeros((n_households, 1)), state["SoC"][:, :-1]), axis=1)
+    checks = {
+        "batteryChargeCheck": np.any((state["P_charge"] > 0) & (SoC_previous == 1), axis=1),
+        "batteryDischargeCheck": np.any((state["P_discharge"] > 0) & (SoC_previous == 0), axis=1),
+        "noArbitrageCheck1": np.any(state["P_feed_in"] > P_pv, axis=1),
+        "noArbitrageCheck2": np.any(state["P_charge"] > P_pv, axis=1),
+        "energyBalanceCheck": np.any(np.abs(net_energy_balance) > 1e-10, axis=1),
+    }
+
+    E_purchase = state["P_purchase"] * time_step  # [kWh]
+    E_feed_in = state["P_feed_in"] * time_step  # [kWh]
+    CO2_generated = CO2_emissions_specific * E_purchase  # [gCO2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kpis = compute_kpis(
+            P_pv, P_load, state["P_feed_in"], E_purchase, E_feed_in, electricity_price_customer, CO2_generated, axis=1
+        )
+        # The fleet as one system: sums over all households and time steps
+        aggregate_kpis = compute_kpis(
+            P_pv, P_load, state["P_feed_in"], E_purchase, E_feed_in, electricity_price_customer, CO2_generated
+        )
+
+    return FleetResult(
+        P_pv=P_pv,
+        P_load=P_load,
+        state=state,
+        E_purchase=E_purchase,
+        E_feed_in=E_feed_in,
+        CO2_generated=CO2_generated,
+        net_energy_balance=net_energy_balance,
+        kpis=kpis,
+        aggregate_kpis=aggregate_kpis,
+        checks=checks,
+        engine=engine,
+        errors=errors,
+    )
@@ -0,0 +1,209 @@
+import math
+import numpy as np
+import pandas as pd
+from data_processing import load_json, load_default_pv_cf, load_default_electricity_demand
+from optimal_dispatch import solve_optimal_dispatch
+
+
+def progress_interval(n_steps):
+    """Number of time steps between two progress reports of a kernel, about one report per percent"""
+    return max(n_steps // 100, 1)
+
+
+def simulate_battery(state, W_batt_max, time_step=1, progress=None):
+    """
+    Compute the storage level and the state of charge for the charging and discharging powers of all time steps.
+
+    Only valid if the charging and discharging powers do not depend on the storage level, e.g. for the
+    No battery strategy or if all rules were applied at once.
+
+    Parameters:
+    state (SimulationState): State with the final P_charge and P_discharge, W_batt and SoC are set in place.
+    W_batt_max (float): Usable storage capacity [kWh].
+    time_step (float): Length of a time step [h].
+    progress (callable): Called as progress(t, state) about every percent of the time steps, see dispatch().
+    """
+    P_charge = state.P_charge.values
+    P_discharge = state.P_discharge.values
+    n_steps = len(P_charge)
+    interval = progress_interval(n_steps)
+    W_batt_previous = 0
+    # The storage level is written in blocks, so the state is complete up to every progress report
+    for start in range(0, n_steps, interval):
+        if progress is not None:
+            progress(start, state)
+        W_batt = []
+        for charge, discharge in zip(
+            P_charge[start : start + interval].tolist(), P_discharge[start : start + interval].tolist()
+        ):
+            W_batt_previous = min(max(W_batt_previous + charge * time_step - discharge * time_step, 0), W_batt_max)
+            W_batt.append(W_batt_previous)
+        state.W_batt.values[start : start + interval] = W_batt
+        with np.errstate(divide="ignore", invalid="ignore"):
+            state.SoC.values[start : start + interval] = state.W_batt.values[start : start + interval] / W_batt_max
+
+
+def reference_kernel(
+    state, P_pv, P_load, W_batt_max, electricity_price_customer, feed_in_tariff, time_step=1, progress=None
+):
+    """
+    Native implementation of operating_strategies/reference.json, including the battery update.
+
+    Parameters:
+    state (SimulationState): State of the simulation, all variables are set in place.
+    P_pv (array): PV generation [kW].
+    P_load (array): Electricity demand [kW].
+    W_batt_max (float): Usable storage capacity [kWh].
+    electricity_price_customer (array): Electricity price [€/kWh], not used by this strategy.
+    feed_in_tariff (float): PV feed-in tariff [€/kWh], not used by this strategy.
+    time_step (float): Length of a time step [h].
+    progress (callable): Called as progress(t, state) about every percent of the time steps, see dispatch(). It may
+    raise SimulationCancelled to stop the kernel.
+    """
+    P_charge = state.P_charge.values
+    P_discharge = state.P_discharge.values
+    P_feed_in = state.P_feed_in.values
+    P_purchase = state.P_purchase.values
+    W_batt = state.W_batt.values
+    SoC = state.SoC.values
+
+    interval = progress_interval(len(P_pv))
+    W_batt_previous = 0
+    SoC_previous = 0.0
+    for t, (pv, load) in enumerate(zip(P_pv.tolist(), P_load.tolist())):
+        if progress is not None and t % interval == 0:
+            progress(t, state)
+        charge = discharge = 0.0
+        if pv <= load:
+            if t > 0 and SoC_previous > 0.0:
+                discharge = P_discharge[t] = min(load - pv, W_batt_max)
+            if t == 0 or SoC_previous == 0.0:
+                P_purchase[t] = load - pv
+        elif pv > load:
+            if t == 0 or SoC_previous < 1.0:
+                charge = P_charge[t] = min(pv - load, W_batt_max)
+            if t == 0 or SoC_previous == 1.0:
+                P_feed_in[t] = pv - load
+
+        W_batt_previous = W_batt[t] = min(
+            max(W_batt_previous + charge * time_step - discharge * time_step, 0), W_batt_max
+        )
+        SoC_previous = SoC[t] = W_batt_previous / W_batt_max if W_batt_max else math.nan
+
+
+def no_battery_kernel(
+    state, P_pv, P_load, W_batt_max, electricity_price_customer, feed_in_tariff, time_step=1, progress=None
+):
+    """
+    Native implementation of operating_strategies/no_battery.json, including the battery update.
+
+    Parameters:
+    See reference_kernel().
+    """
+    np.copyto(state.P_feed_in.values, P_pv - P_load, where=P_pv > P_load)
+    np.copyto(state.P_purchase.values, P_load - P_pv, where=P_pv <= P_load)
+    simulate_battery(state, W_batt_max, time_step, progress)
+
+
+def optimal_kernel(
+    state, P_pv, P_load, W_batt_max, electricity_price_customer, feed_in_tariff, time_step=1, progress=None
+):
+    """
+    Dispatch of operating_strategies/optimal.json, the cost-optimal operation with perfect foresight.
+
+    The linear program is solved by optimal_dispatch.solve_optimal_dispatch(). Solver noise is removed, so the exact
+    checks after the simulation (e.g. no charging of a full battery) hold for the optimal dispatch as well. The
+    solver cannot be interrupted, progress is only reported (and a cancellation noticed) before and after it, see
+    MAX_OPTIMAL_TIME_STEPS.
+
+    Parameters:
+    See reference_kernel().
+    """
+    optimum = solve_optimal_dispatch(P_pv, P_load, electricity_price_customer, feed_in_tariff, W_batt_max, time_step)
+
+    # Remove solver noise, a time step either charges or discharges
+    P_net_charge = optimum.P_charge - optimum.P_discharge
+    P_net_charge[np.abs(P_net_charge) < 1e-9] = 0.0
+    P_charge = np.minimum(np.maximum(P_net_charge, 0), np.maximum(P_pv, 0))
+    P_discharge = np.maximum(-P_net_charge, 0)
+    P_feed_in = np.clip(optimum.P_feed_in, 0, np.maximum(P_pv, 0))
+    P_feed_in[P_feed_in < 1e-9] = 0.0
+
+    # Purchase closing the energy balance exactly
+    P_purchase = np.maximum(P_load - P_pv + P_charge - P_discharge + P_feed_in, 0)
+    P_feed_in = P_pv - P_load - P_charge + P_discharge + P_purchase
+
+    state.P_charge.values[:] = P_charge
+    state.P_discharge.values[:] = P_discharge
+    state.P_feed_in.values[:] = P_feed_in
+    state.P_purchase.values[:] = P_purchase
+    simulate_battery(state, W_batt_max, time_step, progress)
+
+
+# Longest simulation horizon of the optimal kernel, a year at a time step of 15 minutes. The linear program takes
+# a few seconds for it, but minutes for a year at a time step of one minute, and cannot be cancelled meanwhile.
+MAX_OPTIMAL_TIME_STEPS = 35040
+
+# Native kernels of the bundled operating strategies
+STRATEGY_KERNELS = {
+    "operating_strategies/reference.json": reference_kernel,
+    "operating_strategies/no_battery.json": no_battery_kernel,
+    "operating_strategies/optimal.json": optimal_kernel,
+}
+
+_bundled_strategies = {}
+
+
+def find_kernel(strategy):
+    """
+    Find the native kernel for an operating strategy, if it is one of the bundled strategies.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, e.g. from the text area.
+
+    Returns:
+    function: The kernel, or None if the strategy differs from all bundled strategies.
+    """
+    for file_path, kernel in STRATEGY_KERNELS.items():
+        if file_path not in _bundled_strategies:
+            _bundled_strategies[file_path] = load_json(file_path)
+        if strategy == _bundled_strategies[file_path]:
+            return kernel
+    return None
+
+
+def verify_kernels():
+    """
+    Check the kernels against the results in results/ (default data, 6 kW, 12 kWh, additional costs applied).
+
+    Returns:
+    bool: True if the simulated time series of all kernels match the stored results.
+    """
+    # Imported here, the simulation module itself uses the kernels
+    from simulation import simulate
+
+    P_pv = 6 * load_default_pv_cf()["pv_cf"].to_numpy(dtype=float)
+    P_load = load_default_electricity_demand()["profile_1"].to_numpy(dtype=float)
+    golden_files = {
+        "operating_strategies/reference.json": "results/reference_results.csv",
+        "operating_strategies/no_battery.json": "results/no_battery_results.csv",
+    }
+
+    all_match = True
+    for strategy_file, golden_file in golden_files.items():
+        strategy = load_json(strategy_file)
+        # Prices and emissions do not change the simulated time series
+        result = simulate(P_pv, P_load, np.zeros_like(P_pv), np.zeros_like(P_pv), 0.08, 12, strategy)
+        # Compare with the same formatting as the stored results
+        simulated = np.char.mod("%.2f", result.state.to_dataframe(range(len(P_pv))).to_numpy())
+        # Columns P_charge, P_discharge, P_feed_in, P_purchase, W_batt and SoC of the stored results
+        golden = pd.read_csv(golden_file, dtype=str).iloc[:, 5:11].to_numpy()
+        match = result.engine == STRATEGY_KERNELS[strategy_file].__name__ and bool((simulated == golden).all())
+        print(f"{result.engine}: {'results match' if match else 'results differ from'} {golden_file}")
+        all_match = all_match and match
+    return all_match
+
+
+if __name__ == "__main__":
+    # Run from the repository root: python kernels.py
+    raise SystemExit(0 if verify_kernels() else 1)
@@ -0,0 +1,252 @@
+import os
+import numpy as np
+from collections import namedtuple
+from fleet import simulate_fleet
+from sweep import POOL_ERRORS, run_in_pool
+
+# Percentiles reported for the distributions of the scenario results [%]
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Variables of the state whose percentiles per time step are kept for fan charts
+FAN_VARIABLES = ("P_purchase", "P_feed_in", "W_batt")
+
+HOURS_PER_DAY = 24
+
+# Annual time series to draw whole days from, see bootstrap_days()
+# pv_cf, P_load: arrays of a full year at the time step of the simulation [-], [kW],
+# start_hour: hour of the year of the first simulated time step,
+# window_days: days are drawn from the same calendar day +- window_days, so the season is kept
+BootstrapSource = namedtuple("BootstrapSource", ["pv_cf", "P_load", "start_hour", "window_days"])
+
+# n_scenarios: number of simulated scenarios, cost: net cost of electricity per scenario [€] (see sweep.sweep_kpis),
+# CO2_emissions: CO2 emissions per scenario [gCO2], cost_percentiles, CO2_percentiles: dict of percentile and value,
+# flow_percentiles: dict of variable (FAN_VARIABLES) and an array of (percentiles, time steps),
+# engine: engine of the simulations, errors: dict of scenario index and error of failed scenarios
+MonteCarloResult = namedtuple(
+    "MonteCarloResult",
+    [
+        "n_scenarios",
+        "cost",
+        "CO2_emissions",
+        "cost_percentiles",
+        "CO2_percentiles",
+        "flow_percentiles",
+        "engine",
+        "errors",
+    ],
+)
+
+
+def add_noise(values, relative_noise, rng, upper=np.inf):
+    """
+    Perturb time series with normally distributed relative noise, independently for every value.
+
+    Parameters:
+    values (array): Time series, all rows are perturbed independently.
+    relative_noise (float): Standard deviation of the noise relative to the values, e.g. 0.1 for 10 %.
+    rng (numpy.random.Generator): Random number generator.
+    upper (float): Upper limit of the perturbed values, e.g. 1 for a capacity factor.
+
+    Returns:
+    array: Perturbed values, never negative.
+    """
+    if relative_noise == 0:
+        return np.array(values, dtype=float)
+    return np.clip(values * rng.normal(1, relative_noise, np.shape(values)), 0, upper)
+
+
+def bootstrap_days(annual, n_scenarios, n_steps, start_hour, window_days, rng, time_step=1):
+    """
+    Build scenarios from randomly drawn days of a full year of data.
+
+    Every day of the simulated period is replaced by a day of the annual data that is at most window_days away from
+    the same calendar day, so the scenarios keep the daily and the seasonal pattern.
+
+    Parameters:
+    annual (array): Values of a full year, one per time step.
+    n_scenarios (int): Number of scenarios.
+    n_steps (int): Number of time steps of the simulated period.
+    start_hour (int): Hour of the year of the first time step.
+    window_days (int): Largest distance between the drawn and the simulated calendar day [d].
+    rng (numpy.random.Generator): Random number generator.
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    array: Scenarios of (n_scenarios, n_steps).
+    """
+    annual = np.asarray(annual, dtype=float)
+    steps_per_day = round(HOURS_PER_DAY / time_step)
+    n_days = len(annual) // steps_per_day
+    steps = round(start_hour / time_step) + np.arange(n_steps)
+    days = steps // steps_per_day
+    offsets = rng.integers(-window_days, window_days + 1, size=(n_scenarios, days[-1] - days[0] + 1))
+    drawn_days = (days + offsets[:, days - days[0]]) % n_days
+    return annual[drawn_days * steps_per_day + steps % steps_per_day]
+
+
+def simulate_scenarios(
+    seed,
+    first_scenario,
+    n_scenarios,
+    pv_cf,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    pv_capacity,
+    W_batt_max,
+    strategy,
+    pv_noise,
+    load_noise,
+    price_noise,
+    bootstrap,
+    time_step,
+):
+    """
+    Draw and simulate a batch of scenarios (one task of the process pool), see run_monte_carlo().
+
+    The random numbers of a batch only depend on the seed and the index of its first scenario, so the results do
+    not depend on the number of processes.
+
+    Returns:
+    tuple: Cost and CO2 emissions per scenario, dict of FAN_VARIABLES and their values of (scenarios, time steps),
+    engine and dict of scenario index and error.
+    """
+    rng = np.random.default_rng([seed, first_scenario])
+    n_steps = len(pv_cf)
+    if bootstrap is not None:
+        pv_cf, P_load = (
+            bootstrap_days(annual, n_scenarios, n_steps, bootstrap.start_hour, bootstrap.window_days, rng, time_step)
+            for annual in (bootstrap.pv_cf, bootstrap.P_load)
+        )
+    pv_cf = add_noise(np.broadcast_to(pv_cf, (n_scenarios, n_steps)), pv_noise, rng, upper=1)
+    P_load = add_noise(np.broadcast_to(P_load, (n_scenarios, n_steps)), load_noise, rng)
+    electricity_price_customer = add_noise(
+        np.broadcast_to(electricity_price_customer, (n_scenarios, n_steps)), price_noise, rng
+    )
+
+    result = simulate_fleet(
+        pv_capacity * pv_cf,
+        P_load,
+        electricity_price_customer,
+        CO2_emissions_specific,
+        feed_in_tariff,
+        W_batt_max,
+        strategy,
+        time_step,
+    )
+    cost = np.nansum(result.E_purchase * electricity_price_customer, axis=1) - (
+        np.nansum(result.E_feed_in, axis=1) * feed_in_tariff
+    )
+    flows = {name: result.state[name].astype(np.float32) for name in FAN_VARIABLES}
+    errors = {first_scenario + i: error for i, error in result.errors.items()}
+    return cost, result.kpis["CO2_emissions"], flows, result.engine, errors
+
+
+def run_monte_carlo(
+    pv_cf,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    pv_capacity,
+    W_batt_max,
+    strategy,
+    n_scenarios=1000,
+    pv_noise=0.1,
+    load_noise=0.1,
+    price_noise=0.1,
+    bootstrap=None,
+    seed=0,
+    processes=None,
+    batch_size=250,
+    time_step=1,
+):
+    """
+    Simulate an operating strategy for many random scenarios of the PV generation, the demand and the price.
+
+    The scenarios are the given time series with relative noise, optionally built from randomly drawn days of a full
+    year first (see bootstrap_days). They are simulated in batches of batch_size scenarios with
+    fleet.simulate_fleet(), which evaluates the rules for all scenarios of a batch at once, and the batches are
+    spread over a process pool if more than one process is available.
+
+    Parameters:
+    pv_cf (array): PV capacity factor, P_pv = pv_capacity * pv_cf.
+    P_load, electricity_price_customer, CO2_emissions_specific, feed_in_tariff, W_batt_max, strategy:
+    See simulation.simulate().
+    pv_capacity (float): PV capacity [kW].
+    n_scenarios (int): Number of scenarios.
+    pv_noise, load_noise, price_noise (float): Relative standard deviation of the noise, e.g. 0.1 for 10 %.
+    bootstrap (BootstrapSource): Annual data to draw the days of PV and demand from, None to perturb the given days.
+    seed (int): Seed of the random numbers, the same seed gives the same scenarios.
+    processes (int): Number of processes, None for the number of CPUs, 1 to simulate in this process.
+    batch_size (int): Number of scenarios simulated at once.
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    MonteCarloResult: Distributions of cost and CO2 emissions and percentiles of the energy flows.
+    """
+    pv_cf = np.asarray(pv_cf, dtype=float)
+    tasks = [
+        (
+            seed,
+            first_scenario,
+            min(batch_size, n_scenarios - first_scenario),
+            pv_cf,
+            np.asarray(P_load, dtype=float),
+            np.asarray(electricity_price_customer, dtype=float),
+            np.asarray(CO2_emissions_specific, dtype=float),
+            feed_in_tariff,
+            pv_capacity,
+            W_batt_max,
+            strategy,
+            pv_noise,
+            load_noise,
+            price_noise,
+            bootstrap,
+            time_step,
+        )
+        for first_scenario in range(0, n_scenarios, batch_size)
+    ]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+    batches = None
+    if processes > 1:
+        try:
+            batches = [None] * len(tasks)
+            for i, future in run_in_pool(simulate_scenarios, tasks, processes):
+                batches[i] = future.result()
+        except POOL_ERRORS:
+            # E.g. if processes cannot be started in this environment, simulate in this process instead
+            batches = None
+    if batches is None:
+        batches = [simulate_scenarios(*task) for task in tasks]
+
+    cost = np.concatenate([batch[0] for batch in batches])
+    CO2_emissions = np.concatenate([batch[1] for batch in batches])
+    errors = {index: error for batch in batches for index, error in batch[4].items()}
+    # Failed scenarios are left out of the distributions
+    valid = np.ones(n_scenarios, dtype=bool)
+    valid[list(errors)] = False
+
+    def percentiles(values):
+        values = values[valid]
+        if len(values) == 0:
+            return np.full((len(PERCENTILES), *values.shape[1:]), np.nan)
+        return np.percentile(values, PERCENTILES, axis=0)
+
+    flow_percentiles = {
+        name: percentiles(np.concatenate([batch[2][name] for batch in batches])) for name in FAN_VARIABLES
+    }
+    return MonteCarloResult(
+        n_scenarios=n_scenarios,
+        cost=cost,
+        CO2_emissions=CO2_emissions,
+        cost_percentiles=dict(zip(PERCENTILES, percentiles(cost))),
+        CO2_percentiles=dict(zip(PERCENTILES, percentiles(CO2_emissions))),
+        flow_percentiles=flow_percentiles,
+        engine=batches[0][3],
+        errors=errors,
+    )
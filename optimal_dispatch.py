@@ -0,0 +1,81 @@
+import numpy as np
+from collections import namedtuple
+
+# Energy flows of the optimal dispatch [kW] and storage level [kWh], one array per variable
+OptimalDispatch = namedtuple(
+    "OptimalDispatch", ["P_charge", "P_discharge", "P_feed_in", "P_purchase", "W_batt", "cost"]
+)
+
+
+def solve_optimal_dispatch(P_pv, P_load, electricity_price_customer, feed_in_tariff, W_batt_max, time_step=1):
+    """
+    Dispatch with the lowest electricity cost for perfectly known time series, solved as a sparse linear program.
+
+    Variables per time step are P_charge, P_discharge, P_feed_in, P_purchase, W_batt and the PV power used directly
+    by the load. The PV generation is split into direct use, charging and feed-in, the demand is met by direct use,
+    discharging and purchase. Together these give the energy balance of net_energy_balance and the no-arbitrage rules
+    of the checks after every simulation: the battery is only charged from PV and only discharged to the load. The
+    storage level starts empty and stays between 0 and W_batt_max. The objective is the cost of purchased electricity
+    minus the feed-in compensation. Solved with the HiGHS solver of SciPy.
+
+    Parameters:
+    P_pv (array): PV generation [kW].
+    P_load (array): Electricity demand [kW].
+    electricity_price_customer (array): Electricity price [€/kWh].
+    feed_in_tariff (float): PV feed-in tariff [€/kWh].
+    W_batt_max (float): Usable storage capacity [kWh].
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    OptimalDispatch: The optimal energy flows and storage level, and the minimal cost [€].
+
+    Raises:
+    ImportError: If SciPy is not installed.
+    RuntimeError: If the solver does not find the optimum.
+    """
+    try:
+        from scipy import sparse
+        from scipy.optimize import linprog
+    except ImportError:
+        raise ImportError("The optimal dispatch requires SciPy, please install it (pip install scipy)")
+
+    P_pv = np.maximum(np.asarray(P_pv, dtype=float), 0)
+    P_load = np.asarray(P_load, dtype=float)
+    n = len(P_pv)
+    identity = sparse.identity(n, format="csr")
+    zeros = sparse.csr_matrix((n, n))
+    # W_batt[t] - W_batt[t-1], with W_batt[-1] = 0
+    storage_difference = identity - sparse.eye(n, k=-1, format="csr")
+
+    # Variables: [P_charge, P_discharge, P_feed_in, P_purchase, W_batt, P_pv_direct], n values each
+    A_eq = sparse.vstack(
+        [
+            # PV generation: P_pv_direct + P_charge + P_feed_in = P_pv
+            sparse.hstack([identity, zeros, identity, zeros, zeros, identity]),
+            # Demand: P_pv_direct + P_discharge + P_purchase = P_load
+            sparse.hstack([zeros, identity, zeros, identity, zeros, identity]),
+            # Storage: W_batt[t] - W_batt[t-1] - (P_charge[t] - P_discharge[t]) * time_step = 0
+            sparse.hstack([-time_step * identity, time_step * identity, zeros, zeros, storage_difference, zeros]),
+        ],
+        format="csr",
+    )
+    b_eq = np.concatenate([P_pv, P_load, np.zeros(n)])
+
+    unbounded = np.full(n, np.inf)
+    upper = np.concatenate([unbounded, unbounded, unbounded, unbounded, np.full(n, max(W_batt_max, 0)), unbounded])
+    bounds = np.column_stack([np.zeros(6 * n), upper])
+    cost = np.concatenate(
+        [
+            np.zeros(2 * n),
+            np.full(n, -feed_in_tariff * time_step),
+            np.asarray(electricity_price_customer, dtype=float) * time_step,
+            np.zeros(2 * n),
+        ]
+    )
+
+    solution = linprog(cost, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs")
+    if solution.status != 0:
+        raise RuntimeError(f"Optimal dispatch failed: {solution.message}")
+
+    P_charge, P_discharge, P_feed_in, P_purchase, W_batt, _ = np.split(solution.x, 6)
+    return OptimalDispatch(P_charge, P_discharge, P_feed_in, P_purchase, W_batt, solution.fun)
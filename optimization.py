@@ -0,0 +1,119 @@
+import math
+import numpy as np
+from collections import namedtuple
+from simulation import simulate
+from sweep import sweep_kpis
+
+# Hours of a year, to scale annualized costs to the simulated horizon
+HOURS_PER_YEAR = 8760
+
+# battery_capacity: capacity with the lowest total cost [kWh], cost: its total cost [€],
+# samples: list of (battery capacity, total cost) in the order of evaluation, errors: dict of capacity and error
+BatteryOptimizationResult = namedtuple(
+    "BatteryOptimizationResult", ["battery_capacity", "cost", "samples", "n_evaluations", "errors"]
+)
+
+# 1 / golden ratio
+INVERSE_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+def golden_section_search(function, lower, upper, tolerance):
+    """
+    Find the minimum of a unimodal function in [lower, upper] with a golden-section search.
+
+    Every iteration shrinks the interval by the factor 0.618 with a single new function evaluation.
+
+    Parameters:
+    function (function): Function of one variable to minimize.
+    lower (float): Lower bound of the interval.
+    upper (float): Upper bound of the interval.
+    tolerance (float): The search stops once the interval is shorter.
+
+    Returns:
+    tuple: Position and value of the lowest evaluated point.
+    """
+    x1 = upper - INVERSE_GOLDEN_RATIO * (upper - lower)
+    x2 = lower + INVERSE_GOLDEN_RATIO * (upper - lower)
+    f1 = function(x1)
+    f2 = function(x2)
+    while upper - lower > tolerance:
+        if f1 <= f2:
+            upper, x2, f2 = x2, x1, f1
+            x1 = upper - INVERSE_GOLDEN_RATIO * (upper - lower)
+            f1 = function(x1)
+        else:
+            lower, x1, f1 = x1, x2, f2
+            x2 = lower + INVERSE_GOLDEN_RATIO * (upper - lower)
+            f2 = function(x2)
+    return (x1, f1) if f1 <= f2 else (x2, f2)
+
+
+def optimize_battery_capacity(
+    P_pv,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    strategy,
+    battery_cost,
+    max_capacity,
+    time_step=1,
+    n_grid=21,
+    tolerance=0.01,
+):
+    """
+    Search the battery capacity with the lowest total cost for the given inputs and operating strategy.
+
+    The total cost is the net cost of electricity (feed-in at the feed-in tariff, see sweep.sweep_kpis) plus the
+    annualized battery cost, scaled to the simulated horizon. The cost curve of a short horizon is not smooth and can
+    have several local minima, so a coarse grid of n_grid capacities first finds the region of the lowest cost. A
+    golden-section search between the neighbours of the best grid point then refines it, about 35 simulations in total.
+
+    Parameters:
+    P_pv, P_load, electricity_price_customer, CO2_emissions_specific, feed_in_tariff, strategy: See simulate().
+    battery_cost (float): Annualized battery cost [€/(kWh*a)].
+    max_capacity (float): Largest battery capacity considered [kWh].
+    time_step (float): Length of a time step [h].
+    n_grid (int): Number of capacities of the coarse grid, including 0 and max_capacity.
+    tolerance (float): Accuracy of the capacity [kWh].
+
+    Returns:
+    BatteryOptimizationResult: Capacity and total cost of the minimum and all sampled points.
+    """
+    horizon_share = len(P_pv) * time_step / HOURS_PER_YEAR
+    samples = []
+    errors = {}
+
+    def total_cost(battery_capacity):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = simulate(
+                P_pv,
+                P_load,
+                electricity_price_customer,
+                CO2_emissions_specific,
+                feed_in_tariff,
+                battery_capacity,
+                strategy,
+                time_step,
+            )
+        if result.error is not None:
+            errors[battery_capacity] = f"{type(result.error).__name__}: {result.error}"
+            cost = math.inf
+        elif result.checks["energyBalanceCheck"]:
+            # E.g. the demand is not met for a capacity of 0 kWh, the cost is not comparable
+            errors[battery_capacity] = "Energy balance violated"
+            cost = math.inf
+        else:
+            cost = sweep_kpis(result, feed_in_tariff)["C_net"] + battery_cost * battery_capacity * horizon_share
+        samples.append((battery_capacity, cost))
+        return cost
+
+    grid = np.linspace(0, max_capacity, n_grid).tolist()
+    grid_costs = [total_cost(battery_capacity) for battery_capacity in grid]
+    i_best = int(np.argmin(grid_costs))
+    if math.isfinite(grid_costs[i_best]):
+        golden_section_search(total_cost, grid[max(i_best - 1, 0)], grid[min(i_best + 1, n_grid - 1)], tolerance)
+
+    # Lowest of all sampled points, the golden-section search may end next to a lower point of a jagged cost curve
+    battery_capacity, cost = min(samples, key=lambda sample: sample[1])
+    return BatteryOptimizationResult(battery_capacity, cost, samples, len(samples), errors)
@@ -0,0 +1,415 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+from collections import namedtuple
+from binary_store import code_digest
+from emissions import MARGINAL_WINDOW_HOURS, TECHNOLOGY_FACTORS, derive_emission_factors, read_generation_mix
+from time_index import LOCAL_TIME_ZONE, normalize_hourly
+
+# Hashes of the sources, parameters and content of the derived files of the last build
+MANIFEST_FILE = "input_data/derived_files.json"
+
+# Default time window of the derived files, the week of the default data (both ends included)
+DEFAULT_START = "2015-01-01 00:00:00"
+DEFAULT_END = "2015-01-07 23:00:00"
+
+# A file in input_data/ that is created from other files.
+# path: the derived file, sources: files it is created from (RAW files or other derived files),
+# transform: module level function called as transform(sources, start, end, **parameters), returns the CSV text,
+# parameters: dict of further arguments of the transform,
+# window: (start, end) for files of a fixed period, None to use the time window of the build
+DerivedFile = namedtuple("DerivedFile", ["path", "sources", "transform", "parameters", "window"], defaults=[None])
+
+
+def read_source(file_path):
+    """Read a time series with the time stamps in the first column, floats exactly as written in the file"""
+    return pd.read_csv(file_path, index_col=0, parse_dates=True, encoding="utf-8-sig", float_precision="round_trip")
+
+
+def check_window(file_path, data, start, end):
+    """
+    Check that a time series covers the whole time window, so no input file of the app ends up with a shorter one.
+
+    Raises:
+    ValueError: If the first time stamp is after start or the last one before end.
+    """
+    index = data.index
+    if len(index) == 0 or index.min() > pd.Timestamp(start) or index.max() < pd.Timestamp(end):
+        covered = f"{index.min()} to {index.max()}" if len(index) else "no time stamps"
+        raise ValueError(f"{file_path} covers {covered}, not {start} to {end}")
+
+
+def check_hours(file_path, data, start, end):
+    """
+    Check that a time series has one value per hour of the time window, e.g. a file combined time step by time step
+    with the derived files.
+
+    Raises:
+    ValueError: If the number of values differs from the number of hours.
+    """
+    n_hours = len(pd.date_range(start, end, freq="h"))
+    if len(data) != n_hours:
+        raise ValueError(f"{file_path} has {len(data)} values, not one per hour of {start} to {end} ({n_hours})")
+
+
+def repeat_week(file_path, data, start, end):
+    """
+    Repeat the first week of an hourly time series over a time window, like data_processing.repeat_time_series()
+    repeats the default week for the full year in the app.
+
+    The hours are counted from the first time stamp of the data, so every value keeps its weekday and hour.
+
+    Raises:
+    ValueError: If the data does not start with a week of hourly values.
+    """
+    first = data.index.min()
+    week = data.loc[first : first + pd.Timedelta(hours=167)]
+    if not week.index.equals(pd.date_range(first, periods=168, freq="h")):
+        raise ValueError(f"{file_path} does not start with a week of hourly values")
+    window = pd.date_range(start, end, freq="h")
+    positions = ((window - first) // pd.Timedelta(hours=1)) % 168
+    return week.iloc[positions].set_axis(window)
+
+
+def select_columns(
+    sources,
+    start,
+    end,
+    columns,
+    divide_by=1,
+    offset=0,
+    decimals=None,
+    float_format=None,
+    date_format=None,
+    repeat_weekly=False,
+):
+    """
+    Cut a time window out of a source and write some of its columns, e.g. the default week of a full-year RAW file.
+
+    Parameters:
+    sources (list): Path of the source file.
+    start, end (str): First and last time stamp of the window.
+    columns (dict): Names of the source columns and of the columns in the derived file.
+    divide_by, offset (float): The values are written as value / divide_by + offset, e.g. 1000 for €/MWh to €/kWh.
+    decimals (int): Round the values to this many decimals, None to keep them.
+    float_format (str): Format of the values, e.g. "%.2f", None for all digits.
+    date_format (str): Format of the time stamps, None for "%Y-%m-%d %H:%M:%S".
+    repeat_weekly (bool): For sources of a single week: repeat the week over a window the source does not cover,
+    see repeat_week().
+
+    Returns:
+    str: CSV text with a 'date_time' column and the selected columns.
+    """
+    source = read_source(sources[0])
+    try:
+        check_window(sources[0], source, start, end)
+        source = source.loc[start:end]
+    except ValueError:
+        if not repeat_weekly:
+            raise
+        source = repeat_week(sources[0], source, start, end)
+    date_time = source.index if date_format is None else source.index.strftime(date_format)
+    derived = pd.DataFrame({"date_time": date_time})
+    for source_column, column in columns.items():
+        values = source[source_column].to_numpy(dtype=float) / divide_by + offset
+        derived[column] = values if decimals is None else values.round(decimals)
+    return derived.to_csv(index=False, float_format=float_format)
+
+
+def emission_factors(sources, start, end, factors, window_hours, time_zone):
+    """
+    Average and marginal CO2 emission factors of the generation mix, see emissions.derive_emission_factors().
+
+    Parameters:
+    sources (list): Path of the hourly generation per technology.
+    start, end (str): First and last time stamp of the period.
+    factors (dict): Emission factor per technology [gCO2/kWh].
+    window_hours (int): Length of the moving window of the marginal emission factors [h].
+    time_zone (str): Time zone of the time stamps of the source, see time_index.normalize_hourly().
+
+    Returns:
+    str: CSV text with 'date_time' (UTC), 'CO2_emissions_average' and 'CO2_emissions_marginal' [gCO2/kWh].
+    """
+    generation = normalize_hourly(read_generation_mix(sources[0]), time_zone)
+    factors = derive_emission_factors(generation, start, end, factors, window_hours)
+    if len(factors) == 0:
+        raise ValueError(f"{sources[0]} has no values between {start} and {end}")
+    return factors.to_csv(index=False, float_format="%.2f")
+
+
+# The derived files used by the app, in the order they are built. The full-year RAW files cover any window of 2015,
+# the price and CO2 RAW file only the default week, which is repeated for other windows.
+DERIVED_FILES = [
+    DerivedFile(
+        "input_data/hourly_pv_cf.csv",
+        ["input_data/raw_data/flows_and_storage_RAW.csv"],
+        select_columns,
+        {"columns": {"pv cf": "pv_cf"}},
+    ),
+    DerivedFile(
+        "input_data/hourly_electricity_price.csv",
+        ["input_data/raw_data/strompreis_und_co2-emissionen_RAW.csv"],
+        select_columns,
+        # €/MWh to €/kWh
+        {"columns": {"Strompreis": "electricity_price"}, "divide_by": 1000, "repeat_weekly": True},
+    ),
+    DerivedFile(
+        "input_data/hourly_co2-emissions.csv",
+        ["input_data/raw_data/strompreis_und_co2-emissionen_RAW.csv"],
+        select_columns,
+        {
+            "columns": {"CO₂-Emissionsfaktor des Strommix": "CO2_emissions"},
+            "float_format": "%.2f",
+            "repeat_weekly": True,
+        },
+    ),
+    DerivedFile(
+        "input_data/hourly_electricity_price_flat_25ct_added.csv",
+        ["input_data/hourly_electricity_price.csv"],
+        select_columns,
+        # 25 ct/kWh of taxes and fees added to the wholesale price
+        {"columns": {"electricity_price": "electricity_price"}, "offset": 0.25, "decimals": 5},
+    ),
+    DerivedFile(
+        "input_data/hourly_electricity_demands_kWh_upload_example.csv",
+        ["input_data/raw_data/ffe_id-11-0_hourly_elec_demand_RAW.csv"],
+        select_columns,
+        # Day first like exports of spreadsheet programs
+        {"columns": {"electricity_demand[kW]": "load"}, "date_format": "%d/%m/%Y %H:%M"},
+    ),
+    DerivedFile(
+        "input_data/hourly_co2-emissions_generation_mix.csv",
+        ["input_data/raw_data/DE_electricity_generation_2021_RAW.csv"],
+        emission_factors,
+        # Part of the parameters, so a change of the factors rebuilds the file
+        {"factors": TECHNOLOGY_FACTORS, "window_hours": MARGINAL_WINDOW_HOURS, "time_zone": LOCAL_TIME_ZONE},
+        # The year 2021 of German time in UTC, the app maps it to the simulated year
+        ("2020-12-31 23:00:00", "2021-12-31 22:00:00"),
+    ),
+]
+
+
+# Input files of the app that are not derived but combined with the derived files time step by time step, so they
+# need one value per hour of the window. Only profile 1 of the demand has a RAW file, the file is edited by hand.
+WINDOW_FILES = ["input_data/hourly_electricity_demands_kWh (family, 2-working-persons, 1 pensioneer).csv"]
+
+
+def file_hash(file_path):
+    """SHA-256 of the content of a file, None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(2**20), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def build_parameters(derived_file, start, end):
+    """Everything except the sources a derived file depends on, it is rebuilt if any of it changes"""
+    start, end = derived_file.window or (start, end)
+    return {
+        "transform": derived_file.transform.__qualname__,
+        # Also changes with the helpers of the transform, e.g. check_window() or emissions.derive_emission_factors()
+        "transform_code": code_digest(derived_file.transform),
+        "start": start,
+        "end": end,
+        **derived_file.parameters,
+    }
+
+
+def build_order(derived_files):
+    """
+    Sort derived files so every file comes after the derived files it is created from.
+
+    Raises:
+    ValueError: If derived files depend on each other in a cycle.
+    """
+    by_path = {os.path.normpath(derived_file.path): derived_file for derived_file in derived_files}
+    ordered = []
+    state = {}
+
+    def visit(path, chain):
+        if state.get(path) == "done":
+            return
+        if state.get(path) == "visiting":
+            raise ValueError(f"Derived files depend on each other in a cycle: {' -> '.join(chain + [path])}")
+        state[path] = "visiting"
+        for source in by_path[path].sources:
+            if os.path.normpath(source) in by_path:
+                visit(os.path.normpath(source), chain + [path])
+        state[path] = "done"
+        ordered.append(by_path[path])
+
+    for path in by_path:
+        visit(path, [])
+    return ordered
+
+
+def read_build_manifest(manifest_file):
+    """Read the manifest of the last build, an empty one if there is none"""
+    try:
+        with open(manifest_file) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(
+    derived_files=DERIVED_FILES,
+    start=DEFAULT_START,
+    end=DEFAULT_END,
+    force=False,
+    dry_run=False,
+    manifest_file=None,
+    window_files=WINDOW_FILES,
+):
+    """
+    Create the derived input files whose sources, parameters or content changed since the last build.
+
+    A file is up to date if the content hashes of its sources and of the file itself and its parameters (including
+    the code of the transform and the time window) are the ones of the manifest. Files are built in the order of
+    their dependencies, so a derived file that changes also rebuilds the files created from it. A file is only
+    written if its content changes, so the caches of the app stay valid otherwise.
+
+    The build is all or nothing: the files are built into a staging folder and only replace the input files once all
+    of them were built and the window files have one value per hour of the time window. Otherwise no input file and not the manifest are
+    changed, so the app never combines time series of different windows.
+
+    Parameters:
+    derived_files (list): DerivedFile entries, see DERIVED_FILES.
+    start, end (str): First and last time stamp of the window cut out of the sources (both included).
+    force (bool): Rebuild all files.
+    dry_run (bool): Only report which files would be built.
+    manifest_file (str): Path of the manifest, None for MANIFEST_FILE.
+    window_files (list): Files that are not derived but need one value per hour of the window, see WINDOW_FILES.
+
+    Returns:
+    dict: Path and status of every file: "up to date", "built", "unchanged" (built with the same content),
+    "outdated" (dry run), "one value per hour", "not written (another file failed)" or the reason why it failed or
+    was skipped.
+    """
+    manifest_file = manifest_file or MANIFEST_FILE
+    manifest = read_build_manifest(manifest_file)
+    status = {}
+    outdated = set()
+    failed = set()
+
+    for path in map(os.path.normpath, window_files):
+        try:
+            check_hours(path, read_source(path), start, end)
+            status[path] = "one value per hour"
+        except (OSError, ValueError) as error:
+            failed.add(path)
+            status[path] = f"failed: {error}"
+
+    # Built files by path, they replace the input files at the end of a successful build
+    staging_folder = tempfile.mkdtemp(prefix=".staging-", dir=os.path.dirname(manifest_file) or ".")
+    staged = {}
+    try:
+        for derived_file in build_order(derived_files):
+            path = os.path.normpath(derived_file.path)
+            # Derived files built in this run are read from the staging folder
+            sources = [staged.get(os.path.normpath(source), source) for source in derived_file.sources]
+            entry = {
+                "sources": {
+                    os.path.normpath(source): file_hash(staged_source)
+                    for source, staged_source in zip(derived_file.sources, sources)
+                },
+                "parameters": build_parameters(derived_file, start, end),
+            }
+            if any(source in failed for source in entry["sources"]):
+                failed.add(path)
+                status[path] = "skipped (a source failed)"
+                continue
+            missing = [source for source, digest in entry["sources"].items() if digest is None]
+            if missing:
+                failed.add(path)
+                status[path] = f"failed: {', '.join(missing)} not found"
+                continue
+            current = file_hash(path)
+            previous = manifest.get(path)
+            if (
+                not force
+                and previous is not None
+                and not any(source in outdated for source in entry["sources"])
+                and current is not None
+                and previous["sources"] == entry["sources"]
+                and previous["parameters"] == entry["parameters"]
+                and previous["output"] == current
+            ):
+                status[path] = "up to date"
+                continue
+            if dry_run:
+                # Files created from it would be rebuilt as well
+                outdated.add(path)
+                status[path] = "outdated"
+                continue
+
+            try:
+                content = derived_file.transform(
+                    sources, *(derived_file.window or (start, end)), **derived_file.parameters
+                ).encode()
+            except (KeyError, ValueError) as error:
+                # E.g. a window outside of the source or a renamed column, the files created from it are skipped
+                failed.add(path)
+                status[path] = f"failed: {type(error).__name__}: {error}"
+                continue
+            entry["output"] = hashlib.sha256(content).hexdigest()
+            if entry["output"] == current:
+                status[path] = "unchanged"
+            else:
+                staged[path] = os.path.join(staging_folder, f"{len(staged)}_{os.path.basename(path)}")
+                with open(staged[path], "wb") as file:
+                    file.write(content)
+                status[path] = "built"
+            manifest[path] = entry
+
+        if failed:
+            for path, file_status in status.items():
+                if file_status in ("built", "unchanged"):
+                    status[path] = "not written (another file failed)"
+        elif not dry_run:
+            # The app never reads a partially written file, the staging folder is on the same file system
+            for path, staged_path in staged.items():
+                os.replace(staged_path, path)
+            temporary_path = f"{manifest_file}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(manifest, file, indent=4, ensure_ascii=False)
+                file.write("\n")
+            os.replace(temporary_path, manifest_file)
+    finally:
+        shutil.rmtree(staging_folder, ignore_errors=True)
+    return status
+
+
+def main(arguments=None):
+    """Command line interface, run from the repository root: python preprocessing.py --help"""
+    parser = argparse.ArgumentParser(
+        description="Create the derived input files in input_data/ from the RAW files. Any window of 2015 is cut out "
+        "of the full-year RAW files, the week of the price and CO2 RAW file is repeated over it. The hand-edited "
+        "demand file needs one value per hour of the window."
+    )
+    parser.add_argument("--start", default=DEFAULT_START, help=f"first time stamp (default: {DEFAULT_START})")
+    parser.add_argument("--end", default=DEFAULT_END, help=f"last time stamp, included (default: {DEFAULT_END})")
+    parser.add_argument("--force", action="store_true", help="rebuild all files")
+    parser.add_argument("--dry-run", action="store_true", help="only list the files that would be built")
+    arguments = parser.parse_args(arguments)
+
+    status = build(start=arguments.start, end=arguments.end, force=arguments.force, dry_run=arguments.dry_run)
+    for path, file_status in status.items():
+        print(f"{path}: {file_status}")
+    if any(file_status.startswith(("failed", "skipped")) for file_status in status.values()):
+        print("No input file was changed.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,739 @@
+import hashlib
+import json
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict, namedtuple
+from kernels import find_kernel, progress_interval, simulate_battery
+from strategy import (
+    ECONOMIC_INPUTS,
+    referenced_names,
+    StrategyNamespace,
+    compile_strategy,
+    compile_decision_table,
+    decision_function,
+    apply_rules,
+    evaluate_vectorized_rules,
+    is_sequential,
+    apply_vectorized_rules,
+)
+
+# Result of simulate(), see there
+SimulationResult = namedtuple(
+    "SimulationResult",
+    [
+        "P_pv",
+        "P_load",
+        "electricity_price_customer",
+        "CO2_emissions_specific",
+        "state",
+        "E_purchase",
+        "E_feed_in",
+        "CO2_generated",
+        "net_energy_balance",
+        "kpis",
+        "checks",
+        "engine",
+        "strategy_valid",
+        "error",
+        "time_step",
+    ],
+)
+
+
+class TimeSeries:
+    """
+    Contiguous float array with the X[t] access used in the operating strategies.
+
+    Negative time steps raise a KeyError like the label based access of a pandas Series does, so
+    requesting [t-1] for t=0 still fails instead of silently wrapping around to the last time step.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = np.ascontiguousarray(values, dtype=float)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, t):
+        if not isinstance(t, slice) and t < 0:
+            raise KeyError(t)
+        return self.values[t]
+
+    def __setitem__(self, t, value):
+        if not isinstance(t, slice) and t < 0:
+            raise KeyError(t)
+        self.values[t] = value
+
+
+class SimulationState:
+    """Battery and grid variables of a simulation run, one float array per variable"""
+
+    __slots__ = ("P_charge", "P_discharge", "P_feed_in", "P_purchase", "W_batt", "SoC")
+
+    def __init__(self, n_steps):
+        for name in self.__slots__:
+            setattr(self, name, TimeSeries(np.zeros(n_steps)))
+
+    def variables(self):
+        """Return the state variables by name, e.g. to add them to the strategy namespace"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_dataframe(self, index):
+        """Convert the state arrays to a DataFrame with one column per variable (done once, after the simulation)"""
+        return pd.DataFrame({name: getattr(self, name).values for name in self.__slots__}, index=index)
+
+
+def check_battery_operation(state, P_pv):
+    """
+    Check the simulated battery operation for charging a full or discharging an empty battery and for arbitrage.
+
+    Parameters:
+    state (SimulationState): State after the simulation.
+    P_pv (array): PV generation [kW].
+
+    Returns:
+    dict: Check name and True if the check failed for at least one time step.
+    """
+    P_charge = state.P_charge.values
+    P_discharge = state.P_discharge.values
+    # SoC at the end of the previous time step (the initial SoC for t=0)
+    SoC_previous = np.concatenate(([0.0], state.SoC.values[:-1]))
+    return {
+        "batteryChargeCheck": bool(np.any((P_charge > 0) & (SoC_previous == 1))),
+        "batteryDischargeCheck": bool(np.any((P_discharge > 0) & (SoC_previous == 0))),
+        "noArbitrageCheck1": bool(np.any(state.P_feed_in.values > P_pv)),
+        "noArbitrageCheck2": bool(np.any(P_charge > P_pv)),
+    }
+
+
+def check_energy_balance(net_energy_balance):
+    """Return True if the energy balance is violated in at least one time step (see utils.check_energy_balance)"""
+    return bool(np.any(np.abs(net_energy_balance) > 1e-10))
+
+
+def compute_kpis(P_pv, P_load, P_feed_in, E_purchase, E_feed_in, electricity_price_customer, CO2_generated, axis=None):
+    """
+    Compute the aggregated simulation results and performance indicators (Table 2 of the app).
+
+    Parameters:
+    axis (int): Time axis of the arrays, e.g. 1 for arrays of (households, time steps). None sums all values.
+
+    Returns:
+    dict: Performance indicator and its value, sums ignore missing values like pandas does.
+    """
+    P_pv_total = np.nansum(P_pv, axis=axis)
+    P_feed_in_total = np.nansum(P_feed_in, axis=axis)
+    return {
+        "C_purchase_total": np.nansum(E_purchase * electricity_price_customer, axis=axis),
+        "C_feed_in_total": np.nansum(E_feed_in * electricity_price_customer, axis=axis),
+        "C_total": np.nansum((E_purchase + E_feed_in) * electricity_price_customer, axis=axis),
+        "CO2_emissions": np.nansum(CO2_generated, axis=axis),
+        "Self-consumption": ((P_pv_total - P_feed_in_total) / P_pv_total) * 100,
+        "Self-sufficiency": ((P_pv_total - P_feed_in_total) / np.nansum(P_load, axis=axis)) * 100,
+    }
+
+
+def calculate_electricity_price(electricity_wholesale_price, apply_additional_costs, taxes_and_fees, grid_fees):
+    """
+    Calculate final electricity price with taxes and fees.
+
+    Parameters:
+    electricity_wholesale_price (float): Base electricity price
+    apply_additional_costs (bool): Whether to apply additional costs
+    taxes_and_fees (float): Taxes and fees in ct/kWh
+    grid_fees (float): Grid fees in ct/kWh
+
+    Returns:
+    float: Calculated electricity price
+    """
+    if apply_additional_costs:
+        return (electricity_wholesale_price + taxes_and_fees / 100 + grid_fees / 100) * 1.19
+    else:
+        return electricity_wholesale_price
+
+
+# Result of dispatch(), the energy flows of a simulation without their economic evaluation
+DispatchResult = namedtuple(
+    "DispatchResult",
+    ["P_pv", "P_load", "state", "net_energy_balance", "checks", "engine", "strategy_valid", "error", "time_step"],
+)
+
+
+def dispatch(
+    P_pv,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    W_batt_max,
+    strategy,
+    time_step=1,
+    progress=None,
+):
+    """
+    Simulate the energy flows of the household energy system with an operating strategy (first stage of simulate()).
+
+    Prices, the feed-in tariff and the emissions are only passed on to the strategy. Unless the strategy refers to
+    them (see strategy.referenced_names), the energy flows do not depend on them.
+
+    Parameters:
+    See simulate(), the arrays are modified if the strategy assigns to them.
+    progress (callable): Called as progress(t, state) with the number of simulated time steps, at the start, about
+    every percent of the time steps and at the end. It may raise SimulationCancelled to stop the simulation, see
+    SimulationJob. The vectorized engine only reports during the battery update.
+
+    Returns:
+    DispatchResult: Energy flows, battery state and check flags. If the strategy failed, 'error' holds the
+    exception and the state contains the time steps simulated until then.
+    """
+    n_steps = len(P_pv)
+    state = SimulationState(n_steps)
+    strategy_valid = True
+    engine = None
+    error = None
+
+    try:
+        if progress is not None:
+            progress(0, state)
+        # The bundled strategies are simulated by native kernels, as long as they are not modified
+        kernel = find_kernel(strategy)
+        if kernel is not None:
+            engine = kernel.__name__
+            kernel(state, P_pv, P_load, W_batt_max, electricity_price_customer, feed_in_tariff, time_step, progress)
+        else:
+            # Validate the whitelist and compile all rules once, instead of at every time step
+            try:
+                compiled_strategy = compile_strategy(strategy)
+            except ValueError:
+                strategy_valid = False
+                raise
+
+            # Namespace holding only the variables available to the operating strategy
+            namespace = StrategyNamespace(
+                P_pv=TimeSeries(P_pv),
+                P_load=TimeSeries(P_load),
+                W_batt_max=W_batt_max,
+                feed_in_tariff=feed_in_tariff,
+                time_step=time_step,
+                electricity_price_customer=TimeSeries(electricity_price_customer),
+                CO2_emissions_specific=TimeSeries(CO2_emissions_specific),
+                **state.variables(),
+            )
+
+            # Rules that do not depend on the battery state are evaluated for all time steps at once
+            vectorized_results = evaluate_vectorized_rules(compiled_strategy, namespace, n_steps)
+            if not is_sequential(vectorized_results):
+                engine = "vectorized"
+                apply_vectorized_rules(vectorized_results, namespace)
+                simulate_battery(state, W_batt_max, time_step, progress)
+            else:
+                # Shared and mutually exclusive comparisons of the conditions are evaluated once per time step
+                decision_table = compile_decision_table(strategy)
+                engine = "sequential" if decision_table is None else "decision table"
+                decide = None if decision_table is None else decision_function(decision_table, namespace)
+                P_charge = state.P_charge.values
+                P_discharge = state.P_discharge.values
+                W_batt = state.W_batt.values
+                SoC = state.SoC.values
+                interval = progress_interval(n_steps)
+
+                # Apply operating strategy to all variables
+                for t in range(n_steps):
+                    if progress is not None and t % interval == 0:
+                        progress(t, state)
+                    namespace.set_time_step(t)
+                    if decide is None:
+                        apply_rules(compiled_strategy, namespace, vectorized_results)
+                    else:
+                        decide()
+
+                    W_batt_previous = 0 if t == 0 else W_batt[t - 1]
+                    W_batt[t] = min(
+                        max(W_batt_previous + P_charge[t] * time_step - P_discharge[t] * time_step, 0), W_batt_max
+                    )
+                    SoC[t] = W_batt[t] / W_batt_max
+
+        if progress is not None:
+            progress(n_steps, state)
+    except Exception as e:
+        error = e
+
+    net_energy_balance = (
+        P_load
+        - P_pv
+        + state.P_charge.values
+        - state.P_discharge.values
+        + state.P_feed_in.values
+        - state.P_purchase.values
+    )
+
+    checks = check_battery_operation(state, P_pv)
+    checks["energyBalanceCheck"] = check_energy_balance(net_energy_balance)
+
+    return DispatchResult(
+        P_pv=P_pv,
+        P_load=P_load,
+        state=state,
+        net_energy_balance=net_energy_balance,
+        checks=checks,
+        engine=engine,
+        strategy_valid=strategy_valid,
+        error=error,
+        time_step=time_step,
+    )
+
+
+def evaluate_economics(dispatch_result, electricity_price_customer, CO2_emissions_specific):
+    """
+    Compute energies, costs, emissions and performance indicators of simulated energy flows (second stage of simulate()).
+
+    Cheap compared to the dispatch, so it can be repeated for other prices or emissions without simulating again.
+
+    Parameters:
+    dispatch_result (DispatchResult): Result of dispatch().
+    electricity_price_customer (array): Electricity price [€/kWh].
+    CO2_emissions_specific (array): Specific CO2 emissions [gCO2/kWh].
+
+    Returns:
+    SimulationResult: See simulate().
+    """
+    state = dispatch_result.state
+    time_step = dispatch_result.time_step  # [h]
+    E_purchase = state.P_purchase.values * time_step  # [kWh]
+    E_feed_in = state.P_feed_in.values * time_step  # [kWh]
+    CO2_generated = CO2_emissions_specific * E_purchase  # [gCO2]
+
+    return SimulationResult(
+        P_pv=dispatch_result.P_pv,
+        P_load=dispatch_result.P_load,
+        electricity_price_customer=electricity_price_customer,
+        CO2_emissions_specific=CO2_emissions_specific,
+        state=state,
+        E_purchase=E_purchase,
+        E_feed_in=E_feed_in,
+        CO2_generated=CO2_generated,
+        net_energy_balance=dispatch_result.net_energy_balance,
+        kpis=compute_kpis(
+            dispatch_result.P_pv,
+            dispatch_result.P_load,
+            state.P_feed_in.values,
+            E_purchase,
+            E_feed_in,
+            electricity_price_customer,
+            CO2_generated,
+        ),
+        checks=dispatch_result.checks,
+        engine=dispatch_result.engine,
+        strategy_valid=dispatch_result.strategy_valid,
+        error=dispatch_result.error,
+        time_step=time_step,
+    )
+
+
+def as_float_arrays(*values):
+    """Return float array copies, so strategies that assign to inputs do not change the arrays of the caller"""
+    return [np.array(value, dtype=float) for value in values]
+
+
+def simulate(
+    P_pv,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    W_batt_max,
+    strategy,
+    time_step=1,
+):
+    """
+    Simulate the operation of the household energy system with an operating strategy.
+
+    Does not depend on Streamlit, so it can be used by the app, batch tools and benchmarks alike.
+
+    Parameters:
+    P_pv (array): PV generation [kW].
+    P_load (array): Electricity demand [kW].
+    electricity_price_customer (array): Electricity price [€/kWh].
+    CO2_emissions_specific (array): Specific CO2 emissions [gCO2/kWh].
+    feed_in_tariff (float): PV feed-in tariff [€/kWh].
+    W_batt_max (float): Usable storage capacity [kWh].
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    time_step (float): Length of a time step [h], e.g. 0.25 for 15 minutes. The powers are constant within a time step.
+
+    Returns:
+    SimulationResult: Result arrays, performance indicators and check flags. If the strategy failed,
+    'error' holds the exception and the state contains the time steps simulated until then.
+    """
+    P_pv, P_load, electricity_price_customer, CO2_emissions_specific = as_float_arrays(
+        P_pv, P_load, electricity_price_customer, CO2_emissions_specific
+    )
+    dispatch_result = dispatch(
+        P_pv,
+        P_load,
+        electricity_price_customer,
+        CO2_emissions_specific,
+        feed_in_tariff,
+        W_batt_max,
+        strategy,
+        time_step,
+    )
+    return evaluate_economics(dispatch_result, electricity_price_customer, CO2_emissions_specific)
+
+
+def result_nbytes(dispatch_result):
+    """Return the memory of the arrays of a dispatch result [bytes]"""
+    return (
+        dispatch_result.P_pv.nbytes
+        + dispatch_result.P_load.nbytes
+        + dispatch_result.net_energy_balance.nbytes
+        + sum(series.values.nbytes for series in dispatch_result.state.variables().values())
+    )
+
+
+# Statistics of a SimulationCache, like functools.lru_cache().cache_info()
+SimulationCacheInfo = namedtuple(
+    "SimulationCacheInfo", ["hits", "misses", "maxsize", "currsize", "hit_rate", "maxbytes", "currbytes"]
+)
+
+
+class SimulationCache:
+    """
+    Bounded cache of dispatch results, the least recently used result is dropped first.
+
+    Results are keyed on a hash of the inputs the energy flows depend on, so rerunning an unchanged configuration or
+    switching back to one simulated before does not simulate again. Prices, the feed-in tariff and the emissions are
+    only part of the key if the strategy refers to them, otherwise changing them only repeats evaluate_economics().
+    The cached results are shared between all callers and must not be modified.
+
+    Besides the number of results, the memory of the cached arrays is bounded by maxbytes, e.g. a full year at a
+    time step of one minute takes about 40 MB per result.
+    """
+
+    def __init__(self, maxsize=32, maxbytes=512 * 2**20):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.results = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Streamlit runs the sessions of a process in threads
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        P_pv,
+        P_load,
+        electricity_price_customer,
+        CO2_emissions_specific,
+        feed_in_tariff,
+        W_batt_max,
+        strategy,
+        time_step=1,
+    ):
+        """Return the content hash of the inputs the dispatch depends on, see simulate() for the parameters"""
+        economic_inputs = ECONOMIC_INPUTS & referenced_names(strategy)
+        content = hashlib.sha1()
+        for name, values in (
+            ("P_pv", P_pv),
+            ("P_load", P_load),
+            ("electricity_price_customer", electricity_price_customer),
+            ("CO2_emissions_specific", CO2_emissions_specific),
+        ):
+            values = np.ascontiguousarray(values, dtype=float)
+            content.update(str(len(values)).encode())
+            # Series the dispatch does not depend on only contribute their length
+            if name not in ECONOMIC_INPUTS or name in economic_inputs:
+                content.update(values.tobytes())
+        content.update(repr(float(W_batt_max)).encode())
+        content.update(repr(float(time_step)).encode())
+        if "feed_in_tariff" in economic_inputs:
+            content.update(repr(float(feed_in_tariff)).encode())
+        # Normalized strategy, independent of the formatting of the text area
+        content.update(json.dumps(strategy, sort_keys=True).encode())
+        return content.hexdigest()
+
+    def simulate(
+        self,
+        P_pv,
+        P_load,
+        electricity_price_customer,
+        CO2_emissions_specific,
+        feed_in_tariff,
+        W_batt_max,
+        strategy,
+        time_step=1,
+    ):
+        """Return the result of simulate() for the given inputs, dispatching only if the dispatch is not cached"""
+        P_pv, P_load, electricity_price_customer, CO2_emissions_specific = as_float_arrays(
+            P_pv, P_load, electricity_price_customer, CO2_emissions_specific
+        )
+        key = self.key(
+            P_pv,
+            P_load,
+            electricity_price_customer,
+            CO2_emissions_specific,
+            feed_in_tariff,
+            W_batt_max,
+            strategy,
+            time_step,
+        )
+        dispatch_result = self.lookup(key)
+        if dispatch_result is None:
+            dispatch_result = dispatch(
+                P_pv,
+                P_load,
+                electricity_price_customer,
+                CO2_emissions_specific,
+                feed_in_tariff,
+                W_batt_max,
+                strategy,
+                time_step,
+            )
+            self.store(key, dispatch_result)
+
+        return evaluate_economics(dispatch_result, electricity_price_customer, CO2_emissions_specific)
+
+    def lookup(self, key):
+        """Return the cached dispatch result of a key or None, counted as a hit or a miss of the cache"""
+        with self.lock:
+            dispatch_result = self.results.get(key)
+            if dispatch_result is not None:
+                self.hits += 1
+                self.results.move_to_end(key)
+            else:
+                self.misses += 1
+            return dispatch_result
+
+    def store(self, key, dispatch_result):
+        """Add a dispatch result and drop the least recently used results beyond the bounds of the cache"""
+        with self.lock:
+            if key not in self.results:
+                self.results[key] = dispatch_result
+                self.nbytes += result_nbytes(dispatch_result)
+            self.results.move_to_end(key)
+            # The newest result is kept even if it is larger than maxbytes on its own
+            while len(self.results) > self.maxsize or (self.nbytes > self.maxbytes and len(self.results) > 1):
+                _, dropped = self.results.popitem(last=False)
+                self.nbytes -= result_nbytes(dropped)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.results
+
+    def start(
+        self,
+        P_pv,
+        P_load,
+        electricity_price_customer,
+        CO2_emissions_specific,
+        feed_in_tariff,
+        W_batt_max,
+        strategy,
+        time_step=1,
+    ):
+        """
+        Start the dispatch for the given inputs in a background thread, see SimulationJob.
+
+        The job counts as a hit or a miss of the cache, its result is read with SimulationJob.result().
+
+        Returns:
+        SimulationJob: The running job, already done if the dispatch is cached.
+        """
+        inputs = (
+            *as_float_arrays(P_pv, P_load, electricity_price_customer, CO2_emissions_specific),
+            feed_in_tariff,
+            W_batt_max,
+            strategy,
+            time_step,
+        )
+        return SimulationJob(self, self.key(*inputs), inputs)
+
+    def info(self):
+        """Return hits, misses, size and the hit rate (share of requests answered from the cache)"""
+        with self.lock:
+            requests = self.hits + self.misses
+            return SimulationCacheInfo(
+                self.hits,
+                self.misses,
+                self.maxsize,
+                len(self.results),
+                self.hits / requests if requests else 0.0,
+                self.maxbytes,
+                self.nbytes,
+            )
+
+    def clear(self):
+        """Drop all results and reset the statistics"""
+        with self.lock:
+            self.results.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+
+class SimulationCancelled(Exception):
+    """Raised by the progress callback of dispatch() to stop a simulation whose result is no longer needed"""
+
+
+class SimulationJob:
+    """
+    Dispatch running in a background thread, so the app stays responsive during long simulations.
+
+    The number of simulated time steps and the state simulated so far can be read while it runs, e.g. to show the
+    progress and the partial energy flows. A cancelled job stops at its next progress report (see dispatch()) and
+    its result is not cached. The result of a finished job is stored in the cache it was started from and kept by
+    the job, so it is shown without another lookup.
+    """
+
+    def __init__(self, cache, key, inputs):
+        self.key = key
+        self.n_steps = len(inputs[0])
+        # Simulated time steps and the state of the simulation, set by the progress reports
+        self.t = 0
+        self.state = None
+        # "running", "done" or "cancelled"
+        self.status = "running"
+        self.dispatch_result = None
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(cache, inputs), daemon=True)
+        self.thread.start()
+
+    def report(self, t, state):
+        """Progress callback of dispatch(), stops the simulation if the job was cancelled"""
+        self.t = t
+        self.state = state
+        if self.cancel_event.is_set():
+            raise SimulationCancelled()
+
+    def run(self, cache, inputs):
+        dispatch_result = cache.lookup(self.key)
+        if dispatch_result is None:
+            dispatch_result = dispatch(*inputs, progress=self.report)
+            if isinstance(dispatch_result.error, SimulationCancelled):
+                self.status = "cancelled"
+                return
+            cache.store(self.key, dispatch_result)
+        self.dispatch_result = dispatch_result
+        self.t = self.n_steps
+        self.status = "done"
+
+    def result(self, electricity_price_customer, CO2_emissions_specific):
+        """
+        Return the result of a finished job like simulate(), with the costs and emissions of the given series.
+
+        The series may differ from the ones the job was started with if the strategy does not refer to them.
+        """
+        return evaluate_economics(
+            self.dispatch_result,
+            *as_float_arrays(electricity_price_customer, CO2_emissions_specific),
+        )
+
+    @property
+    def progress(self):
+        """Share of the simulated time steps, between 0 and 1"""
+        return self.t / self.n_steps if self.n_steps else 1.0
+
+    def cancel(self):
+        """Ask the simulation to stop, it is cancelled at its next progress report"""
+        self.cancel_event.set()
+
+    def wait(self, timeout=None):
+        """Wait for the job to finish or stop, return True if it is no longer running"""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+# Dispatch results shared by all sessions of the app process
+simulation_cache = SimulationCache()
+
+
+# Column names of the result time series (download and results/ folder)
+RESULT_COLUMNS = [
+    "date_time",
+    "P_load_kW",
+    "P_pv_kW",
+    "electricity_price_customer_EUR_kWh",
+    "CO2_emissions_g_kWh",
+    "P_charge_kW",
+    "P_discharge_kW",
+    "P_feed_in_kW",
+    "P_purchase_kW",
+    "W_batt_kWh",
+    "SoC_%",
+    "E_purchase_kWh",
+    "E_feed_in_kWh",
+    "CO2_generated_g",
+]
+
+
+def result_table(date_time, result):
+    """
+    Collect the input and result time series of a simulation in one DataFrame.
+
+    Parameters:
+    date_time (Series): Time stamps of the simulated time steps.
+    result (SimulationResult): Result of simulate().
+
+    Returns:
+    DataFrame: One column per entry in RESULT_COLUMNS.
+    """
+    columns = [
+        date_time,
+        result.P_load,
+        result.P_pv,
+        result.electricity_price_customer,
+        result.CO2_emissions_specific,
+        result.state.P_charge.values,
+        result.state.P_discharge.values,
+        result.state.P_feed_in.values,
+        result.state.P_purchase.values,
+        result.state.W_batt.values,
+        result.state.SoC.values,
+        result.E_purchase,
+        result.E_feed_in,
+        result.CO2_generated,
+    ]
+    return pd.DataFrame({name: np.asarray(values) for name, values in zip(RESULT_COLUMNS, columns)})
+
+
+def result_csv(table):
+    """
+    Write a result table as CSV text, like table.to_csv(float_format="%.2f", index=False) but much faster.
+
+    Float columns are formatted row by row with the % operator and time stamps with NumPy, which keeps the download
+    of long series (e.g. a year at a 1-minute time step) at a few seconds. Tables with other columns, and time stamps
+    that pandas would write differently (only dates, fractions of seconds, time zones), are written by pandas.
+
+    Parameters:
+    table (DataFrame): Result table, see result_table().
+
+    Returns:
+    str: CSV text with a header row, floats with 2 decimals and empty fields for missing values.
+    """
+    columns = []
+    formats = []
+    for name, column in table.items():
+        values = column.to_numpy()
+        if values.dtype.kind == "f":
+            if np.isnan(values).any():
+                columns.append(["" if value != value else "%.2f" % value for value in values.tolist()])
+                formats.append("%s")
+            else:
+                columns.append(values.tolist())
+                formats.append("%.2f")
+        elif values.dtype.kind == "M" and len(values) > 0:
+            whole_seconds = values.astype("datetime64[s]")
+            days = values.astype("datetime64[D]")
+            if column.isna().any() or (whole_seconds != values).any() or (days == values).all():
+                return table.to_csv(float_format="%.2f", index=False)
+            columns.append([stamp.replace("T", " ") for stamp in np.datetime_as_string(whole_seconds).tolist()])
+            formats.append("%s")
+        else:
+            return table.to_csv(float_format="%.2f", index=False)
+
+    row_format = ",".join(formats)
+    lines = [",".join(map(str, table.columns))]
+    lines.extend(row_format % row for row in zip(*columns))
+    lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,1082 @@
+import ast
+import itertools
+import math
+import operator
+import types
+from collections import namedtuple
+from functools import reduce
+import numpy as np
+
+# Words that can be used in the conditions and actions of an operating strategy
+ALLOWED_WORDS = frozenset(
+    {
+        "P_pv",
+        "P_load",
+        "P_purchase",
+        "P_feed_in",
+        "t",
+        "SoC",
+        "W_batt_max",
+        "min",
+        "W_batt",
+        "max",
+        "P_charge",
+        "P_discharge",
+        "feed_in_tariff",
+        "electricity_price_customer",
+        "CO2_emissions_specific",
+        "time_step",
+    }
+)
+
+# Inputs of the simulation, given as time series (e.g. P_pv[t]) or as scalars
+TIME_SERIES_INPUTS = frozenset({"P_pv", "P_load", "electricity_price_customer", "CO2_emissions_specific"})
+SCALAR_INPUTS = frozenset({"W_batt_max", "feed_in_tariff", "time_step"})
+
+# Inputs that only enter the economic evaluation, unless an operating strategy refers to them
+ECONOMIC_INPUTS = frozenset({"feed_in_tariff", "electricity_price_customer", "CO2_emissions_specific"})
+
+# Variables that can be set by the actions of a vectorized rule
+ACTION_VARIABLES = frozenset({"P_charge", "P_discharge", "P_feed_in", "P_purchase"})
+
+# Built-ins available to the operating strategy, allows print(), min() and max()
+SAFE_BUILTINS = {"print": print}
+
+# vectorized: None if the rule has to be applied time step by time step, otherwise a VectorizedRule
+CompiledRule = namedtuple("CompiledRule", ["condition", "action", "vectorized"])
+
+# condition: code object for the whole-array condition, assignments: list of (variable name, code object)
+VectorizedRule = namedtuple("VectorizedRule", ["condition", "assignments"])
+
+# mask: boolean array of the time steps the rule applies to, assignments: list of (variable name, values)
+VectorizedResult = namedtuple("VectorizedResult", ["mask", "assignments"])
+
+
+class NameCollector(ast.NodeVisitor):
+    """Collect all names (identifiers) used in an abstract syntax tree"""
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_Name(self, node):
+        self.names.add(node.id)
+        self.generic_visit(node)
+
+
+def collect_names(tree):
+    """Return the set of all names (identifiers) used in an abstract syntax tree"""
+    collector = NameCollector()
+    collector.visit(tree)
+    return collector.names
+
+
+def assigned_names(tree):
+    """Return the names of all variables an action assigns to, e.g. 'P_charge' for P_charge[t] = ..."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and not isinstance(node.ctx, ast.Load):
+            if isinstance(node.value, ast.Name):
+                names.add(node.value.id)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+    return names
+
+
+def parse_code(code: str, allowed_words: set, mode: str):
+    """
+    Parse a single condition or action of an operating strategy and check it against the whitelist.
+
+    Parameters:
+    code (str): The Python code of the condition or action as a string.
+    allowed_words (set): A set of allowed words for execution or evaluation.
+    mode (str): The parse mode, either 'exec' for actions or 'eval' for conditions.
+
+    Returns:
+    ast.AST: The abstract syntax tree of the code.
+
+    Raises:
+    ValueError: If the code contains disallowed words or invalid syntax.
+    """
+    if mode not in {"exec", "eval"}:
+        raise ValueError("Mode must be 'exec' or 'eval'")
+
+    try:
+        parsed_code = ast.parse(code, mode=mode)
+    except SyntaxError as e:
+        raise ValueError(f"Invalid syntax: {e}")
+
+    disallowed_words = collect_names(parsed_code) - allowed_words
+    if disallowed_words:
+        raise ValueError(f"Disallowed words found: {disallowed_words}")
+
+    return parsed_code
+
+
+def compile_code(code: str, allowed_words: set, mode: str):
+    """
+    Parse, validate and compile a single condition or action of an operating strategy.
+
+    Parameters:
+    code (str): The Python code of the condition or action as a string.
+    allowed_words (set): A set of allowed words for execution or evaluation.
+    mode (str): The compile mode, either 'exec' for actions or 'eval' for conditions.
+
+    Returns:
+    code object: The compiled code, ready to be passed to exec() or eval().
+
+    Raises:
+    ValueError: If the code contains disallowed words or invalid syntax.
+    """
+    return compile(parse_code(code, allowed_words, mode), "<operating strategy>", mode)
+
+
+def compile_strategy(strategy, allowed_words=ALLOWED_WORDS):
+    """
+    Validate and compile all rules of an operating strategy once, before the simulation loop.
+
+    Rules that do not depend on the battery state or on variables set by any action (e.g.
+    P_pv[t] > P_load[t]) are additionally compiled for a whole-array evaluation over all time steps.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    allowed_words (set): A set of allowed words for the conditions and actions.
+
+    Returns:
+    list: One CompiledRule(condition, action, vectorized) per rule, in the order of the strategy.
+
+    Raises:
+    ValueError: If a rule contains disallowed words or invalid syntax.
+    """
+    parsed_rules = [
+        (
+            parse_code(rule["condition"], allowed_words, mode="eval"),
+            parse_code(rule["action"], allowed_words, mode="exec"),
+        )
+        for rule in strategy
+    ]
+
+    # Names that keep their value during the simulation loop, i.e. inputs that no action assigns to
+    assigned = set().union(*(assigned_names(action) for _, action in parsed_rules))
+    state_free_names = (TIME_SERIES_INPUTS | SCALAR_INPUTS | {"t", "min", "max"}) - assigned
+
+    return [
+        CompiledRule(
+            compile(condition, "<operating strategy>", "eval"),
+            compile(action, "<operating strategy>", "exec"),
+            vectorize_rule(condition, action, state_free_names),
+        )
+        for condition, action in parsed_rules
+    ]
+
+
+def referenced_names(strategy):
+    """
+    Return all names used in the conditions and actions of an operating strategy, e.g. to find the inputs it needs.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+
+    Returns:
+    set: The names, or all allowed words if the strategy cannot be parsed and might refer to any of them.
+    """
+    try:
+        return set().union(
+            *(
+                collect_names(ast.parse(rule["condition"], mode="eval")) | collect_names(ast.parse(rule["action"]))
+                for rule in strategy
+            )
+        )
+    except (SyntaxError, ValueError, TypeError, KeyError):
+        return set(ALLOWED_WORDS)
+
+
+def create_sandbox(variables):
+    """
+    Prepare the restricted execution environment for the compiled rules.
+
+    Parameters:
+    variables (dict): Variables to include in the execution environment.
+
+    Returns:
+    dict: Globals for eval() and exec() of the compiled rules.
+    """
+    sandbox = {"__builtins__": SAFE_BUILTINS, "min": min, "max": max}
+    sandbox.update(variables)
+    return sandbox
+
+
+class StrategyNamespace:
+    """
+    Reusable evaluation namespace for the compiled rules of an operating strategy.
+
+    Holds only the whitelisted simulation variables (P_pv, P_load, SoC, W_batt_max, ...). It is built
+    once per simulation run and updated in place, e.g. with the current time step.
+    """
+
+    __slots__ = ("globals",)
+
+    def __init__(self, allowed_words=ALLOWED_WORDS, **variables):
+        disallowed_words = variables.keys() - allowed_words
+        if disallowed_words:
+            raise ValueError(f"Disallowed words found: {disallowed_words}")
+        self.globals = create_sandbox(variables)
+
+    def __getitem__(self, name):
+        return self.globals[name]
+
+    def __setitem__(self, name, value):
+        self.globals[name] = value
+
+    def set_time_step(self, t):
+        """Set the time step 't' the rules are evaluated for"""
+        self.globals["t"] = t
+
+
+def apply_rules(compiled_strategy, namespace, vectorized_results=None):
+    """
+    Apply all compiled rules of an operating strategy for the time step currently set in the namespace.
+
+    Each rule gets its own (empty) locals, so assignments to plain names inside a rule do not leak
+    into the following rules or time steps.
+
+    Parameters:
+    compiled_strategy (list): Rules as returned by compile_strategy().
+    namespace (StrategyNamespace): Namespace holding the simulation variables and the current time step 't'.
+    vectorized_results (list): Results of evaluate_vectorized_rules(), these rules are not evaluated again.
+    """
+    sandbox = namespace.globals
+    if vectorized_results is None:
+        for condition, action, _ in compiled_strategy:
+            if eval(condition, sandbox, {}):
+                exec(action, sandbox, {})
+        return
+
+    t = sandbox["t"]
+    for (condition, action, _), result in zip(compiled_strategy, vectorized_results):
+        if result is None:
+            if eval(condition, sandbox, {}):
+                exec(action, sandbox, {})
+        elif result.mask[t]:
+            for name, values in result.assignments:
+                sandbox[name][t] = values[t]
+
+
+# Vectorized evaluation of the rules that do not depend on the state of the simulation
+
+
+class NotVectorizable(ValueError):
+    """Raised for conditions and actions that have to be evaluated time step by time step"""
+
+
+def _truth(x):
+    return np.asarray(x, dtype=bool)
+
+
+def _and(*args):
+    return reduce(np.logical_and, map(_truth, args))
+
+
+def _or(*args):
+    return reduce(np.logical_or, map(_truth, args))
+
+
+def _not(x):
+    return np.logical_not(_truth(x))
+
+
+def _min(*args):
+    # Same as the built-in min(): an item replaces the result only if it is smaller
+    return reduce(lambda result, item: np.where(item < result, item, result), args)
+
+
+def _max(*args):
+    # Same as the built-in max(): an item replaces the result only if it is larger
+    return reduce(lambda result, item: np.where(item > result, item, result), args)
+
+
+def _where(condition, x, y):
+    return np.where(_truth(condition), x, y)
+
+
+VECTOR_HELPERS = {
+    "__builtins__": {},
+    "_truth": _truth,
+    "_and": _and,
+    "_or": _or,
+    "_not": _not,
+    "_min": _min,
+    "_max": _max,
+    "_where": _where,
+}
+
+_ARITHMETIC_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_COMPARISON_OPERATORS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def _call(helper, args):
+    return ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=args, keywords=[])
+
+
+def _is_boolean(node):
+    return isinstance(node, (ast.Compare, ast.BoolOp)) or (
+        isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)
+    )
+
+
+def vectorize_expression(node, state_free_names, truth_value=False):
+    """
+    Rewrite an expression for time step t into the same expression for all time steps at once.
+
+    Parameters:
+    node (ast.AST): Expression of a condition or of the value of an action.
+    state_free_names (set): Names that keep their value during the simulation loop.
+    truth_value (bool): Whether only the truth value of the expression is used (e.g. a condition).
+
+    Returns:
+    ast.AST: Expression over whole arrays, using the helpers in VECTOR_HELPERS.
+
+    Raises:
+    NotVectorizable: If the expression depends on the state of the simulation or is not supported.
+    """
+
+    def vectorize(child, child_truth_value=False):
+        return vectorize_expression(child, state_free_names, child_truth_value)
+
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+        return node
+
+    if isinstance(node, ast.Name) and node.id in state_free_names and node.id in SCALAR_INPUTS | {"t"}:
+        return node
+
+    if isinstance(node, ast.Subscript):
+        # Only X[t] of inputs, shifted time steps such as X[t-1] are handled by the loop
+        if (
+            isinstance(node.value, ast.Name)
+            and node.value.id in state_free_names & TIME_SERIES_INPUTS
+            and isinstance(node.slice, ast.Name)
+            and node.slice.id == "t"
+        ):
+            return ast.Name(id=node.value.id, ctx=ast.Load())
+
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, _ARITHMETIC_OPERATORS):
+        # Integer arithmetic on t may raise (e.g. division by zero) or overflow, leave it to the loop
+        if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and (
+            "t" in collect_names(node.right) or isinstance(node.right, ast.Constant) and node.right.value == 0
+        ):
+            raise NotVectorizable("Division by a value that may be zero")
+        if isinstance(node.op, ast.Pow) and "t" in collect_names(node):
+            raise NotVectorizable("Power of t")
+        return ast.BinOp(left=vectorize(node.left), op=node.op, right=vectorize(node.right))
+
+    elif isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.Not):
+            return _call("_not", [vectorize(node.operand, True)])
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            return ast.UnaryOp(op=node.op, operand=vectorize(node.operand))
+
+    elif isinstance(node, ast.BoolOp):
+        # 'and'/'or' return one of their operands, which is only the same as the element-wise
+        # operation if the truth value is used or all operands are booleans
+        if truth_value or all(_is_boolean(value) for value in node.values):
+            helper = "_and" if isinstance(node.op, ast.And) else "_or"
+            return _call(helper, [vectorize(value, True) for value in node.values])
+
+    elif isinstance(node, ast.Compare) and all(isinstance(op, _COMPARISON_OPERATORS) for op in node.ops):
+        operands = [vectorize(operand) for operand in [node.left, *node.comparators]]
+        comparisons = [
+            ast.Compare(left=left, ops=[op], comparators=[right])
+            for left, op, right in zip(operands, node.ops, operands[1:])
+        ]
+        return comparisons[0] if len(comparisons) == 1 else _call("_and", comparisons)
+
+    elif isinstance(node, ast.IfExp):
+        return _call(
+            "_where",
+            [vectorize(node.test, True), vectorize(node.body, truth_value), vectorize(node.orelse, truth_value)],
+        )
+
+    elif (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in state_free_names & {"min", "max"}
+        and len(node.args) >= 2
+        and not node.keywords
+        and not any(isinstance(arg, ast.Starred) for arg in node.args)
+    ):
+        return _call("_" + node.func.id, [vectorize(arg) for arg in node.args])
+
+    raise NotVectorizable(f"Not vectorizable: {ast.unparse(node)}")
+
+
+def vectorize_rule(condition, action, state_free_names):
+    """
+    Compile a rule for a whole-array evaluation over all time steps, if it does not depend on the state.
+
+    Parameters:
+    condition (ast.Expression): Parsed condition of the rule.
+    action (ast.Module): Parsed action of the rule, only assignments X[t] = ... are supported.
+    state_free_names (set): Names that keep their value during the simulation loop.
+
+    Returns:
+    VectorizedRule: The compiled rule, or None if it has to be applied time step by time step.
+    """
+
+    def compile_expression(node):
+        return compile(ast.fix_missing_locations(ast.Expression(body=node)), "<operating strategy>", "eval")
+
+    try:
+        vectorized_condition = compile_expression(vectorize_expression(condition.body, state_free_names, True))
+        assignments = []
+        for statement in action.body:
+            if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1):
+                raise NotVectorizable("Only single assignments are supported")
+            target = statement.targets[0]
+            if not (
+                isinstance(target, ast.Subscript)
+                and isinstance(target.value, ast.Name)
+                and target.value.id in ACTION_VARIABLES
+                and isinstance(target.slice, ast.Name)
+                and target.slice.id == "t"
+            ):
+                raise NotVectorizable(f"Not vectorizable: {ast.unparse(target)}")
+            value = compile_expression(vectorize_expression(statement.value, state_free_names))
+            assignments.append((target.value.id, value))
+    except NotVectorizable:
+        return None
+
+    return VectorizedRule(vectorized_condition, assignments)
+
+
+def evaluate_vectorized_rules(compiled_strategy, namespace, n_steps):
+    """
+    Evaluate the conditions and actions of all vectorized rules for all time steps at once.
+
+    Parameters:
+    compiled_strategy (list): Rules as returned by compile_strategy().
+    namespace (StrategyNamespace): Namespace holding the simulation variables.
+    n_steps (int): Number of time steps of the simulation.
+
+    Returns:
+    list: One VectorizedResult per rule, or None for the rules that are applied time step by time step.
+    """
+    variables = dict(VECTOR_HELPERS)
+    for name, value in namespace.globals.items():
+        if name != "__builtins__":
+            values = getattr(value, "values", None)
+            variables[name] = values if isinstance(values, np.ndarray) else value
+    variables["t"] = np.arange(n_steps)
+
+    results = []
+    with np.errstate(all="ignore"):
+        for rule in compiled_strategy:
+            if rule.vectorized is None:
+                results.append(None)
+                continue
+            try:
+                mask = np.broadcast_to(_truth(eval(rule.vectorized.condition, variables)), (n_steps,))
+                assignments = [
+                    (name, np.broadcast_to(np.asarray(eval(value, variables), dtype=float), (n_steps,)))
+                    for name, value in rule.vectorized.assignments
+                ]
+            except Exception:
+                # Leave the rule to the loop, which reports errors for the time step they occur in
+                results.append(None)
+                continue
+            results.append(VectorizedResult(mask, assignments))
+    return results
+
+
+def is_sequential(vectorized_results):
+    """Return True if at least one rule has to be applied time step by time step"""
+    return any(result is None for result in vectorized_results)
+
+
+def apply_vectorized_rules(vectorized_results, namespace):
+    """
+    Apply the evaluated rules to the simulation variables of all time steps at once, in the order of the strategy.
+
+    Only valid if no rule has to be applied time step by time step (see is_sequential()).
+
+    Parameters:
+    vectorized_results (list): Results of evaluate_vectorized_rules().
+    namespace (StrategyNamespace): Namespace holding the simulation variables.
+    """
+    for result in vectorized_results:
+        for name, values in result.assignments:
+            np.copyto(namespace[name].values, values, where=result.mask)
+
+
+# Decision table of the rules for the time step loop: the conditions are split into their comparisons (atoms), which
+# are evaluated at most once per time step and not at all if the atoms evaluated before already imply their value
+
+# Largest number of value combinations of the atoms that are enumerated, and of lines of a compiled decision table
+MAX_ATOM_COMBINATIONS = 4096
+MAX_DECISION_LINES = 4000
+
+# Node types of conditions and actions without side effects other than the assignments of the actions
+_PURE_NODES = (
+    ast.Expression,
+    ast.Module,
+    ast.Assign,
+    ast.AugAssign,
+    ast.If,
+    ast.Pass,
+    ast.BoolOp,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.IfExp,
+    ast.Compare,
+    ast.Constant,
+    ast.Name,
+    ast.Subscript,
+    ast.Slice,
+    ast.Tuple,
+    ast.expr_context,
+    ast.boolop,
+    ast.operator,
+    ast.unaryop,
+    ast.cmpop,
+)
+
+_COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_FLIPPED = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Eq: ast.Eq, ast.NotEq: ast.NotEq, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+
+# source: expression of the atom, family: key of the values it depends on, None if an action may change it during a
+# time step, test: function of the value of the family returning the truth value of the atom
+Atom = namedtuple("Atom", ["source", "family", "test"])
+
+# code: code object of the decision function, actions: code objects of the actions that are executed with their own
+# locals, source: Python source of the decision function
+DecisionTable = namedtuple("DecisionTable", ["code", "actions", "source"])
+
+# unreachable: indices of the rules whose condition is never true, overlapping: (index, index, example) of the pairs
+# of rules that can both apply in the same time step, example describes such a time step
+RuleAnalysis = namedtuple("RuleAnalysis", ["unreachable", "overlapping"])
+
+
+def _is_pure(tree):
+    """Return True if evaluating the tree has no side effects besides the assignments of an action"""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id in ("min", "max") and not node.keywords):
+                return False
+            if any(isinstance(arg, ast.Starred) for arg in node.args):
+                return False
+        elif not isinstance(node, _PURE_NODES):
+            return False
+    return True
+
+
+def _number(node):
+    """Value of a finite numeric constant such as 1.0 or -2, None for other expressions"""
+    sign = 1
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        node = node.operand
+    # Also excludes NaN, infinity and integers too large for a float
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float) and abs(node.value) < 1e300:
+        return sign * node.value
+    return None
+
+
+def _candidate_values(expression, constants):
+    """
+    Values of an expression compared to constants that cover every possible outcome of the comparisons.
+
+    t is a non-negative integer and the SoC between 0 and 1 or NaN (for a battery capacity of 0), all other
+    expressions can take any value including NaN.
+    """
+    if expression == "t":
+        values = {0}
+        for constant in constants:
+            values |= {math.floor(constant) - 1, math.floor(constant), math.floor(constant) + 1}
+        return sorted(value for value in values if value >= 0)
+
+    lower, upper = (0.0, 1.0) if expression.startswith("SoC[") else (-math.inf, math.inf)
+    points = sorted(
+        {constant for constant in constants if lower <= constant <= upper} | {lower, upper} - {-math.inf, math.inf}
+    )
+    values = points + [(a + b) / 2 for a, b in zip(points, points[1:])]
+    if lower == -math.inf:
+        values.append(points[0] - 1)
+    if upper == math.inf:
+        values.append(points[-1] + 1)
+    return values + [math.nan]
+
+
+class _TableTooLarge(Exception):
+    """Raised while generating a decision table with more than MAX_DECISION_LINES lines"""
+
+
+def _split_atom(node, source, assigned, constants):
+    """Return the Atom of a comparison or other expression, add the constants it is compared to to constants"""
+    if collect_names(node) & assigned:
+        return Atom(source, None, None)
+    if isinstance(node, ast.Compare) and type(node.ops[0]) in _COMPARISONS:
+        left, op, right = node.left, type(node.ops[0]), node.comparators[0]
+        if _number(left) is not None:
+            left, op, right = right, _FLIPPED[op], left
+        compare = _COMPARISONS[op]
+        constant = _number(right)
+        if _number(left) is None and constant is not None:
+            expression = ast.unparse(left)
+            constants.setdefault(expression, set()).add(constant)
+            return Atom(source, ("value", expression), lambda value: compare(value, constant))
+        if _number(left) is None:
+            # Both orders of the operands are the same family, e.g. P_pv[t] > P_load[t] and P_load[t] >= P_pv[t]
+            first, second = ast.unparse(left), ast.unparse(right)
+            if second < first:
+                first, second, compare = second, first, _COMPARISONS[_FLIPPED[op]]
+            return Atom(source, ("order", first, second), lambda values: compare(*values))
+    return Atom(source, ("atom", source), bool)
+
+
+def _split_rules(strategy, allowed_words):
+    """
+    Parse the rules of an operating strategy and split their conditions into atoms.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    allowed_words (set): A set of allowed words for the conditions and actions.
+
+    Returns:
+    tuple: (conditions, actions, worlds) with the boolean structure of each condition (nested ("and", [...]),
+    ("or", [...]), ("not", ...) and ("atom", Atom) tuples), the parsed actions and all combinations of the values of
+    the atom families (dicts of family and value), None if there are more than MAX_ATOM_COMBINATIONS. None if a
+    condition or action may have side effects.
+
+    Raises:
+    ValueError: If a rule contains disallowed words or invalid syntax.
+    """
+    parsed_rules = [
+        (
+            parse_code(rule["condition"], allowed_words, mode="eval"),
+            parse_code(rule["action"], allowed_words, mode="exec"),
+        )
+        for rule in strategy
+    ]
+    if not all(_is_pure(condition) and _is_pure(action) for condition, action in parsed_rules):
+        return None
+
+    # Atoms that read variables an action assigns to may change between two rules of the same time step
+    assigned = set().union(*(assigned_names(action) for _, action in parsed_rules))
+    atoms = {}
+    constants = {}
+
+    def structure(node):
+        if isinstance(node, ast.BoolOp):
+            return ("and" if isinstance(node.op, ast.And) else "or", [structure(value) for value in node.values])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ("not", structure(node.operand))
+        if isinstance(node, ast.Compare) and len(node.ops) > 1:
+            # a < b < c is a < b and b < c
+            operands = [node.left, *node.comparators]
+            return (
+                "and",
+                [
+                    structure(ast.Compare(left=left, ops=[op], comparators=[right]))
+                    for left, op, right in zip(operands, node.ops, operands[1:])
+                ],
+            )
+        source = ast.unparse(node)
+        if source not in atoms:
+            atoms[source] = _split_atom(node, source, assigned, constants)
+        return ("atom", atoms[source])
+
+    conditions = [structure(condition.body) for condition, _ in parsed_rules]
+
+    families = {}
+    for atom in atoms.values():
+        if atom.family is None or atom.family in families:
+            continue
+        if atom.family[0] == "value":
+            families[atom.family] = _candidate_values(atom.family[1], constants[atom.family[1]])
+        elif atom.family[0] == "order":
+            # Less, equal, greater and not comparable (NaN)
+            families[atom.family] = [(0.0, 1.0), (0.0, 0.0), (1.0, 0.0), (math.nan, 0.0)]
+        else:
+            families[atom.family] = [False, True]
+    worlds = None
+    if math.prod(len(values) for values in families.values()) <= MAX_ATOM_COMBINATIONS:
+        worlds = [dict(zip(families, values)) for values in itertools.product(*families.values())]
+    return conditions, [action for _, action in parsed_rules], worlds
+
+
+def compile_decision_table(strategy, allowed_words=ALLOWED_WORDS):
+    """
+    Compile the rules of an operating strategy into a decision table for the time step loop.
+
+    The conditions of the bundled strategies are combinations of a few comparisons, e.g. P_pv[t] > P_load[t] and
+    the SoC of the previous time step, that are shared between the rules or exclude each other. The table evaluates
+    each comparison at most once per time step, in the order apply_rules() would, and skips the comparisons whose
+    value follows from the ones evaluated before (e.g. t == 0 after t > 0), so only the rules that apply are run.
+    Comparisons of variables that an action assigns to are evaluated every time, like in apply_rules().
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    allowed_words (set): A set of allowed words for the conditions and actions.
+
+    Returns:
+    DecisionTable: The compiled table, see decision_function(). None if the rules cannot be compiled this way,
+    e.g. for conditions with side effects or too many combinations of comparisons.
+
+    Raises:
+    ValueError: If a rule contains disallowed words or invalid syntax.
+    """
+    split_rules = _split_rules(strategy, allowed_words)
+    if split_rules is None or split_rules[2] is None:
+        return None
+    conditions, actions, worlds = split_rules
+
+    action_lines = []
+    action_codes = []
+    for action in actions:
+        if any(isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load) for node in ast.walk(action)):
+            # Assignments to names are local to the rule, see apply_rules()
+            action_lines.append([f"_exec(_actions[{len(action_codes)}], _globals, {{}})"])
+            action_codes.append(compile(action, "<operating strategy>", "exec"))
+        else:
+            action_lines.append(ast.unparse(action).splitlines() or ["pass"])
+
+    n_lines = 0
+
+    def block(lines):
+        nonlocal n_lines
+        n_lines += len(lines)
+        if n_lines > MAX_DECISION_LINES:
+            raise _TableTooLarge()
+        return ["    " + line for line in lines] or ["    pass"]
+
+    def if_statement(test, true_lines, false_lines):
+        return [f"if {test}:", *block(true_lines), *(["else:", *block(false_lines)] if false_lines else [])]
+
+    def rules_from(i, worlds, evaluated):
+        # Lines applying the rules from index i on, worlds: the combinations still possible, evaluated: the
+        # families of the atoms evaluated so far
+        if i == len(conditions):
+            return []
+
+        def apply(worlds, evaluated):
+            return action_lines[i] + rules_from(i + 1, worlds, evaluated)
+
+        def skip(worlds, evaluated):
+            return rules_from(i + 1, worlds, evaluated)
+
+        return branch(conditions[i], worlds, evaluated, apply, skip)
+
+    def branch(structure, worlds, evaluated, if_true, if_false):
+        kind = structure[0]
+        if kind == "not":
+            return branch(structure[1], worlds, evaluated, if_false, if_true)
+        if kind in ("and", "or"):
+            first, rest = structure[1][0], structure[1][1:]
+            if not rest:
+                return branch(first, worlds, evaluated, if_true, if_false)
+
+            def remaining(worlds, evaluated):
+                return branch((kind, rest), worlds, evaluated, if_true, if_false)
+
+            if kind == "and":
+                return branch(first, worlds, evaluated, remaining, if_false)
+            return branch(first, worlds, evaluated, if_true, remaining)
+
+        atom = structure[1]
+        if atom.family is None:
+            return if_statement(atom.source, if_true(worlds, evaluated), if_false(worlds, evaluated))
+        worlds_true = [world for world in worlds if atom.test(world[atom.family])]
+        worlds_false = [world for world in worlds if not atom.test(world[atom.family])]
+        if atom.family in evaluated and not worlds_false:
+            return if_true(worlds_true, evaluated)
+        if atom.family in evaluated and not worlds_true:
+            return if_false(worlds_false, evaluated)
+        evaluated = evaluated | {atom.family}
+        # Known from the range of the values only (e.g. t >= 0), still evaluated for the errors it may raise
+        if not worlds_false:
+            return [*if_statement(atom.source, [], []), *if_true(worlds_true, evaluated)]
+        if not worlds_true:
+            return [*if_statement(atom.source, [], []), *if_false(worlds_false, evaluated)]
+        return if_statement(atom.source, if_true(worlds_true, evaluated), if_false(worlds_false, evaluated))
+
+    try:
+        source = "\n".join(["def decide(_exec, _actions, _globals):", *block(rules_from(0, worlds, frozenset()))])
+        module = compile(source, "<operating strategy>", "exec")
+    except (_TableTooLarge, SyntaxError, RecursionError):
+        return None
+    code = next(constant for constant in module.co_consts if isinstance(constant, types.CodeType))
+    return DecisionTable(code, action_codes, source)
+
+
+def decision_function(decision_table, namespace):
+    """
+    Bind a decision table to the namespace of a simulation run.
+
+    Returns:
+    function: Applies all rules for the time step currently set in the namespace, like apply_rules().
+    """
+    return types.FunctionType(
+        decision_table.code, namespace.globals, "decide", (exec, decision_table.actions, namespace.globals)
+    )
+
+
+def analyze_rules(strategy, allowed_words=ALLOWED_WORDS):
+    """
+    Find the rules of an operating strategy that are never applied and the rules that can apply in the same time step.
+
+    All combinations of the outcomes of the comparisons in the conditions are checked (see compile_decision_table()),
+    including NaN values, e.g. the SoC for a battery capacity of 0. Comparisons of variables that an action assigns
+    to can take any value, so two rules using them are reported as overlapping unless other comparisons exclude it.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    allowed_words (set): A set of allowed words for the conditions and actions.
+
+    Returns:
+    RuleAnalysis: Unreachable and overlapping rules, None if the strategy cannot be analyzed (e.g. invalid rules,
+    conditions with side effects or too many combinations of comparisons).
+    """
+    try:
+        split_rules = _split_rules(strategy, allowed_words)
+    except (ValueError, TypeError, KeyError):
+        return None
+    if split_rules is None or split_rules[2] is None:
+        return None
+    conditions, _, worlds = split_rules
+
+    def evaluate(structure, world, atoms):
+        # True, False or None if unknown, atoms: list of the atoms evaluated in the order of Python
+        kind = structure[0]
+        if kind == "not":
+            value = evaluate(structure[1], world, atoms)
+            return None if value is None else not value
+        if kind in ("and", "or"):
+            unknown = False
+            for child in structure[1]:
+                value = evaluate(child, world, atoms)
+                if value is None:
+                    unknown = True
+                elif value == (kind == "or"):
+                    return value
+            return None if unknown else kind == "and"
+        atoms.append(structure[1])
+        return None if structure[1].family is None else structure[1].test(world[structure[1].family])
+
+    # Per rule and combination: the value of the condition and the atoms it evaluated
+    outcomes = []
+    for condition in conditions:
+        rule_outcomes = []
+        for world in worlds:
+            atoms = []
+            rule_outcomes.append((evaluate(condition, world, atoms), atoms))
+        outcomes.append(rule_outcomes)
+
+    unreachable = [i for i, rule_outcomes in enumerate(outcomes) if all(value is False for value, _ in rule_outcomes)]
+    overlapping = []
+    for i, j in itertools.combinations(range(len(conditions)), 2):
+        candidates = [
+            k for k in range(len(worlds)) if outcomes[i][k][0] is not False and outcomes[j][k][0] is not False
+        ]
+        if not candidates:
+            continue
+        # An example where both are certainly true, if there is one
+        k = next((k for k in candidates if outcomes[i][k][0] and outcomes[j][k][0]), candidates[0])
+        example = {}
+        for atom in outcomes[i][k][1] + outcomes[j][k][1]:
+            if atom.family is not None:
+                example[atom.source] = atom.source if atom.test(worlds[k][atom.family]) else f"not ({atom.source})"
+        overlapping.append((i, j, " and ".join(example.values())))
+    return RuleAnalysis(unreachable, overlapping)
+
+
+# Evaluation of the rules for many households at once, one time step after the other (see fleet.py)
+
+# condition: code object evaluating to a boolean per household,
+# assignments: list of (variable name, code object of the time step, code object of the values per household)
+HouseholdRule = namedtuple("HouseholdRule", ["condition", "assignments"])
+
+
+def _and_lazy(*operands):
+    # Like 'and': the remaining operands are not evaluated once the result is False for all households
+    result = np.bool_(True)
+    for operand in operands:
+        result = np.logical_and(result, _truth(operand()))
+        if not result.any():
+            break
+    return result
+
+
+def _or_lazy(*operands):
+    # Like 'or': the remaining operands are not evaluated once the result is True for all households
+    result = np.bool_(False)
+    for operand in operands:
+        result = np.logical_or(result, _truth(operand()))
+        if result.all():
+            break
+    return result
+
+
+def _where_lazy(condition, body, orelse):
+    # Like 'body if condition else orelse': a branch is only evaluated if it is taken by any household
+    condition = _truth(condition)
+    if condition.all():
+        return body()
+    if not condition.any():
+        return orelse()
+    return np.where(condition, body(), orelse())
+
+
+HOUSEHOLD_HELPERS = {
+    **VECTOR_HELPERS,
+    "_and_lazy": _and_lazy,
+    "_or_lazy": _or_lazy,
+    "_where_lazy": _where_lazy,
+}
+
+
+def _lambda(body):
+    arguments = ast.arguments(
+        posonlyargs=[], args=[], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]
+    )
+    return ast.Lambda(args=arguments, body=body)
+
+
+def vectorize_households_expression(node, truth_value=False):
+    """
+    Rewrite an expression for time step t into the same expression for all households at once.
+
+    Every variable X[...] holds one value per household for a time step, so only the operations that do not work
+    on arrays are replaced: 'and', 'or', 'not', 'if else', chained comparisons, min() and max(). The replacements
+    only evaluate operands that are needed by at least one household, e.g. SoC[t-1] in 't > 0 and SoC[t-1] > 0'.
+
+    Parameters:
+    node (ast.AST): Expression of a condition or of the value of an action.
+    truth_value (bool): Whether only the truth value of the expression is used (e.g. a condition).
+
+    Returns:
+    ast.AST: Expression over arrays of all households, using the helpers in HOUSEHOLD_HELPERS.
+
+    Raises:
+    NotVectorizable: If the expression could behave differently than for a single household.
+    """
+
+    def vectorize(child, child_truth_value=False):
+        return vectorize_households_expression(child, child_truth_value)
+
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+        return node
+
+    if isinstance(node, ast.Name):
+        return ast.Name(id=node.id, ctx=ast.Load())
+
+    if isinstance(node, ast.Subscript):
+        if isinstance(node.value, ast.Name):
+            return ast.Subscript(value=vectorize(node.value), slice=vectorize(node.slice), ctx=ast.Load())
+
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, _ARITHMETIC_OPERATORS):
+        # Python raises for a division by zero, arrays return inf, so only divisions by constants are supported
+        if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and not (
+            isinstance(node.right, ast.Constant) and node.right.value != 0
+        ):
+            raise NotVectorizable("Division by a value that may be zero")
+        if isinstance(node.op, ast.Pow) and not (
+            isinstance(node.right, ast.Constant) and type(node.right.value) is int and node.right.value >= 0
+        ):
+            raise NotVectorizable("Power with a variable or negative exponent")
+        return ast.BinOp(left=vectorize(node.left), op=node.op, right=vectorize(node.right))
+
+    elif isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.Not):
+            return _call("_not", [vectorize(node.operand, True)])
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            return ast.UnaryOp(op=node.op, operand=vectorize(node.operand))
+
+    elif isinstance(node, ast.BoolOp):
+        # See vectorize_expression(), the operands are passed as lambdas to keep the short-circuit evaluation
+        if truth_value or all(_is_boolean(value) for value in node.values):
+            helper = "_and_lazy" if isinstance(node.op, ast.And) else "_or_lazy"
+            return _call(helper, [_lambda(vectorize(value, True)) for value in node.values])
+
+    elif isinstance(node, ast.Compare) and all(isinstance(op, _COMPARISON_OPERATORS) for op in node.ops):
+        operands = [vectorize(operand) for operand in [node.left, *node.comparators]]
+        comparisons = [
+            ast.Compare(left=left, ops=[op], comparators=[right])
+            for left, op, right in zip(operands, node.ops, operands[1:])
+        ]
+        if len(comparisons) == 1:
+            return comparisons[0]
+        return _call("_and_lazy", [_lambda(comparison) for comparison in comparisons])
+
+    elif isinstance(node, ast.IfExp):
+        return _call(
+            "_where_lazy",
+            [
+                vectorize(node.test, True),
+                _lambda(vectorize(node.body, truth_value)),
+                _lambda(vectorize(node.orelse, truth_value)),
+            ],
+        )
+
+    elif (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in {"min", "max"}
+        and len(node.args) >= 2
+        and not node.keywords
+        and not any(isinstance(arg, ast.Starred) for arg in node.args)
+    ):
+        return _call("_" + node.func.id, [vectorize(arg) for arg in node.args])
+
+    raise NotVectorizable(f"Not vectorizable: {ast.unparse(node)}")
+
+
+def compile_households_strategy(strategy, allowed_words=ALLOWED_WORDS):
+    """
+    Validate and compile all rules of an operating strategy for the evaluation over all households at once.
+
+    Parameters:
+    strategy (list): Parsed operating strategy, a list of {"condition": ..., "action": ...} dicts.
+    allowed_words (set): A set of allowed words for the conditions and actions.
+
+    Returns:
+    list: One HouseholdRule per rule, in the order of the strategy.
+
+    Raises:
+    ValueError: If a rule contains disallowed words or invalid syntax.
+    NotVectorizable: If a rule has to be evaluated household by household, e.g. an action other than X[t] = ...
+    """
+
+    def compile_expression(node):
+        return compile(ast.fix_missing_locations(ast.Expression(body=node)), "<operating strategy>", "eval")
+
+    rules = []
+    for rule in strategy:
+        condition = parse_code(rule["condition"], allowed_words, mode="eval")
+        action = parse_code(rule["action"], allowed_words, mode="exec")
+        assignments = []
+        for statement in action.body:
+            if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1):
+                raise NotVectorizable("Only single assignments are supported")
+            target = statement.targets[0]
+            if not (
+                isinstance(target, ast.Subscript)
+                and isinstance(target.value, ast.Name)
+                and target.value.id in ACTION_VARIABLES
+            ):
+                raise NotVectorizable(f"Not vectorizable: {ast.unparse(target)}")
+            assignments.append(
+                (
+                    target.value.id,
+                    compile_expression(vectorize_households_expression(target.slice)),
+                    compile_expression(vectorize_households_expression(statement.value)),
+                )
+            )
+        rules.append(
+            HouseholdRule(compile_expression(vectorize_households_expression(condition.body, True)), assignments)
+        )
+    return rules
@@ -0,0 +1,209 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from simulation import simulate
+
+# Performance indicators of a sizing sweep, name and unit
+SWEEP_KPIS = {
+    "C_net": "€",
+    "CO2_emissions": "gCO₂",
+    "Self-consumption": "%",
+    "Self-sufficiency": "%",
+}
+
+# pv_capacities, battery_capacities: axes of the grid, kpis: dict of (n_pv, n_battery) arrays (see SWEEP_KPIS),
+# engine: engine of the simulations, errors: dict of (pv capacity, battery capacity) and the error of failed runs
+SweepResult = namedtuple("SweepResult", ["pv_capacities", "battery_capacities", "kpis", "engine", "errors"])
+
+# Errors of the process pool after which the tasks are run in this process instead, e.g. if processes cannot be
+# started in this environment (RuntimeError: e.g. no new tasks while the interpreter shuts down)
+POOL_ERRORS = (BrokenProcessPool, OSError, RuntimeError)
+
+# Process pool with one process per CPU shared by all sweeps, uncertainty analyses and batches of the app process,
+# started on first use. It is never shut down while in use, other sessions may be submitting tasks at the same time.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def sweep_kpis(result, feed_in_tariff):
+    """
+    Performance indicators of one simulation for the sizing sweep.
+
+    Unlike the C_total of the result table, C_net values the fed-in electricity at the feed-in tariff, i.e. it is
+    the total cost shown below Figure 4d.
+
+    Parameters:
+    result (SimulationResult): Result of simulate().
+    feed_in_tariff (float): PV feed-in tariff [€/kWh].
+
+    Returns:
+    dict: Value for each name in SWEEP_KPIS.
+    """
+    return {
+        "C_net": np.nansum(result.E_purchase * result.electricity_price_customer)
+        - np.nansum(result.E_feed_in) * feed_in_tariff,
+        "CO2_emissions": result.kpis["CO2_emissions"],
+        "Self-consumption": result.kpis["Self-consumption"],
+        "Self-sufficiency": result.kpis["Self-sufficiency"],
+    }
+
+
+def simulate_pv_row(
+    pv_capacity,
+    battery_capacities,
+    pv_cf,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    strategy,
+    time_step=1,
+):
+    """
+    Simulate one PV capacity with all battery capacities (one task of the process pool).
+
+    Returns:
+    tuple: Dict with a list of values per name in SWEEP_KPIS, engine and dict of battery capacity and error.
+    """
+    P_pv = pv_capacity * np.asarray(pv_cf, dtype=float)
+    values = {name: [] for name in SWEEP_KPIS}
+    engine = None
+    errors = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for battery_capacity in battery_capacities:
+            result = simulate(
+                P_pv,
+                P_load,
+                electricity_price_customer,
+                CO2_emissions_specific,
+                feed_in_tariff,
+                battery_capacity,
+                strategy,
+                time_step,
+            )
+            engine = result.engine
+            if result.error is not None:
+                errors[battery_capacity] = f"{type(result.error).__name__}: {result.error}"
+                kpis = dict.fromkeys(SWEEP_KPIS, np.nan)
+            else:
+                kpis = sweep_kpis(result, feed_in_tariff)
+            for name in SWEEP_KPIS:
+                values[name].append(kpis[name])
+    return values, engine, errors
+
+
+def get_executor():
+    """Return the shared process pool with one process per CPU, starting it on first use or if it broke"""
+    global _executor
+    with _executor_lock:
+        # A broken pool (e.g. a killed worker) cannot run any more tasks, the tasks submitted to it have failed already
+        if _executor is None or _executor._broken:
+            # Workers are not forked from the (multi-threaded) Streamlit server, forkserver is not available on Windows
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context(start_method)
+            )
+        return _executor
+
+
+def run_in_pool(function, tasks, processes):
+    """
+    Run function(*task) for all tasks in the shared process pool, with at most 'processes' tasks at a time.
+
+    The pool keeps its size, the limit only applies to the tasks of this call, so pools are not restarted for
+    calls with different numbers of processes.
+
+    Parameters:
+    function (callable): Module level function, called in the worker processes.
+    tasks (list): Arguments of the function per task.
+    processes (int): Number of tasks that run at the same time.
+
+    Returns:
+    generator: Position of the task in tasks and its future, in the order the tasks finish.
+
+    Raises:
+    See POOL_ERRORS, if the pool cannot run the tasks.
+    """
+    executor = get_executor()
+    pending = iter(enumerate(tasks))
+    running = {executor.submit(function, *task): i for i, task in itertools.islice(pending, processes)}
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            for i, task in itertools.islice(pending, 1):
+                running[executor.submit(function, *task)] = i
+            yield running.pop(future), future
+
+
+def sweep(
+    pv_capacities,
+    battery_capacities,
+    pv_cf,
+    P_load,
+    electricity_price_customer,
+    CO2_emissions_specific,
+    feed_in_tariff,
+    strategy,
+    processes=None,
+    time_step=1,
+):
+    """
+    Simulate all combinations of PV and battery capacities with the same operating strategy.
+
+    Each PV capacity is one task, run in a process pool if more than one process is available.
+
+    Parameters:
+    pv_capacities (array): PV capacities [kW].
+    battery_capacities (array): Usable storage capacities [kWh].
+    pv_cf (array): PV capacity factor, P_pv = pv_capacity * pv_cf.
+    P_load, electricity_price_customer, CO2_emissions_specific, feed_in_tariff, strategy: See simulate().
+    processes (int): Number of processes, None for the number of CPUs, 1 to simulate in this process.
+    time_step (float): Length of a time step [h].
+
+    Returns:
+    SweepResult: Performance indicators for all combinations, NaN for failed simulations.
+    """
+    pv_capacities = np.asarray(pv_capacities, dtype=float)
+    battery_capacities = np.asarray(battery_capacities, dtype=float)
+    tasks = [
+        (
+            pv_capacity,
+            battery_capacities.tolist(),
+            np.asarray(pv_cf, dtype=float),
+            np.asarray(P_load, dtype=float),
+            np.asarray(electricity_price_customer, dtype=float),
+            np.asarray(CO2_emissions_specific, dtype=float),
+            feed_in_tariff,
+            strategy,
+            time_step,
+        )
+        for pv_capacity in pv_capacities.tolist()
+    ]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+    rows = None
+    if processes > 1:
+        try:
+            rows = [None] * len(tasks)
+            for i, future in run_in_pool(simulate_pv_row, tasks, processes):
+                rows[i] = future.result()
+        except POOL_ERRORS:
+            # E.g. if processes cannot be started in this environment, simulate in this process instead
+            rows = None
+    if rows is None:
+        rows = [simulate_pv_row(*task) for task in tasks]
+
+    kpis = {name: np.array([values[name] for values, _, _ in rows], dtype=float) for name in SWEEP_KPIS}
+    errors = {
+        (pv_capacity, battery_capacity): error
+        for pv_capacity, (_, _, row_errors) in zip(pv_capacities.tolist(), rows)
+        for battery_capacity, error in row_errors.items()
+    }
+    return SweepResult(pv_capacities, battery_capacities, kpis, rows[0][1] if rows else None, errors)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Time zone of the wall clock of most German data sources, e.g. SMARD and Agora
+LOCAL_TIME_ZONE = "Europe/Berlin"
+
+
+def normalize_hourly(data, time_zone=None, start=None, end=None):
+    """
+    Put a time series on a canonical hourly index in UTC without repeated or missing hours.
+
+    Data in local time repeats an hour when the daylight saving time ends and skips one when it starts. The first of
+    two equal time stamps is taken as summer time and the second as winter time, time stamps that do not exist in
+    the time zone are dropped. Values of the same hour are averaged (also for data of a finer resolution) and hours
+    without values are interpolated.
+
+    Columns that are not numeric are dropped, e.g. a second copy of the time stamps (read by pandas as 'date_id.1'),
+    and so are repeated column names.
+
+    Parameters:
+    data (DataFrame): Columns with a DatetimeIndex, sorted.
+    time_zone (str): Time zone of the wall clock of the time stamps, e.g. LOCAL_TIME_ZONE, None if they are in UTC.
+    start, end (str): First and last hour of the index (UTC), None for the first and last hour of the data.
+
+    Returns:
+    DataFrame: The columns on an hourly index of naive UTC time stamps named 'date_time'.
+    """
+    data = data.loc[:, ~data.columns.duplicated()]
+    # Values that are not numbers become missing, columns without any number are dropped
+    data = data.apply(pd.to_numeric, errors="coerce").dropna(axis="columns", how="all")
+
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    elif time_zone is not None:
+        summer_time = ~index.duplicated(keep="first")
+        index = index.tz_localize(time_zone, ambiguous=summer_time, nonexistent="NaT")
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    valid = index.notna()
+    hours = index[valid].floor("h")
+    hourly = data[valid].groupby(hours).mean()
+    full_index = pd.date_range(start or hours.min(), end or hours.max(), freq="h", name="date_time")
+    return hourly.reindex(full_index).interpolate(method="time", limit_direction="both")
+
+
+def map_to_year(data, year, match_weekdays=True):
+    """
+    Map an hourly time series of another year to all hours of a year, e.g. to combine sources of different years.
+
+    Every day takes the values of the same calendar day of the source, or of the nearest day with the same weekday
+    (at most 3 days away), so weekly patterns like lower demand on Sundays are kept. Sources that do not start on
+    January 1st are used from the same calendar day on in the year in which they contain it. February 29th takes the
+    values of February 28th if the source has none, days that are not in the source are taken a week earlier or later.
+
+    Parameters:
+    data (DataFrame): Hourly data of (about) one year, see normalize_hourly().
+    year (int): Year to map the data to.
+    match_weekdays (bool): Use the nearest day with the same weekday instead of the same calendar day.
+
+    Returns:
+    DataFrame: The columns on all hours of the year, index named 'date_time'.
+    """
+    target = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h", name="date_time")
+    first_day = data.index.min().normalize()
+
+    # Same calendar day in the year of the first source day, or the year after for sources starting later in a year
+    source_year = np.where(
+        (target.month < first_day.month) | ((target.month == first_day.month) & (target.day < first_day.day)),
+        first_day.year + 1,
+        first_day.year,
+    )
+    month_start = pd.to_datetime(pd.DataFrame({"year": source_year, "month": target.month, "day": 1}))
+    day = np.minimum(target.day, month_start.dt.days_in_month)
+    source = month_start + pd.to_timedelta(day - 1, unit="D") + pd.to_timedelta(target.hour, unit="h")
+    if match_weekdays:
+        source = source + pd.to_timedelta((target.dayofweek - source.dt.dayofweek + 3) % 7 - 3, unit="D")
+
+    positions = data.index.get_indexer(source)
+    # Days outside of the source, e.g. by the weekday shift at its ends
+    for weeks in (1, -1, 2, -2):
+        missing = positions == -1
+        if not missing.any():
+            break
+        positions[missing] = data.index.get_indexer(source[missing] + pd.Timedelta(weeks=weeks))
+    values = data.to_numpy(dtype=float)[positions]
+    values[positions == -1] = np.nan
+    return pd.DataFrame(values, index=target, columns=data.columns)
+
+
+def assemble_scenario(sources, year, match_weekdays=True):
+    """
+    Combine hourly time series of different sources and years on the hours of one year.
+
+    Parameters:
+    sources (dict): Name and hourly data (DataFrame or Series) in UTC, see normalize_hourly().
+    year (int): Year of the scenario.
+    match_weekdays (bool): See map_to_year().
+
+    Returns:
+    DataFrame: 'date_time' and one column per column of the sources, prefixed with the name of the source for
+    sources with several columns.
+    """
+    columns = {}
+    for name, data in sources.items():
+        data = data.to_frame(name) if isinstance(data, pd.Series) else data
+        mapped = map_to_year(data, year, match_weekdays)
+        for column in mapped.columns:
+            columns[name if len(mapped.columns) == 1 else f"{name}_{column}"] = mapped[column].to_numpy()
+    date_time = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    return pd.DataFrame({"date_time": date_time, **columns})
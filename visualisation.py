@@ -1,8 +1,34 @@
 import streamlit as st
 import plotly.graph_objs as go
+import pandas as pd
+import numpy as np
+
+# Longest time series sent to the browser (a year of hourly values), longer ones are averaged over blocks of time steps
+MAX_PLOT_POINTS = 8760
+
+
+def to_plot_values(data):
+    """
+    Convert a Series to a NumPy array, plotly validates and serializes arrays much faster (e.g. for a full year).
+
+    Time series longer than MAX_PLOT_POINTS are reduced to the mean of blocks of consecutive time steps and time
+    stamps to the first time stamp of each block, e.g. a year at a time step of one minute is plotted hourly.
+    """
+    values = data.to_numpy() if isinstance(data, pd.Series) else data
+    if not isinstance(values, np.ndarray) or values.ndim != 1 or len(values) <= MAX_PLOT_POINTS:
+        return values
+    block = -(-len(values) // MAX_PLOT_POINTS)
+    if not np.issubdtype(values.dtype, np.number):
+        return values[::block]
+    # The last block is filled up with the last value
+    padded = np.pad(values, (0, -len(values) % block), mode="edge")
+    return padded.reshape(-1, block).mean(axis=1)
 
 
 def plot_demand_and_pv_generation(time_series, demand, pv_generation):
+    time_series = to_plot_values(time_series)
+    demand = to_plot_values(demand)
+    pv_generation = to_plot_values(pv_generation)
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
@@ -33,6 +59,9 @@ def plot_demand_and_pv_generation(time_series, demand, pv_generation):
 
 
 def plot_elec_price_and_CO2_emissions(time_series, electricity_price, CO2_emissions):
+    time_series = to_plot_values(time_series)
+    electricity_price = to_plot_values(electricity_price)
+    CO2_emissions = to_plot_values(CO2_emissions)
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
@@ -85,6 +114,16 @@ def plot_energy_flow_diagram(
     electricity_price_customer,
     CO2_emissions_specific,
 ):
+    date_time = to_plot_values(date_time)
+    P_load = to_plot_values(P_load)
+    P_pv = to_plot_values(P_pv)
+    P_feed_in = to_plot_values(P_feed_in)
+    P_purchase = to_plot_values(P_purchase)
+    SoC = to_plot_values(SoC)
+    P_charge = to_plot_values(P_charge)
+    P_discharge = to_plot_values(P_discharge)
+    electricity_price_customer = to_plot_values(electricity_price_customer)
+    CO2_emissions_specific = to_plot_values(CO2_emissions_specific)
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=date_time, y=(-1) * P_load, mode="lines", name="Demand"))
     fig.add_trace(go.Scatter(x=date_time, y=P_pv, mode="lines", name="PV Generation"))
@@ -149,14 +188,112 @@ def plot_energy_flow_diagram(
 
 
 def plot_energy_balance(date_time, net_energy_balance):
+    date_time = to_plot_values(date_time)
+    net_energy_balance = to_plot_values(net_energy_balance)
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=date_time, y=net_energy_balance, mode="lines", name="Energy Balance"))
     fig.update_layout(title="Figure 4a: Energy Flow Balance", xaxis_title="Date", yaxis_title="Balance [kW]")
     return fig
 
 
-def compute_and_plot_costs(P_purchase, P_feed_in, electricity_price, feed_in_tariff, time_series):
-    time_step = 1  # [h]
+def plot_sizing_heatmap(pv_capacities, battery_capacities, values, title, unit, selected=None):
+    fig = go.Figure()
+    fig.add_trace(
+        go.Heatmap(
+            x=battery_capacities,
+            y=pv_capacities,
+            z=values,
+            colorbar=dict(title=unit),
+            hovertemplate="Battery: %{x:.1f} kWh<br>PV: %{y:.1f} kW<br>%{z:.2f} " + unit + "<extra></extra>",
+        )
+    )
+    if selected is not None:
+        # Capacities selected in sections 1 and 3
+        fig.add_trace(
+            go.Scatter(
+                x=[selected[1]],
+                y=[selected[0]],
+                mode="markers",
+                marker=dict(symbol="x", size=12, color="white", line=dict(width=1, color="black")),
+                name="Selected",
+                showlegend=False,
+            )
+        )
+    fig.update_layout(title=title, xaxis_title="Battery capacity [kWh]", yaxis_title="PV capacity [kW]")
+    return fig
+
+
+def plot_battery_cost_curve(samples, battery_capacity, cost):
+    samples = sorted(sample for sample in samples if np.isfinite(sample[1]))
+    fig = go.Figure()
+    fig.add_trace(
+        go.Scatter(
+            x=[sample[0] for sample in samples],
+            y=[sample[1] for sample in samples],
+            mode="lines+markers",
+            name="Sampled capacities",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(x=[battery_capacity], y=[cost], mode="markers", marker=dict(size=12, symbol="star"), name="Optimum")
+    )
+    fig.update_layout(
+        title="Figure 6e: Total cost including the battery",
+        xaxis_title="Battery capacity [kWh]",
+        yaxis_title="Cost [€]",
+        hovermode="x",
+    )
+    return fig
+
+
+def plot_fleet_households(pv_capacities, battery_capacities, values, title, unit):
+    fig = go.Figure(
+        go.Scatter(
+            x=pv_capacities,
+            y=values,
+            mode="markers",
+            marker=dict(color=battery_capacities, colorscale="Viridis", colorbar=dict(title="Battery [kWh]")),
+            hovertemplate="PV: %{x:.2f} kW<br>Battery: %{marker.color:.2f} kWh<br>%{y:.2f} " + unit + "<extra></extra>",
+        )
+    )
+    fig.update_layout(title=title, xaxis_title="PV capacity [kW]", yaxis_title=f"[{unit}]")
+    return fig
+
+
+def plot_scenario_distribution(values, percentiles, title, unit):
+    fig = go.Figure(go.Histogram(x=values, nbinsx=50, name="Scenarios"))
+    for percentile, value in percentiles.items():
+        fig.add_vline(x=value, line_dash="dash" if percentile != 50 else "solid", annotation_text=f"P{percentile}")
+    fig.update_layout(title=title, xaxis_title=f"[{unit}]", yaxis_title="Number of scenarios", showlegend=False)
+    return fig
+
+
+def plot_fan_chart(time_series, flow_percentiles, names, title, unit):
+    # flow_percentiles holds the 5, 25, 50, 75 and 95 % percentiles per time step, see monte_carlo.PERCENTILES
+    time_series = to_plot_values(time_series)
+    fig = go.Figure()
+    for name in names:
+        p5, p25, p50, p75, p95 = flow_percentiles[name]
+        for lower, upper, opacity, band in [(p5, p95, 0.2, "5-95 %"), (p25, p75, 0.4, "25-75 %")]:
+            fig.add_trace(go.Scatter(x=time_series, y=upper, mode="lines", line=dict(width=0), showlegend=False))
+            fig.add_trace(
+                go.Scatter(
+                    x=time_series,
+                    y=lower,
+                    mode="lines",
+                    line=dict(width=0),
+                    fill="tonexty",
+                    opacity=opacity,
+                    name=f"{name} {band}",
+                )
+            )
+        fig.add_trace(go.Scatter(x=time_series, y=p50, mode="lines", name=f"{name} median"))
+    fig.update_layout(title=title, xaxis_title="Date", yaxis_title=f"[{unit}]", hovermode="x")
+    return fig
+
+
+def compute_and_plot_costs(P_purchase, P_feed_in, electricity_price, feed_in_tariff, time_series, time_step=1):
+    # time_step: length of a time step [h]
     E_purchase = P_purchase * time_step  # [kWh]
     C_purchase = E_purchase * electricity_price  # [€]
     C_purchase_total = C_purchase.sum()
@@ -165,9 +302,10 @@ def compute_and_plot_costs(P_purchase, P_feed_in, electricity_price, feed_in_tar
     C_feed_in_total = C_feed_in.sum()
     C_balance = C_purchase + C_feed_in
     C_total = C_balance.sum()
+    time_series = to_plot_values(time_series)
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=time_series, y=C_purchase, mode="lines", name="Purchase costs"))
-    fig.add_trace(go.Scatter(x=time_series, y=C_feed_in, mode="lines", name="Feed-in compensation"))
+    fig.add_trace(go.Scatter(x=time_series, y=to_plot_values(C_purchase), mode="lines", name="Purchase costs"))
+    fig.add_trace(go.Scatter(x=time_series, y=to_plot_values(C_feed_in), mode="lines", name="Feed-in compensation"))
     fig.update_layout(
         title="Figure 4d: Electricity costs and feed-in compensation",
         xaxis_title="Date",
@@ -187,7 +325,9 @@ def compute_and_plot_emissions(CO2_emissions, E_purchase, time_series):
     CO2_generated = CO2_emissions * E_purchase  # [gCO2]
     CO2_generated.name = "CO2_generated"
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=time_series, y=CO2_generated, mode="lines", name="CO2 emissions"))
+    fig.add_trace(
+        go.Scatter(x=to_plot_values(time_series), y=to_plot_values(CO2_generated), mode="lines", name="CO2 emissions")
+    )
     fig.update_layout(
         title="Figure 4e: CO₂ emissions due to purchased electricity",
         xaxis_title="Date",
@@ -197,7 +337,7 @@ def compute_and_plot_emissions(CO2_emissions, E_purchase, time_series):
     st.plotly_chart(fig)
     CO2_total = round(CO2_generated.sum(), 2)
     st.markdown(
-        f"### The weekly CO₂ emissions due to purchased electricity using this operating strategy corresponds to {CO2_total:.2f} gCO₂"
+        f"### The total CO₂ emissions due to purchased electricity using this operating strategy correspond to {CO2_total:.2f} gCO₂"
     )
     return CO2_generated
 